@@ -0,0 +1,233 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    ANOMALY_ACTION_RATE,
+    ANOMALY_ALERT_COOLDOWN_SEC,
+    ANOMALY_DENIAL_BURST,
+    ANOMALY_DISTINCT_RESOURCES,
+    ANOMALY_WINDOW_BUCKETS,
+    ANOMALY_WINDOW_SEC,
+)
+
+# Alert rule names (security_alerts.rule)
+RULE_DENIAL_BURST = "denial_burst"
+RULE_ACTION_RATE = "action_rate"
+RULE_DISTINCT_RESOURCES = "distinct_resources"
+
+# HyperLogLog precision: 2**6 = 64 one-byte registers, ~13% standard error
+_HLL_BITS = 6
+_HLL_REGISTERS = 1 << _HLL_BITS
+_HLL_ALPHA = 0.709
+
+
+class SlidingCounter:
+    """
+    Event count over the last `n_buckets` time buckets, kept in a fixed
+    ring of counters – memory does not depend on the event rate.
+    """
+
+    __slots__ = ("counts", "slot", "total")
+
+    def __init__(self, n_buckets: int):
+        self.counts = [0] * n_buckets
+        self.slot = 0
+        self.total = 0
+
+    def _advance(self, slot: int) -> None:
+        n = len(self.counts)
+        if slot - self.slot >= n:
+            self.counts = [0] * n
+            self.total = 0
+        else:
+            for s in range(self.slot + 1, slot + 1):
+                self.total -= self.counts[s % n]
+                self.counts[s % n] = 0
+        self.slot = slot
+
+    def add(self, slot: int) -> int:
+        if slot > self.slot:
+            self._advance(slot)
+        else:
+            slot = self.slot  # late event: count it in the newest bucket
+        self.counts[slot % len(self.counts)] += 1
+        self.total += 1
+        return self.total
+
+
+class SlidingDistinct:
+    """
+    Approximate number of distinct values seen over the window: one small
+    HyperLogLog sketch per time bucket, merged (register-wise max) into a
+    window sketch that is only rebuilt when a bucket expires.
+    """
+
+    __slots__ = ("sketches", "merged", "slot", "estimate")
+
+    def __init__(self, n_buckets: int):
+        self.sketches = [bytearray(_HLL_REGISTERS) for _ in range(n_buckets)]
+        self.merged = bytearray(_HLL_REGISTERS)
+        self.slot = 0
+        self.estimate = 0.0
+
+    def _advance(self, slot: int) -> None:
+        n = len(self.sketches)
+        for s in range(max(self.slot + 1, slot - n + 1), slot + 1):
+            self.sketches[s % n] = bytearray(_HLL_REGISTERS)
+        self.slot = slot
+        self.merged = bytearray(map(max, *self.sketches)) if n > 1 else bytearray(self.sketches[0])
+        self.estimate = _hll_estimate(self.merged)
+
+    def add(self, slot: int, value: str) -> float:
+        if slot > self.slot:
+            self._advance(slot)
+        else:
+            slot = self.slot  # late event: count it in the newest bucket
+        h = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        register = h >> (64 - _HLL_BITS)
+        rest = h & ((1 << (64 - _HLL_BITS)) - 1)
+        rank = (64 - _HLL_BITS) - rest.bit_length() + 1
+
+        sketch = self.sketches[slot % len(self.sketches)]
+        if rank > sketch[register]:
+            sketch[register] = rank
+        if rank > self.merged[register]:
+            # Only a raised register can change the estimate
+            self.merged[register] = rank
+            self.estimate = _hll_estimate(self.merged)
+        return self.estimate
+
+
+def _hll_estimate(registers: bytearray) -> float:
+    m = len(registers)
+    estimate = _HLL_ALPHA * m * m / sum(2.0 ** -r for r in registers)
+    zeros = registers.count(0)
+    if estimate <= 2.5 * m and zeros:
+        # Small-range correction (linear counting)
+        estimate = m * math.log(m / zeros)
+    return estimate
+
+
+class AnomalyDetector:
+    """
+    Streaming detector over permission checks.
+
+    Every event updates fixed-size sliding-window state for its agent and
+    its (agent, action) pair; nothing is ever read back from access_logs.
+    Rules:
+
+    - denial_burst: DENIED events by one agent within the window
+    - action_rate: events for one (agent, action) within the window
+    - distinct_resources: distinct resource_ids one agent touched within
+      the window (HyperLogLog estimate)
+
+    observe() returns the alerts the event triggered. A rule re-alerts for
+    the same key at most once per `cooldown` seconds.
+    """
+
+    def __init__(
+        self,
+        window_sec: float = ANOMALY_WINDOW_SEC,
+        n_buckets: int = ANOMALY_WINDOW_BUCKETS,
+        denial_burst: int = ANOMALY_DENIAL_BURST,
+        action_rate: int = ANOMALY_ACTION_RATE,
+        distinct_resources: int = ANOMALY_DISTINCT_RESOURCES,
+        cooldown: float = ANOMALY_ALERT_COOLDOWN_SEC,
+    ):
+        self.window_sec = window_sec
+        self.n_buckets = n_buckets
+        self.bucket_sec = window_sec / n_buckets
+        self.denial_burst = denial_burst
+        self.action_rate = action_rate
+        self.distinct_resources = distinct_resources
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self._denials: Dict[str, SlidingCounter] = {}
+        self._actions: Dict[Tuple[str, str], SlidingCounter] = {}
+        self._resources: Dict[str, SlidingDistinct] = {}
+        self._last_alert: Dict[Tuple[str, Any], float] = {}
+
+    def _fire(
+        self,
+        alerts: List[Dict[str, Any]],
+        now: float,
+        rule: str,
+        key: Any,
+        agent_name: str,
+        action: Optional[str],
+        observed: float,
+        threshold: float,
+        details: str,
+    ) -> None:
+        last = self._last_alert.get((rule, key))
+        if last is not None and now - last < self.cooldown:
+            return
+        self._last_alert[(rule, key)] = now
+        alerts.append(
+            {
+                "timestamp": datetime.utcfromtimestamp(now).isoformat(timespec="seconds"),
+                "rule": rule,
+                "agent_name": agent_name,
+                "action": action,
+                "observed": observed,
+                "threshold": threshold,
+                "window_sec": self.window_sec,
+                "details": details,
+            }
+        )
+
+    def observe(
+        self,
+        agent_name: str,
+        action: str,
+        resource_id: Optional[str],
+        allowed: bool,
+        now: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        now = time.time() if now is None else now
+        slot = int(now // self.bucket_sec)
+        alerts: List[Dict[str, Any]] = []
+
+        with self._lock:
+            if not allowed:
+                counter = self._denials.get(agent_name)
+                if counter is None:
+                    counter = self._denials[agent_name] = SlidingCounter(self.n_buckets)
+                denied = counter.add(slot)
+                if denied >= self.denial_burst:
+                    self._fire(
+                        alerts, now, RULE_DENIAL_BURST, agent_name, agent_name, None,
+                        denied, self.denial_burst,
+                        f"{denied} denied requests in {self.window_sec:g}s",
+                    )
+
+            key = (agent_name, action)
+            counter = self._actions.get(key)
+            if counter is None:
+                counter = self._actions[key] = SlidingCounter(self.n_buckets)
+            rate = counter.add(slot)
+            if rate >= self.action_rate:
+                self._fire(
+                    alerts, now, RULE_ACTION_RATE, key, agent_name, action,
+                    rate, self.action_rate,
+                    f"{rate} '{action}' requests in {self.window_sec:g}s",
+                )
+
+            if resource_id:
+                sketch = self._resources.get(agent_name)
+                if sketch is None:
+                    sketch = self._resources[agent_name] = SlidingDistinct(self.n_buckets)
+                distinct = round(sketch.add(slot, str(resource_id)))
+                if distinct >= self.distinct_resources:
+                    self._fire(
+                        alerts, now, RULE_DISTINCT_RESOURCES, agent_name, agent_name, None,
+                        distinct, self.distinct_resources,
+                        f"~{distinct} distinct resources in {self.window_sec:g}s",
+                    )
+
+        return alerts
@@ -1,7 +1,9 @@
 import json
 from datetime import datetime
-from typing import Dict, Any
+from typing import Iterator
 
+from config import DB_ITER_BATCH_SIZE
+from core.models import Bill
 from data.db import Database
 
 
@@ -9,24 +11,33 @@ class BillingAgent:
     def __init__(self, db: Database):
         self.db = db
 
-    def generate_bill(self, visit_id: int, consultation_fee: float) -> Dict[str, Any]:
+    def generate_bill(self, visit_id: int, consultation_fee: float) -> Bill:
         items = [
             {"item": "Consultation Fee", "amount": float(consultation_fee)},
         ]
         total_amount = float(consultation_fee)
         created_at = datetime.utcnow().isoformat(timespec="seconds")
 
-        bill_id = self.db.insert(
-            """
-            INSERT INTO bills (visit_id, total_amount, items_json, created_at)
-            VALUES (?, ?, ?, ?);
-            """,
-            (visit_id, total_amount, json.dumps(items), created_at),
+        return self.db.insert_returning(
+            "bills",
+            {
+                "visit_id": visit_id,
+                "total_amount": total_amount,
+                "items_json": json.dumps(items),
+                "created_at": created_at,
+            },
         )
 
-        bill = self.db.execute(
-            "SELECT * FROM bills WHERE id = ?;",
-            (bill_id,),
-            fetchone=True,
+    def iter_bills(
+        self, after_id: int = 0, batch_size: int = DB_ITER_BATCH_SIZE
+    ) -> Iterator[Bill]:
+        """
+        Every bill with id > `after_id`, in id order, streamed
+        `batch_size` rows at a time.
+        """
+        return self.db.iter_query(
+            "SELECT * FROM bills WHERE id > ? ORDER BY id;",
+            (after_id,),
+            batch_size,
+            model=Bill,
         )
-        return bill
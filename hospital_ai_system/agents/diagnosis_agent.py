@@ -1,12 +1,210 @@
-from typing import Tuple
+import bisect
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents.diagnosis_rules import (
+    AGE_BAND_NAMES,
+    DEFAULT_RULES,
+    FALLBACK_ISSUE,
+    FALLBACK_RISK,
+    age_band,
+    compute_bmi,
+    normalize_symptoms,
+    validate_rule,
+)
+from agents.prediction_cache import PredictionCache
+from agents.symptom_matcher import KeywordAutomaton
+from config import (
+    DIAGNOSIS_CACHE_MAX_SIZE,
+    DIAGNOSIS_CACHE_TTL_SEC,
+    DIAGNOSIS_MODEL_VERSION,
+)
+
+# Vectorized batch scoring is optional (NumPy)
+try:
+    from agents.diagnosis_batch import BatchScorer  # type: ignore
+except ImportError:
+    BatchScorer = None
+
+
+class CompiledRules:
+    """
+    A rule table compiled against one KeywordAutomaton.
+
+    Every keyword keeps a posting list of the (rule, group) pairs it
+    satisfies, so evaluating a text only touches rules that share at
+    least one keyword with it.
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        for rule in rules:
+            validate_rule(rule)
+        self.rules = rules
+        # Content hash: any edit to the table yields a new version
+        self.version = hashlib.sha1(
+            json.dumps(rules, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()[:12]
+
+        keywords: List[str] = []
+        for rule in rules:
+            for group in rule["all_of"]:
+                keywords.extend(group)
+            keywords.extend(rule.get("none_of") or [])
+        self.automaton = KeywordAutomaton(keywords)
+
+        n_keywords = len(self.automaton.keywords)
+        self._postings: List[List[Tuple[int, int]]] = [[] for _ in range(n_keywords)]
+        self._negations: List[List[int]] = [[] for _ in range(n_keywords)]
+        self._group_counts: List[int] = []
+        self._weights: List[float] = []
+        # Demographic conditions: None means "no condition"
+        self._age_bands: List[Optional[frozenset]] = []
+        self._bmi_ranges: List[Optional[Tuple[float, float]]] = []
+
+        for rule_idx, rule in enumerate(rules):
+            self._group_counts.append(len(rule["all_of"]))
+            self._weights.append(float(rule.get("weight", 1.0)))
+            bands = rule.get("age_bands")
+            self._age_bands.append(
+                frozenset(AGE_BAND_NAMES.index(b) for b in bands) if bands else None
+            )
+            if rule.get("min_bmi") is not None or rule.get("max_bmi") is not None:
+                self._bmi_ranges.append(
+                    (
+                        float(rule.get("min_bmi", float("-inf"))),
+                        float(rule.get("max_bmi", float("inf"))),
+                    )
+                )
+            else:
+                self._bmi_ranges.append(None)
+
+            for group_idx, group in enumerate(rule["all_of"]):
+                for keyword in group:
+                    self._postings[self.automaton.keyword_id(keyword)].append(
+                        (rule_idx, group_idx)
+                    )
+            for keyword in rule.get("none_of") or []:
+                self._negations[self.automaton.keyword_id(keyword)].append(rule_idx)
+
+        # Every BMI the rules compare against; two BMIs in the same bucket
+        # are indistinguishable to every rule.
+        self._bmi_thresholds = sorted(
+            {bound for r in self._bmi_ranges if r for bound in r if abs(bound) != float("inf")}
+        )
+
+    def bmi_bucket(self, bmi: Optional[float]) -> Optional[Tuple[int, bool]]:
+        """
+        Coarsest BMI bucketing that keeps rule outcomes exact:
+        position among the rule thresholds, and whether it sits on one.
+        """
+        if bmi is None:
+            return None
+        pos = bisect.bisect_left(self._bmi_thresholds, bmi)
+        on_threshold = pos < len(self._bmi_thresholds) and self._bmi_thresholds[pos] == bmi
+        return (pos, on_threshold)
+
+    def _demographics_ok(
+        self, rule_idx: int, band: Optional[int], bmi: Optional[float]
+    ) -> bool:
+        bands = self._age_bands[rule_idx]
+        if bands is not None and (band is None or band not in bands):
+            return False
+        bmi_range = self._bmi_ranges[rule_idx]
+        if bmi_range is not None and (bmi is None or not bmi_range[0] <= bmi <= bmi_range[1]):
+            return False
+        return True
+
+    def match(
+        self, text: str, band: Optional[int] = None, bmi: Optional[float] = None
+    ) -> List[Tuple[float, int]]:
+        """
+        Return (score, rule_index) for every rule that fires on `text`
+        for a patient in age band `band` with this BMI, best first.
+        """
+        hits = self.automaton.scan(text)
+
+        satisfied: Dict[int, set] = {}
+        negated = set()
+        for keyword_id in hits:
+            for rule_idx, group_idx in self._postings[keyword_id]:
+                satisfied.setdefault(rule_idx, set()).add(group_idx)
+            negated.update(self._negations[keyword_id])
+
+        fired = [
+            (self._weights[rule_idx], rule_idx)
+            for rule_idx, groups in satisfied.items()
+            if len(groups) == self._group_counts[rule_idx]
+            and rule_idx not in negated
+            and self._demographics_ok(rule_idx, band, bmi)
+        ]
+        fired.sort(key=lambda item: (-item[0], item[1]))
+        return fired
 
 
 class DiagnosisAgent:
     """
-    Simple rule-based diagnosis agent for now (if-else).
+    Rule-based diagnosis agent.
+
+    The rule table (see agents/diagnosis_rules.py) is compiled once into
+    an Aho-Corasick automaton; each prediction scans the symptom text in a
+    single pass and scores every matching rule. Single predictions go
+    through an LRU PredictionCache that is invalidated automatically
+    whenever the rule set or model version changes.
     Later, you can plug in an API/LLM here.
     """
 
+    def __init__(
+        self,
+        rules: Optional[List[Dict[str, Any]]] = None,
+        model_version: str = DIAGNOSIS_MODEL_VERSION,
+        cache: Optional[PredictionCache] = None,
+    ):
+        self.model_version = model_version
+        self.cache = (
+            cache
+            if cache is not None
+            else PredictionCache(DIAGNOSIS_CACHE_MAX_SIZE, DIAGNOSIS_CACHE_TTL_SEC)
+        )
+        self.set_rules(rules if rules is not None else DEFAULT_RULES)
+
+    def set_rules(self, rules: List[Dict[str, Any]]) -> None:
+        """
+        Compile and swap in a new rule table. Cached predictions made with
+        the previous table are dropped on the next lookup.
+        """
+        compiled = CompiledRules(rules)
+        scorer = BatchScorer(compiled) if BatchScorer is not None else None
+        # One assignment, so concurrent predictions see either the old or
+        # the new rule set, never a mix.
+        self._state = (compiled, scorer)
+
+    @property
+    def compiled(self) -> CompiledRules:
+        return self._state[0]
+
+    @property
+    def version(self) -> str:
+        return f"{self.model_version}:{self.compiled.version}"
+
+    def match(
+        self,
+        symptoms: str,
+        age: Optional[int] = None,
+        height: Optional[float] = None,
+        weight: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Every rule that fires on these symptoms, best first, with its score.
+        """
+        compiled = self.compiled
+        return [
+            {**compiled.rules[rule_idx], "score": score}
+            for score, rule_idx in compiled.match(
+                normalize_symptoms(symptoms), age_band(age), compute_bmi(height, weight)
+            )
+        ]
+
     def predict(
         self,
         symptoms: str,
@@ -15,16 +213,62 @@ class DiagnosisAgent:
         height: float,
         weight: float,
     ) -> Tuple[str, str]:
-        text = (symptoms or "").lower()
-
-        # Very simple heuristics – you can extend this
-        if "fever" in text and "cough" in text:
-            return ("Possible viral infection (e.g., flu)", "medium")
-        if "chest pain" in text or "breathless" in text:
-            return ("Possible cardiac/respiratory issue – urgent check", "high")
-        if "headache" in text and "stress" in text:
-            return ("Possible tension headache / stress-related issue", "low")
-        if "stomach" in text or "abdomen" in text:
-            return ("Possible gastric/abdominal issue", "medium")
-
-        return ("General check-up recommended, no clear pattern detected", "low")
+        compiled, _ = self._state
+        version = f"{self.model_version}:{compiled.version}"
+        text = normalize_symptoms(symptoms)
+        band = age_band(age)
+        bmi = compute_bmi(height, weight)
+
+        key = (text, band, compiled.bmi_bucket(bmi), (gender or "").strip().lower())
+        cached = self.cache.get(key, version)
+        if cached is not None:
+            return cached
+
+        matches = compiled.match(text, band, bmi)
+        if matches:
+            best = compiled.rules[matches[0][1]]
+            result = (best["issue"], best["risk"])
+        else:
+            result = (FALLBACK_ISSUE, FALLBACK_RISK)
+
+        self.cache.put(key, result, version)
+        return result
+
+    def predict_batch(self, visits: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        """
+        Predict for many visit rows at once (keys: symptoms, age, gender,
+        height, weight). Same results as calling predict() per row, but
+        features and rule scoring are vectorized when NumPy is available.
+        The prediction cache is bypassed so backfills don't flush it.
+        """
+        compiled, scorer = self._state
+        if scorer is None:
+            results = []
+            for v in visits:
+                matches = compiled.match(
+                    normalize_symptoms(v.get("symptoms")),
+                    age_band(v.get("age")),
+                    compute_bmi(v.get("height"), v.get("weight")),
+                )
+                if matches:
+                    best = compiled.rules[matches[0][1]]
+                    results.append((best["issue"], best["risk"]))
+                else:
+                    results.append((FALLBACK_ISSUE, FALLBACK_RISK))
+            return results
+
+        best = scorer.best_rules(
+            [normalize_symptoms(v.get("symptoms")) for v in visits],
+            [v.get("age") or 0 for v in visits],
+            [v.get("height") or 0.0 for v in visits],
+            [v.get("weight") or 0.0 for v in visits],
+        )
+        rules = compiled.rules
+        return [
+            (rules[idx]["issue"], rules[idx]["risk"]) if idx >= 0
+            else (FALLBACK_ISSUE, FALLBACK_RISK)
+            for idx in best.tolist()
+        ]
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
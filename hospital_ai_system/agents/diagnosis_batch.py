@@ -0,0 +1,173 @@
+from typing import Any, List, Sequence, Tuple
+
+import numpy as np
+
+from agents.diagnosis_rules import AGE_BANDS
+
+
+def _csr(lists: Sequence[Sequence[Any]], width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pack per-keyword posting lists into (row pointer, flat values) arrays.
+    `width` is the number of values per posting (1 or 2).
+    """
+    ptr = np.zeros(len(lists) + 1, dtype=np.int64)
+    ptr[1:] = np.cumsum([len(items) for items in lists])
+    flat = [value for items in lists for value in items]
+    values = np.array(flat, dtype=np.int64).reshape(-1, width) if flat else np.zeros((0, width), dtype=np.int64)
+    return ptr, values
+
+
+def _expand(ptr: np.ndarray, rows: np.ndarray, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For every (row, key) hit, emit one (row, posting index) pair per entry
+    in key's posting list – a vectorized flat-map over the CSR arrays.
+    """
+    starts = ptr[keys]
+    lengths = ptr[keys + 1] - starts
+    total = int(lengths.sum())
+    out_rows = np.repeat(rows, lengths)
+    before = np.cumsum(lengths) - lengths
+    positions = np.repeat(starts - before, lengths) + np.arange(total, dtype=np.int64)
+    return out_rows, positions
+
+
+class BatchScorer:
+    """
+    Vectorized evaluation of a CompiledRules table over many visits.
+
+    Keyword hits still come from one automaton scan per text; everything
+    after that – BMI and age-band features, group satisfaction, negations,
+    demographic filters and picking the best rule – is done with NumPy
+    array operations over the whole batch.
+    """
+
+    def __init__(self, compiled: Any):
+        self.compiled = compiled
+        self.n_rules = len(compiled.rules)
+
+        self._post_ptr, postings = _csr(compiled._postings, 2)
+        self._post_rule = postings[:, 0]
+        self._post_group = postings[:, 1]
+        self._neg_ptr, negations = _csr(compiled._negations, 1)
+        self._neg_rule = negations[:, 0]
+
+        self._group_counts = np.array(compiled._group_counts, dtype=np.int64)
+        self._max_groups = int(self._group_counts.max()) if self.n_rules else 1
+        self._weights = np.array(compiled._weights, dtype=np.float64)
+
+        # age_ok[band, rule]; rules without an age condition allow every band
+        n_bands = len(AGE_BANDS)
+        self._needs_age = np.array([b is not None for b in compiled._age_bands], dtype=bool)
+        self._age_ok = np.ones((n_bands, self.n_rules), dtype=bool)
+        for rule_idx, bands in enumerate(compiled._age_bands):
+            if bands is not None:
+                self._age_ok[:, rule_idx] = False
+                self._age_ok[list(bands), rule_idx] = True
+
+        self._needs_bmi = np.array([r is not None for r in compiled._bmi_ranges], dtype=bool)
+        self._min_bmi = np.array(
+            [r[0] if r else -np.inf for r in compiled._bmi_ranges], dtype=np.float64
+        )
+        self._max_bmi = np.array(
+            [r[1] if r else np.inf for r in compiled._bmi_ranges], dtype=np.float64
+        )
+        self._band_bounds = np.array([lower for _name, lower in AGE_BANDS][1:], dtype=np.float64)
+
+    # ---------- Features ----------
+
+    def features(
+        self, ages: Sequence[float], heights: Sequence[float], weights: Sequence[float]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (age band index, BMI) arrays; -1 / NaN where unknown.
+        """
+        age = np.asarray(ages, dtype=np.float64)
+        height_m = np.asarray(heights, dtype=np.float64) / 100.0
+        weight = np.asarray(weights, dtype=np.float64)
+
+        bands = np.searchsorted(self._band_bounds, age, side="right").astype(np.int64)
+        bands[~(age > 0)] = -1
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bmi = weight / (height_m * height_m)
+        bmi[~((height_m > 0) & (weight > 0))] = np.nan
+        return bands, bmi
+
+    def keyword_hits(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (row, keyword id) pairs for every keyword found in every text.
+        Each distinct text is scanned once – historical symptom strings
+        repeat heavily, so this is where most of a batch's time is saved.
+        """
+        rows: List[int] = []
+        keys: List[int] = []
+        scan = self.compiled.automaton.scan
+        seen = {}
+        for row, text in enumerate(texts):
+            found = seen.get(text)
+            if found is None:
+                found = seen[text] = tuple(scan(text))
+            rows.extend([row] * len(found))
+            keys.extend(found)
+        return np.array(rows, dtype=np.int64), np.array(keys, dtype=np.int64)
+
+    # ---------- Scoring ----------
+
+    def best_rules(
+        self,
+        texts: Sequence[str],
+        ages: Sequence[float],
+        heights: Sequence[float],
+        weights: Sequence[float],
+    ) -> np.ndarray:
+        """
+        Index of the winning rule for every text, or -1 if none fires.
+        """
+        n = len(texts)
+        best = np.full(n, -1, dtype=np.int64)
+        if n == 0 or self.n_rules == 0:
+            return best
+
+        bands, bmi = self.features(ages, heights, weights)
+        hit_rows, hit_keys = self.keyword_hits(texts)
+        if hit_rows.size == 0:
+            return best
+
+        # (text, rule, group) triples satisfied by at least one keyword
+        rows, pos = _expand(self._post_ptr, hit_rows, hit_keys)
+        rules = self._post_rule[pos]
+        groups = self._post_group[pos]
+        triples = np.unique((rows * self.n_rules + rules) * self._max_groups + groups)
+
+        # A rule fires for a text when all of its groups are satisfied
+        pairs, group_hits = np.unique(triples // self._max_groups, return_counts=True)
+        rules = pairs % self.n_rules
+        fired = group_hits == self._group_counts[rules]
+
+        # Negations
+        neg_rows, neg_pos = _expand(self._neg_ptr, hit_rows, hit_keys)
+        if neg_rows.size:
+            negated_pairs = neg_rows * self.n_rules + self._neg_rule[neg_pos]
+            fired &= ~np.isin(pairs, negated_pairs)
+
+        # Demographic conditions
+        rows = pairs // self.n_rules
+        row_bands = bands[rows]
+        age_ok = np.where(row_bands >= 0, self._age_ok[np.maximum(row_bands, 0), rules], False)
+        fired &= ~self._needs_age[rules] | age_ok
+        row_bmi = bmi[rows]
+        with np.errstate(invalid="ignore"):
+            bmi_ok = (row_bmi >= self._min_bmi[rules]) & (row_bmi <= self._max_bmi[rules])
+        fired &= ~self._needs_bmi[rules] | bmi_ok
+
+        rows, rules = rows[fired], rules[fired]
+        if rows.size == 0:
+            return best
+
+        # Highest weight wins; ties go to the earliest rule
+        order = np.lexsort((rules, -self._weights[rules], rows))
+        rows, rules = rows[order], rules[order]
+        first = np.ones(rows.size, dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        best[rows[first]] = rules[first]
+        return best
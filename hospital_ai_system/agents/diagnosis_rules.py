@@ -0,0 +1,104 @@
+import json
+from typing import Any, Dict, List, Optional
+
+
+# Each rule fires when every group in `all_of` has at least one keyword
+# present in the symptom text and no `none_of` keyword is present.
+# Matching is case-insensitive substring matching. When several rules
+# fire, the highest `weight` wins; ties go to the rule listed first.
+#
+# Optional demographic conditions narrow a rule further:
+#   "age_bands": ["senior"]   – only for these AGE_BANDS
+#   "min_bmi": 30, "max_bmi": 40
+# A rule with a condition never fires when that value is unknown.
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {
+        "issue": "Possible viral infection (e.g., flu)",
+        "risk": "medium",
+        "all_of": [["fever"], ["cough"]],
+        "none_of": [],
+        "weight": 1.0,
+    },
+    {
+        "issue": "Possible cardiac/respiratory issue – urgent check",
+        "risk": "high",
+        "all_of": [["chest pain", "breathless"]],
+        "none_of": [],
+        "weight": 1.0,
+    },
+    {
+        "issue": "Possible tension headache / stress-related issue",
+        "risk": "low",
+        "all_of": [["headache"], ["stress"]],
+        "none_of": [],
+        "weight": 1.0,
+    },
+    {
+        "issue": "Possible gastric/abdominal issue",
+        "risk": "medium",
+        "all_of": [["stomach", "abdomen"]],
+        "none_of": [],
+        "weight": 1.0,
+    },
+]
+
+FALLBACK_ISSUE = "General check-up recommended, no clear pattern detected"
+FALLBACK_RISK = "low"
+
+RISK_LEVELS = ("low", "medium", "high")
+
+# (name, lower bound inclusive) – each band runs up to the next bound
+AGE_BANDS = (("child", 0), ("adult", 18), ("senior", 65))
+AGE_BAND_NAMES = tuple(name for name, _ in AGE_BANDS)
+
+
+def normalize_symptoms(symptoms: Optional[str]) -> str:
+    """
+    Lower-case and collapse whitespace. Matching always runs on this form,
+    so it is also a safe prediction-cache key.
+    """
+    return " ".join((symptoms or "").lower().split())
+
+
+def age_band(age: Optional[float]) -> Optional[int]:
+    """
+    Index into AGE_BANDS, or None when the age is unknown (missing or 0).
+    """
+    if not age or age <= 0:
+        return None
+    band = 0
+    for idx, (_name, lower) in enumerate(AGE_BANDS):
+        if age >= lower:
+            band = idx
+    return band
+
+
+def compute_bmi(height_cm: Optional[float], weight_kg: Optional[float]) -> Optional[float]:
+    if not height_cm or not weight_kg or height_cm <= 0 or weight_kg <= 0:
+        return None
+    height_m = height_cm / 100.0
+    return weight_kg / (height_m * height_m)
+
+
+def validate_rule(rule: Dict[str, Any]) -> None:
+    if not rule.get("issue"):
+        raise ValueError("Diagnosis rule is missing 'issue'")
+    if rule.get("risk") not in RISK_LEVELS:
+        raise ValueError(f"Diagnosis rule {rule['issue']!r} has invalid risk {rule.get('risk')!r}")
+    groups = rule.get("all_of") or []
+    if not groups or not all(groups):
+        raise ValueError(f"Diagnosis rule {rule['issue']!r} needs at least one non-empty keyword group")
+    for band in rule.get("age_bands") or []:
+        if band not in AGE_BAND_NAMES:
+            raise ValueError(f"Diagnosis rule {rule['issue']!r} has unknown age band {band!r}")
+
+
+def load_rules(path: str) -> List[Dict[str, Any]]:
+    """
+    Load a rule table from a JSON file holding a list of rule objects.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        rules = json.load(f)
+    for rule in rules:
+        validate_rule(rule)
+    return rules
@@ -1,8 +1,118 @@
-from typing import Optional, Dict, Any
+import csv
+import gzip
+import json
+import math
+from pathlib import Path
+from typing import IO, Optional, Dict, Any, Iterable, Iterator, List, Tuple
 
+from config import PATIENT_IMPORT_BATCH_SIZE
+from core.models import Patient
 from data.db import Database
 
 
+# One statement per registration: a new phone inserts, a known phone
+# updates whichever demographics were provided. The UNIQUE(phone)
+# constraint arbitrates concurrent registrations instead of a SELECT.
+_UPSERT_PATIENT = """
+    INSERT INTO patients (name, phone, age, gender, height, weight)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(phone) DO UPDATE SET
+        name = COALESCE(excluded.name, name),
+        age = COALESCE(excluded.age, age),
+        gender = COALESCE(excluded.gender, gender),
+        height = COALESCE(excluded.height, height),
+        weight = COALESCE(excluded.weight, weight)
+"""
+
+UPSERT_PATIENT_SQL = _UPSERT_PATIENT + ";"
+UPSERT_PATIENT_RETURNING_SQL = _UPSERT_PATIENT + " RETURNING *;"
+
+PatientRow = Tuple[str, str, Optional[int], Optional[str], Optional[float], Optional[float]]
+
+
+def _blank_to_none(value: Any) -> Any:
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def _finite(value: Any, field: str) -> Optional[float]:
+    if value is None:
+        return None
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"{field} is not a finite number")
+    return number
+
+
+def patient_row(record: Dict[str, Any]) -> PatientRow:
+    """
+    Normalise one imported record into UPSERT parameters. Raises
+    ValueError for records that cannot be imported.
+    """
+    phone = _blank_to_none(record.get("phone"))
+    name = _blank_to_none(record.get("name"))
+    if phone is None:
+        raise ValueError("missing phone")
+    if name is None:
+        raise ValueError("missing name")
+    age = _finite(_blank_to_none(record.get("age")), "age")
+    return (
+        str(name),
+        str(phone),
+        int(age) if age is not None else None,
+        _blank_to_none(record.get("gender")),
+        _finite(_blank_to_none(record.get("height")), "height"),
+        _finite(_blank_to_none(record.get("weight")), "weight"),
+    )
+
+
+def _open_text(path: Path) -> IO[str]:
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+class InvalidRecord(ValueError):
+    """
+    Stands in for a record that could not even be parsed, so the import
+    can skip and report it instead of aborting.
+    """
+
+
+def iter_patient_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream records from a .csv or .jsonl/.ndjson file (optionally .gz)
+    without loading it into memory. CSV files need a header row.
+    JSONL lines that are not a JSON object are yielded as InvalidRecord.
+    """
+    file_path = Path(path)
+    name = file_path.name.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    fmt = Path(name).suffix
+    if fmt not in (".csv", ".jsonl", ".ndjson"):
+        raise ValueError(f"Unsupported import format: {file_path.name}")
+
+    with _open_text(file_path) as f:
+        if fmt == ".csv":
+            yield from csv.DictReader(f)
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    yield InvalidRecord(f"line {line_no}: invalid JSON ({exc.msg})")
+                    continue
+                if not isinstance(record, dict):
+                    yield InvalidRecord(f"line {line_no}: expected a JSON object")
+                    continue
+                yield record
+
+
 class IntakeAgent:
     def __init__(self, db: Database):
         self.db = db
@@ -16,36 +126,57 @@ class IntakeAgent:
         height: Optional[float] = None,
         weight: Optional[float] = None,
     ) -> int:
-        # Check if patient already exists by phone
-        existing = self.db.execute(
-            "SELECT * FROM patients WHERE phone = ?;",
-            (phone,),
-            fetchone=True,
-        )
-        if existing:
-            # Optionally update demographics if provided
-            patient_id = existing["id"]
-            self.db.execute(
-                """
-                UPDATE patients
-                SET name = COALESCE(?, name),
-                    age = COALESCE(?, age),
-                    gender = COALESCE(?, gender),
-                    height = COALESCE(?, height),
-                    weight = COALESCE(?, weight)
-                WHERE id = ?;
-                """,
-                (name, age, gender, height, weight, patient_id),
-                commit=True,
-            )
-            return patient_id
-
-        # Insert new patient
-        patient_id = self.db.insert(
-            """
-            INSERT INTO patients (name, phone, age, gender, height, weight)
-            VALUES (?, ?, ?, ?, ?, ?);
-            """,
+        # fetchall so the statement runs to completion (and commits when
+        # not inside a unit of work) before we return
+        rows = self.db.execute(
+            UPSERT_PATIENT_RETURNING_SQL,
             (name, phone, age, gender, height, weight),
+            fetchall=True,
+            model=Patient,
         )
-        return patient_id
+        return self.db.remember("patients", rows[0])["id"]
+
+    def upsert_patients(self, rows: Iterable[PatientRow]) -> int:
+        """
+        Upsert many normalised patient rows with one executemany.
+        """
+        return self.db.executemany(UPSERT_PATIENT_SQL, rows)
+
+    def import_patients(
+        self,
+        records: Iterable[Dict[str, Any]],
+        batch_size: int = PATIENT_IMPORT_BATCH_SIZE,
+        max_errors: int = 100,
+    ) -> Dict[str, Any]:
+        """
+        Upsert a stream of patient records in batches of `batch_size`,
+        each batch in its own transaction. Records that fail validation
+        are skipped and reported (record number + reason, first
+        `max_errors` only).
+        """
+        stats: Dict[str, Any] = {"read": 0, "imported": 0, "skipped": 0, "batches": 0, "errors": []}
+        batch: List[PatientRow] = []
+
+        def flush() -> None:
+            with self.db.transaction(immediate=True):
+                self.upsert_patients(batch)
+            stats["imported"] += len(batch)
+            stats["batches"] += 1
+            batch.clear()
+
+        for record_no, record in enumerate(records, start=1):
+            stats["read"] += 1
+            try:
+                if isinstance(record, InvalidRecord):
+                    raise record
+                batch.append(patient_row(record))
+            except (ValueError, TypeError, AttributeError) as exc:
+                stats["skipped"] += 1
+                if len(stats["errors"]) < max_errors:
+                    stats["errors"].append(f"record {record_no}: {exc}")
+                continue
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        return stats
@@ -0,0 +1,211 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from config import SECURITY_POLICY_PATH, SECURITY_POLICY_RELOAD_SEC
+
+
+# A policy grants each agent a set of actions. Resource rules refine a
+# grant for one resource type (and optionally one resource id):
+#   {"agent": "BillingAgent", "action": "billing_read",
+#    "resource_type": "bill", "resource_id": "42", "effect": "deny"}
+# The most specific rule wins (id over type); a matching rule overrides
+# the agent's base grant either way. `version` must increase whenever the
+# file is edited; each access log's notes record the version that decided.
+DEFAULT_POLICY: Dict[str, Any] = {
+    "version": 1,
+    "agents": {
+        "IntakeAgent": ["identity_read", "identity_write", "create_visit"],
+        "RecordsAgent": ["patient_read", "visit_read", "visit_write"],
+        "DiagnosisAgent": ["visit_read_anonymized"],
+        "RoomAgent": ["room_read", "room_write"],
+        "BillingAgent": ["billing_create", "billing_read", "visit_basic_read"],
+        "SecurityAgent": ["logs_read"],
+    },
+    "resource_rules": [],
+}
+
+EFFECTS = ("allow", "deny")
+
+# Relative policy paths are resolved here, not against the working directory
+_PACKAGE_DIR = Path(__file__).resolve().parent.parent
+
+
+def validate_policy(policy: Dict[str, Any]) -> None:
+    if not isinstance(policy, dict):
+        raise ValueError("Policy must be a JSON object")
+    if not isinstance(policy.get("version"), int):
+        raise ValueError("Policy is missing an integer 'version'")
+    agents = policy.get("agents")
+    if not isinstance(agents, dict):
+        raise ValueError("Policy 'agents' must map agent names to action lists")
+    for agent, actions in agents.items():
+        if not isinstance(actions, list) or not all(isinstance(a, str) for a in actions):
+            raise ValueError(f"Policy actions for {agent!r} must be a list of strings")
+    rules = policy.get("resource_rules") or []
+    if not isinstance(rules, list):
+        raise ValueError("Policy 'resource_rules' must be a list")
+    for rule in rules:
+        if not isinstance(rule, dict):
+            raise ValueError(f"Resource rule {rule!r} must be an object")
+        for field in ("agent", "action", "resource_type"):
+            if not rule.get(field):
+                raise ValueError(f"Resource rule {rule!r} is missing {field!r}")
+        if rule.get("effect") not in EFFECTS:
+            raise ValueError(f"Resource rule {rule!r} has invalid effect {rule.get('effect')!r}")
+
+
+def load_policy(path: str) -> Dict[str, Any]:
+    """
+    Load and validate a policy from a JSON file.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        policy = json.load(f)
+    validate_policy(policy)
+    return policy
+
+
+class CompiledPolicy:
+    """
+    A policy compiled for constant-time decisions.
+
+    Agents and actions get integer ids; each agent's grants are one int
+    bitmask over action ids. Resource rules hang off a second bitmask
+    that marks (agent, action) pairs with any rule, so the common case –
+    no resource rule – is two dict lookups and a bit test.
+    """
+
+    def __init__(self, policy: Dict[str, Any]):
+        validate_policy(policy)
+        self.version: int = policy["version"]
+
+        agents = policy["agents"]
+        rules = policy.get("resource_rules") or []
+        action_names: List[str] = []
+        for actions in agents.values():
+            action_names.extend(actions)
+        action_names.extend(rule["action"] for rule in rules)
+        self.actions: List[str] = list(dict.fromkeys(action_names))
+        self.agents: List[str] = list(dict.fromkeys([*agents, *(r["agent"] for r in rules)]))
+
+        self._action_ids = {name: idx for idx, name in enumerate(self.actions)}
+        self._agent_ids = {name: idx for idx, name in enumerate(self.agents)}
+
+        self._grants = [0] * len(self.agents)
+        for agent, actions in agents.items():
+            mask = 0
+            for action in actions:
+                mask |= 1 << self._action_ids[action]
+            self._grants[self._agent_ids[agent]] = mask
+
+        # (agent, action) slot -> resource_type -> resource_id (None = any) -> allowed
+        self._scoped = [0] * len(self.agents)
+        self._rules: Dict[int, Dict[str, Dict[Optional[str], bool]]] = {}
+        n_actions = len(self.actions)
+        for rule in rules:
+            agent_id = self._agent_ids[rule["agent"]]
+            action_id = self._action_ids[rule["action"]]
+            self._scoped[agent_id] |= 1 << action_id
+            by_type = self._rules.setdefault(agent_id * n_actions + action_id, {})
+            resource_id = rule.get("resource_id")
+            by_type.setdefault(rule["resource_type"], {})[
+                str(resource_id) if resource_id is not None else None
+            ] = rule["effect"] == "allow"
+
+        self.permissions: Dict[str, Set[str]] = {
+            agent: set(actions) for agent, actions in agents.items()
+        }
+
+    def allows(
+        self,
+        agent_name: str,
+        action: str,
+        resource_type: Optional[str] = None,
+        resource_id: Optional[str] = None,
+    ) -> bool:
+        agent_id = self._agent_ids.get(agent_name)
+        action_id = self._action_ids.get(action)
+        if agent_id is None or action_id is None:
+            return False
+        if self._scoped[agent_id] >> action_id & 1 and resource_type is not None:
+            by_id = self._rules[agent_id * len(self.actions) + action_id].get(resource_type)
+            if by_id is not None:
+                decision = by_id.get(resource_id)
+                if decision is None:
+                    decision = by_id.get(None)
+                if decision is not None:
+                    return decision
+        return bool(self._grants[agent_id] >> action_id & 1)
+
+
+class PolicyStore:
+    """
+    The current CompiledPolicy for a policy file, hot-reloaded when the
+    file changes (checked at most every `reload_interval` seconds).
+
+    A new policy is compiled off to the side and swapped in with one
+    assignment, so every decision sees exactly one policy version. A file
+    that fails to load or validate leaves the previous policy in place
+    and is reported in `last_error`, as does a version number lower than
+    the active one. Without a file, DEFAULT_POLICY is used. A relative
+    `path` is taken from the hospital_ai_system directory.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = SECURITY_POLICY_PATH,
+        reload_interval: float = SECURITY_POLICY_RELOAD_SEC,
+    ):
+        self.path = str(_PACKAGE_DIR / path) if path is not None else None
+        self.reload_interval = reload_interval
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._signature: Optional[tuple] = None
+        self._next_check = 0.0
+        self._compiled = CompiledPolicy(DEFAULT_POLICY)
+        self.reload()
+
+    def _file_signature(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.path)
+        except (OSError, TypeError):
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def reload(self) -> bool:
+        """
+        Recompile if the file changed since the last load. Returns True
+        when a new policy was swapped in.
+        """
+        with self._lock:
+            self._next_check = time.monotonic() + self.reload_interval
+            signature = self._file_signature()
+            if signature == self._signature:
+                return False
+            previous, self._signature = self._signature, signature
+            if signature is None and previous is not None:
+                self.last_error = f"Policy file {self.path!r} disappeared; keeping version {self._compiled.version}"
+                return False
+            try:
+                policy = load_policy(self.path) if signature is not None else DEFAULT_POLICY
+                compiled = CompiledPolicy(policy)
+                if compiled.version < self._compiled.version:
+                    raise ValueError(
+                        f"Policy version {compiled.version} is older than the active "
+                        f"version {self._compiled.version}"
+                    )
+            except (OSError, ValueError, TypeError, AttributeError) as exc:
+                # Anything a malformed file can raise keeps the old policy
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                return False
+            self.last_error = None
+            self._compiled = compiled
+            return True
+
+    def current(self) -> CompiledPolicy:
+        if time.monotonic() >= self._next_check:
+            self.reload()
+        return self._compiled
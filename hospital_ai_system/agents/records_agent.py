@@ -1,20 +1,69 @@
-from typing import Optional, Dict, Any, List
+import re
+from typing import Optional, Dict, Any, Iterator, List, Sequence, Set, Tuple
 
+from config import DB_ITER_BATCH_SIZE
+from core.models import Patient, Visit
 from data.db import Database
 
 
+PATIENT_COLUMNS = ("id", "name", "phone", "age", "gender", "height", "weight")
+
+_VISIT_WITH_PATIENT_SQL = """
+    SELECT
+        v.*,
+        p.name AS patient_name,
+        p.phone AS patient_phone,
+        p.age AS patient_age,
+        p.gender AS patient_gender
+    FROM visits v
+    JOIN patients p ON v.patient_id = p.id
+"""
+
+_NON_NAME_CHARS = re.compile(r"[^\w\s]|\d|_")
+
+
+def _patient_projection(columns: Optional[Sequence[str]]) -> str:
+    """
+    SELECT list for the requested patient columns; `id` is always
+    included because it is the pagination cursor.
+    """
+    if not columns:
+        return ", ".join(PATIENT_COLUMNS)
+    unknown = [c for c in columns if c not in PATIENT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown patient column(s): {', '.join(unknown)}")
+    return ", ".join(dict.fromkeys(("id", *columns)))
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _fts_string(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _name_similarity(query_grams: Set[str], name: str) -> float:
+    # Dice coefficient over trigrams: tolerant of typos anywhere in the name
+    grams = _trigrams(" ".join(name.lower().split()))
+    if not query_grams or not grams:
+        return 0.0
+    return 2.0 * len(query_grams & grams) / (len(query_grams) + len(grams))
+
+
 class RecordsAgent:
     def __init__(self, db: Database):
         self.db = db
+        self._search_index: Optional[bool] = None
 
     # -------- Patient helpers --------
 
     def find_patient_by_phone_or_name(
         self, phone: Optional[str], name: Optional[str]
-    ) -> Optional[Dict[str, Any]]:
+    ) -> Optional[Patient]:
         """
         Try to find a patient first by phone, then by exact name.
-        Returns a dict row or None.
+        Returns a Patient row or None.
         """
         phone = (phone or "").strip()
         name = (name or "").strip()
@@ -24,6 +73,7 @@ class RecordsAgent:
                 "SELECT * FROM patients WHERE phone = ? LIMIT 1;",
                 (phone,),
                 fetchone=True,
+                model=Patient,
             )
             if row:
                 return row
@@ -33,25 +83,192 @@ class RecordsAgent:
                 "SELECT * FROM patients WHERE name = ? ORDER BY id DESC LIMIT 1;",
                 (name,),
                 fetchone=True,
+                model=Patient,
             )
             if row:
                 return row
 
         return None
 
-    def list_patients(self) -> List[Dict[str, Any]]:
+    def search_patients(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Fuzzy, ranked patient search by name and/or phone (at least three
+        letters or digits).
+
+        Candidates come from the patients_search trigram index in three
+        passes, stopping once there are enough: every name trigram (and
+        the phone digits), the phone digits alone, then any two of the
+        rarest name trigrams – which still matches a name with a typo.
+        Candidates are ranked by trigram similarity to the typed name
+        plus a bonus for a phone match; each row carries `match_score`
+        in [0, 2].
+        """
+        text = " ".join((query or "").lower().split())
+        digits = "".join(ch for ch in text if ch.isdigit())
+        name = " ".join(_NON_NAME_CHARS.sub(" ", text).split())
+        name_grams = _trigrams(name)
+        wanted = max(limit * 20, 200)
+
+        if self._has_search_index():
+            if not name_grams and len(digits) < 3:
+                return []  # shorter than one trigram
+            phone_term = f"phone : {_fts_string(digits)}" if len(digits) >= 3 else None
+            passes = []
+            if name_grams:
+                name_all = "name : (" + " AND ".join(map(_fts_string, sorted(name_grams))) + ")"
+                passes.append(f"{name_all} AND {phone_term}" if phone_term else name_all)
+            if phone_term:
+                passes.append(phone_term)
+            rare = self._rarest_trigrams(name_grams, 6)
+            if len(rare) >= 2:
+                pairs = [
+                    f"({_fts_string(a)} AND {_fts_string(b)})"
+                    for i, a in enumerate(rare)
+                    for b in rare[i + 1:]
+                ]
+                passes.append("name : (" + " OR ".join(pairs) + ")")
+
+            candidates: Dict[int, Dict[str, Any]] = {}
+            for expression in passes:
+                if len(candidates) >= wanted:
+                    break
+                # Newest first, unranked: ordering by bm25 would score every
+                # match, which on common trigrams means most of the table.
+                for row in self.db.execute(
+                    """
+                    SELECT p.*
+                    FROM patients_search s
+                    JOIN patients p ON p.id = s.rowid
+                    WHERE patients_search MATCH ?
+                    ORDER BY s.rowid DESC
+                    LIMIT ?;
+                    """,
+                    (expression, wanted),
+                    fetchall=True,
+                ):
+                    candidates.setdefault(row["id"], row)
+            rows = list(candidates.values())
+        elif name or digits:
+            # No FTS5 in this SQLite build
+            rows = self.db.execute(
+                "SELECT * FROM patients WHERE name LIKE ? OR phone LIKE ? ORDER BY id DESC LIMIT ?;",
+                (f"%{name or text}%", f"%{digits or text}%", wanted),
+                fetchall=True,
+            )
+        else:
+            return []
+
+        def score(row: Dict[str, Any]) -> float:
+            if name_grams:
+                value = _name_similarity(name_grams, row["name"])
+            else:
+                value = 1.0 if name and name in row["name"].lower() else 0.0
+            if len(digits) >= 3 and digits in "".join(ch for ch in row["phone"] if ch.isdigit()):
+                value += 1.0
+            return value
+
+        for row in rows:
+            row["match_score"] = round(score(row), 4)
+        # Stable sort: equal scores keep the newest patient first
+        rows.sort(key=lambda row: -row["match_score"])
+        return rows[:limit]
+
+    def _rarest_trigrams(self, grams: Set[str], count: int) -> List[str]:
+        """
+        Up to `count` of `grams` that occur in the index, fewest
+        matching patients first.
+        """
+        frequencies = []
+        for gram in grams:
+            row = self.db.execute(
+                "SELECT doc FROM patients_search_vocab WHERE col = 'name' AND term = ?;",
+                (gram,),
+                fetchone=True,
+            )
+            if row is not None:
+                frequencies.append((row["doc"], gram))
+        return [gram for _doc, gram in sorted(frequencies)[:count]]
+
+    def _has_search_index(self) -> bool:
+        if self._search_index is None:
+            self._search_index = (
+                self.db.execute(
+                    "SELECT 1 AS found FROM sqlite_master WHERE name = 'patients_search';",
+                    fetchone=True,
+                )
+                is not None
+            )
+        return self._search_index
+
+    def list_patients(
+        self,
+        limit: int = 100,
+        before_id: Optional[int] = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Newest-first page of patients. Pass the smallest id of the
+        previous page as `before_id` for the next one; `columns` limits
+        the fields fetched (see PATIENT_COLUMNS).
+        """
+        where = "WHERE id < ?" if before_id is not None else ""
+        params = (before_id, limit) if before_id is not None else (limit,)
         return self.db.execute(
-            "SELECT * FROM patients ORDER BY id DESC;",
-            (),
+            f"""
+            SELECT {_patient_projection(columns)}
+            FROM patients
+            {where}
+            ORDER BY id DESC
+            LIMIT ?;
+            """,
+            params,
             fetchall=True,
         )
 
-    def get_patient(self, patient_id: int) -> Optional[Dict[str, Any]]:
-        return self.db.execute(
-            "SELECT * FROM patients WHERE id = ?;",
-            (patient_id,),
-            fetchone=True,
-        )
+    def get_patient_page(
+        self,
+        limit: int = 100,
+        before_id: Optional[int] = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        list_patients() plus the cursor for the next (older) page, or
+        None when this is the last page.
+        """
+        rows = self.list_patients(limit=limit + 1, before_id=before_id, columns=columns)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, rows[-1]["id"]
+        return rows, None
+
+    def iter_patients(
+        self, columns: Optional[Sequence[str]] = None, batch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Every patient, newest first, fetched lazily one page at a time –
+        memory stays at one page however large the registry is, and no
+        read transaction is held open between pages.
+        """
+        before_id = None
+        while True:
+            rows, before_id = self.get_patient_page(batch_size, before_id, columns)
+            yield from rows
+            if before_id is None:
+                return
+
+    def get_patient(self, patient_id: int) -> Optional[Patient]:
+        patient = self.db.cached_row("patients", patient_id)
+        if patient is None:
+            patient = self.db.remember(
+                "patients",
+                self.db.execute(
+                    "SELECT * FROM patients WHERE id = ?;",
+                    (patient_id,),
+                    fetchone=True,
+                    model=Patient,
+                ),
+            )
+        return patient
 
     # -------- Visit helpers --------
 
@@ -64,17 +281,22 @@ class RecordsAgent:
         weight: Optional[float],
         symptoms: str,
     ) -> int:
-        visit_id = self.db.insert(
-            """
-            INSERT INTO visits (
-                patient_id, symptoms, age, gender, height, weight,
-                predicted_issues, risk_level, allocated_room, status
-            )
-            VALUES (?, ?, ?, ?, ?, ?, NULL, NULL, NULL, 'ongoing');
-            """,
-            (patient_id, symptoms, age, gender, height, weight),
+        visit = self.db.insert_returning(
+            "visits",
+            {
+                "patient_id": patient_id,
+                "symptoms": symptoms,
+                "age": age,
+                "gender": gender,
+                "height": height,
+                "weight": weight,
+                "predicted_issues": None,
+                "risk_level": None,
+                "allocated_room": None,
+                "status": "ongoing",
+            },
         )
-        return visit_id
+        return visit["id"]
 
     def update_visit_prediction(
         self,
@@ -82,54 +304,99 @@ class RecordsAgent:
         predicted_issues: str,
         risk_level: str,
     ) -> None:
-        self.db.execute(
+        self.db.update_returning(
+            "visits",
+            {"predicted_issues": predicted_issues, "risk_level": risk_level},
+            "id = ?",
+            (visit_id,),
+        )
+
+    def update_visit_predictions(self, rows: List[Tuple[str, str, int]]) -> int:
+        """
+        Bulk version of update_visit_prediction:
+        rows are (predicted_issues, risk_level, visit_id).
+        """
+        identity = self.db.identity_map()
+        if identity is not None:
+            for _issues, _risk, visit_id in rows:
+                identity.discard("visits", visit_id)
+        return self.db.executemany(
             """
             UPDATE visits
             SET predicted_issues = ?, risk_level = ?
             WHERE id = ?;
             """,
-            (predicted_issues, risk_level, visit_id),
-            commit=True,
+            rows,
         )
 
     def update_visit_room(self, visit_id: int, room_number: str) -> None:
-        self.db.execute(
+        self.db.update_returning("visits", {"allocated_room": room_number}, "id = ?", (visit_id,))
+
+    def set_visit_status(self, visit_id: int, status: str) -> None:
+        self.db.update_returning("visits", {"status": status}, "id = ?", (visit_id,))
+
+    def get_visit(self, visit_id: int) -> Optional[Visit]:
+        visit = self.db.cached_row("visits", visit_id)
+        if visit is None:
+            visit = self.db.remember(
+                "visits",
+                self.db.execute(
+                    "SELECT * FROM visits WHERE id = ?;",
+                    (visit_id,),
+                    fetchone=True,
+                    model=Visit,
+                ),
+            )
+        return visit
+
+    def list_visits_for_scoring(self, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        """
+        Next chunk of visits (by id) with only the anonymized clinical
+        fields DiagnosisAgent may see, plus the current prediction.
+        """
+        return self.db.execute(
             """
-            UPDATE visits
-            SET allocated_room = ?
-            WHERE id = ?;
+            SELECT id, symptoms, age, gender, height, weight,
+                   predicted_issues, risk_level
+            FROM visits
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?;
             """,
-            (room_number, visit_id),
-            commit=True,
+            (after_id, limit),
+            fetchall=True,
         )
 
-    def set_visit_status(self, visit_id: int, status: str) -> None:
-        self.db.execute(
-            "UPDATE visits SET status = ? WHERE id = ?;",
-            (status, visit_id),
-            commit=True,
+    def iter_visits(
+        self, after_id: int = 0, batch_size: int = DB_ITER_BATCH_SIZE
+    ) -> Iterator[Visit]:
+        """
+        Every visit with id > `after_id`, in id order, streamed
+        `batch_size` rows at a time.
+        """
+        return self.db.iter_query(
+            "SELECT * FROM visits WHERE id > ? ORDER BY id;",
+            (after_id,),
+            batch_size,
+            model=Visit,
         )
 
-    def get_visit(self, visit_id: int) -> Optional[Dict[str, Any]]:
+    def get_visit_with_patient(self, visit_id: int) -> Optional[Dict[str, Any]]:
         return self.db.execute(
-            "SELECT * FROM visits WHERE id = ?;",
+            f"{_VISIT_WITH_PATIENT_SQL} WHERE v.id = ?;",
             (visit_id,),
             fetchone=True,
         )
 
-    def get_visit_with_patient(self, visit_id: int) -> Optional[Dict[str, Any]]:
-        return self.db.execute(
-            """
-            SELECT
-                v.*,
-                p.name AS patient_name,
-                p.phone AS patient_phone,
-                p.age AS patient_age,
-                p.gender AS patient_gender
-            FROM visits v
-            JOIN patients p ON v.patient_id = p.id
-            WHERE v.id = ?;
-            """,
-            (visit_id,),
-            fetchone=True,
+    def iter_visits_with_patients(
+        self, after_id: int = 0, batch_size: int = DB_ITER_BATCH_SIZE
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming get_visit_with_patient() over every visit with
+        id > `after_id`, in id order.
+        """
+        return self.db.iter_query(
+            f"{_VISIT_WITH_PATIENT_SQL} WHERE v.id > ? ORDER BY v.id;",
+            (after_id,),
+            batch_size,
         )
@@ -1,76 +1,148 @@
-from typing import Optional, Dict, Any
+from typing import Any, Dict, List, Mapping, Optional
 
+from agents.room_waitlist import RoomWaitlist
+from core.models import Room
 from data.db import Database
 
 
 class RoomAgent:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, waitlist: Optional[RoomWaitlist] = None):
         self.db = db
+        self.waitlist = waitlist
 
-    def assign_room(self, patient_id: int, visit_id: int) -> Optional[Dict[str, Any]]:
+    def assign_room(self, patient_id: int, visit_id: int) -> Optional[Room]:
         """
-        Find the first free room, mark it occupied for this patient,
-        and record the room on the visit row.
+        Atomically claim the first free room for this patient and record
+        the room on the visit row.
 
-        Returns the room dict if assigned, or None if no free room.
+        The claim is a single conditional UPDATE ... RETURNING inside an
+        immediate transaction, so two receptionists can never be handed
+        the same room. Contention on the write lock is retried a bounded
+        number of times by Database.transaction().
+
+        A visit that already holds a room keeps it: that Room is returned
+        and no second room is claimed.
+
+        Returns the claimed Room, or None if no free room.
         """
+        with self.db.transaction(immediate=True):
+            held = self.db.execute(
+                "SELECT * FROM rooms WHERE current_visit_id = ? AND status = 'occupied';",
+                (visit_id,),
+                fetchone=True,
+                model=Room,
+            )
+            if held is not None:
+                if self.waitlist is not None:
+                    self.waitlist.remove(visit_id)
+                return held
 
-        # 1) Find first free room
-        room = self.db.execute(
-            "SELECT * FROM rooms WHERE status = 'free' ORDER BY id LIMIT 1;",
-            (),
-            fetchone=True,
-        )
-        if not room:
-            # No room currently available
-            return None
+            # 1) Claim the first free room; the status guard makes the
+            #    UPDATE a no-op if someone else got there first.
+            claimed = self.db.update_returning(
+                "rooms",
+                {
+                    "status": "occupied",
+                    "current_patient_id": patient_id,
+                    "current_visit_id": visit_id,
+                },
+                """
+                id = (SELECT id FROM rooms WHERE status = 'free' ORDER BY id LIMIT 1)
+                AND status = 'free'
+                """,
+            )
+            if not claimed:
+                # No room currently available
+                return None
+            room = claimed[0]
 
-        # 2) Mark room as occupied and attach patient
-        self.db.execute(
-            """
-            UPDATE rooms
-            SET status = 'occupied',
-                current_patient_id = ?
-            WHERE id = ?;
-            """,
-            (patient_id, room["id"]),
-            commit=True,
-        )
+            # 2) Store which room this visit is using
+            #    (so that we can free it later in free_room_for_visit)
+            self.db.update_returning(
+                "visits", {"allocated_room": room["room_number"]}, "id = ?", (visit_id,)
+            )
 
-        # 3) Store which room this visit is using
-        #    (so that we can free it later in free_room_for_visit)
-        self.db.execute(
-            """
-            UPDATE visits
-            SET allocated_room = ?
-            WHERE id = ?;
-            """,
-            (room["room_number"], visit_id),
-            commit=True,
-        )
+            # 3) A visit that was waiting for a room no longer is
+            if self.waitlist is not None:
+                self.waitlist.remove(visit_id)
 
-        return room
+            return room
 
-    def free_room_for_visit(self, visit: Dict[str, Any]) -> None:
+    def enqueue_visit(self, visit: Mapping[str, Any]) -> Optional[int]:
+        """
+        Put a visit that could not get a room on the waitlist (or refresh
+        its priority). Returns its place in the queue, or None without a
+        waitlist.
+        """
+        if self.waitlist is None:
+            return None
+        with self.db.transaction(immediate=True):
+            self.waitlist.enqueue(visit["id"], visit["patient_id"], visit.get("risk_level"))
+            return self.waitlist.position(visit["id"])
+
+    def assign_waiting(self) -> List[Dict[str, Any]]:
+        """
+        Hand free rooms to waiting visits, most urgent first, until either
+        runs out. Returns [{"visit_id", "room"}] for each assignment.
+        """
+        assigned: List[Dict[str, Any]] = []
+        if self.waitlist is None:
+            return assigned
+        with self.db.transaction(immediate=True):
+            while True:
+                entry = self.waitlist.peek()
+                if entry is None:
+                    break
+                _priority, _arrival, visit_id, patient_id = entry
+                room = self.assign_room(patient_id=patient_id, visit_id=visit_id)
+                if room is None:
+                    break
+                assigned.append({"visit_id": visit_id, "room": room})
+        return assigned
+
+    def free_room_for_visit(self, visit: Mapping[str, Any]) -> List[Dict[str, Any]]:
         """
         Free the room associated with this visit.
 
-        Expects `visit` to contain an `allocated_room` field.
-        If it's missing / empty, this does nothing.
+        Expects `visit` to contain `id` and `allocated_room` fields.
+        If the room is missing / empty, this does nothing. The room is only
+        freed while it is still held by this visit, so a stale visit can
+        never release a room that was re-assigned to another visit, even
+        one of the same patient.
+
+        With a waitlist, the visit leaves the queue if it was still on it,
+        and a freed room goes straight to the most urgent waiting visit in
+        the same transaction. Returns those assignments (see
+        assign_waiting()).
         """
+        if self.waitlist is None:
+            self._release_room(visit)
+            return []
+        with self.db.transaction(immediate=True):
+            if visit.get("id") is not None:
+                self.waitlist.remove(visit["id"])
+            if not self._release_room(visit):
+                return []
+            return self.assign_waiting()
+
+    def _release_room(self, visit: Mapping[str, Any]) -> bool:
         room_number = visit.get("allocated_room")
         if not room_number:
             # No room stored on visit – nothing to free
-            return
+            return False
 
-        # Free the room associated with this visit
-        self.db.execute(
+        # Free the room associated with this visit. Rooms claimed before
+        # rooms recorded their visit fall back to the patient check.
+        freed = self.db.update_returning(
+            "rooms",
+            {"status": "free", "current_patient_id": None, "current_visit_id": None},
             """
-            UPDATE rooms
-            SET status = 'free',
-                current_patient_id = NULL
-            WHERE room_number = ?;
+            room_number = ? AND (
+                current_visit_id = ?
+                OR (current_visit_id IS NULL
+                    AND (current_patient_id = ? OR current_patient_id IS NULL))
+            )
             """,
-            (room_number,),
-            commit=True,
+            (room_number, visit.get("id"), visit.get("patient_id")),
         )
+        return bool(freed)
@@ -0,0 +1,188 @@
+import heapq
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents.diagnosis_rules import RISK_LEVELS
+from data.db import Database
+
+# Lower is more urgent: highest risk first, undiagnosed visits last
+RISK_PRIORITY: Dict[str, int] = {
+    risk: len(RISK_LEVELS) - 1 - rank for rank, risk in enumerate(RISK_LEVELS)
+}
+UNSCORED_PRIORITY = len(RISK_LEVELS)
+
+# (priority, arrival id, visit_id, patient_id)
+WaitlistEntry = Tuple[int, int, int, int]
+
+_ENQUEUE_SQL = """
+    INSERT INTO room_waitlist (visit_id, patient_id, priority, risk_level, enqueued_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(visit_id) DO UPDATE SET
+        priority = excluded.priority,
+        risk_level = excluded.risk_level
+    RETURNING id;
+"""
+
+
+def risk_priority(risk_level: Optional[str]) -> int:
+    return RISK_PRIORITY.get((risk_level or "").lower(), UNSCORED_PRIORITY)
+
+
+class RoomWaitlist:
+    """
+    Visits waiting for a room, most urgent risk first, then first come
+    first served.
+
+    The queue is a binary heap in memory, so peek/enqueue/remove cost
+    O(log n), mirrored row for row in `room_waitlist`, which is the
+    source of truth: the heap is rebuilt from it on first use and after
+    any rollback of a unit of work that changed it. Removals and
+    re-prioritisations leave the old heap entry behind and it is skipped
+    when it reaches the top (compacted once stale entries dominate).
+
+    Call the mutating methods inside an immediate transaction (RoomAgent
+    does): writers are then serialised by SQLite, and the heap always
+    matches what the next writer will see. One process owns the queue.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._lock = threading.RLock()
+        self._heap: List[WaitlistEntry] = []
+        self._live: Dict[int, WaitlistEntry] = {}
+        self._loaded = False
+
+    # ---------- Heap maintenance ----------
+
+    def _invalidate(self) -> None:
+        with self._lock:
+            self._loaded = False
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        rows = self.db.execute(
+            "SELECT priority, id, visit_id, patient_id FROM room_waitlist;", fetchall=True
+        )
+        self._heap = [
+            (r["priority"], r["id"], r["visit_id"], r["patient_id"]) for r in rows
+        ]
+        heapq.heapify(self._heap)
+        self._live = {entry[2]: entry for entry in self._heap}
+        self._loaded = True
+
+    def _changed(self) -> None:
+        # Our rows may be undone; rebuild from the table if they are
+        self.db.on_rollback(self._invalidate)
+        if len(self._heap) > 2 * len(self._live) + 64:
+            self._heap = list(self._live.values())
+            heapq.heapify(self._heap)
+
+    # ---------- Queue ----------
+
+    def enqueue(self, visit_id: int, patient_id: int, risk_level: Optional[str]) -> None:
+        """
+        Add a visit, or update its priority if it is already waiting
+        (keeping its place in the arrival order).
+        """
+        priority = risk_priority(risk_level)
+        with self._lock:
+            self._ensure_loaded()
+            rows = self.db.execute(
+                _ENQUEUE_SQL,
+                (
+                    visit_id,
+                    patient_id,
+                    priority,
+                    risk_level,
+                    datetime.utcnow().isoformat(timespec="seconds"),
+                ),
+                fetchall=True,
+            )
+            entry = (priority, rows[0]["id"], visit_id, patient_id)
+            if self._live.get(visit_id) != entry:
+                self._live[visit_id] = entry
+                heapq.heappush(self._heap, entry)
+            self._changed()
+
+    def reprioritize(self, visit_id: int, risk_level: Optional[str]) -> bool:
+        """
+        Re-rank a waiting visit after its risk level changed. Returns
+        False if it was not waiting.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._live.get(visit_id)
+            if entry is None:
+                return False
+            self.enqueue(visit_id, entry[3], risk_level)
+            return True
+
+    def remove(self, visit_id: int) -> bool:
+        """
+        Take a visit off the queue. Returns False if it was not waiting.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if self._live.pop(visit_id, None) is None:
+                return False
+            self.db.execute("DELETE FROM room_waitlist WHERE visit_id = ?;", (visit_id,))
+            self._changed()
+            return True
+
+    def peek(self) -> Optional[WaitlistEntry]:
+        """
+        The most urgent waiting entry, or None when nobody is waiting.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            heap = self._heap
+            while heap and self._live.get(heap[0][2]) is not heap[0]:
+                heapq.heappop(heap)
+            return heap[0] if heap else None
+
+    def __contains__(self, visit_id: int) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            return visit_id in self._live
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._live)
+
+    # ---------- Reading ----------
+
+    def position(self, visit_id: int) -> Optional[int]:
+        """
+        1-based place of a visit in the queue, or None if not waiting.
+        """
+        if visit_id not in self:
+            return None
+        row = self.db.execute(
+            """
+            SELECT COUNT(*) AS ahead FROM room_waitlist w, room_waitlist me
+            WHERE me.visit_id = ? AND (w.priority, w.id) < (me.priority, me.id);
+            """,
+            (visit_id,),
+            fetchone=True,
+        )
+        return row["ahead"] + 1
+
+    def list_waiting(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Waiting visits in the order they will be served.
+        """
+        return self.db.execute(
+            """
+            SELECT w.visit_id, w.patient_id, p.name AS patient_name,
+                   w.risk_level, w.enqueued_at
+            FROM room_waitlist w
+            LEFT JOIN patients p ON p.id = w.patient_id
+            ORDER BY w.priority, w.id
+            LIMIT ?;
+            """,
+            (limit,),
+            fetchall=True,
+        )
@@ -1,25 +1,123 @@
+import sqlite3
 from datetime import datetime
-from typing import Dict, Set, List, Any, Optional
+from typing import Dict, Set, List, Any, Iterator, Optional, Tuple, Union
 
+from agents.anomaly_detector import AnomalyDetector
+from agents.permission_policy import PolicyStore
+from config import AUDIT_FLUSH_TIMEOUT_SEC, AUDIT_STRICT_DENIED, DB_ITER_BATCH_SIZE
+from core.models import AccessLog
+from data.audit_segments import AuditSegmentStore
+from data.audit_writer import AuditWriter, INSERT_ACCESS_LOG_SQL
 from data.db import Database
+from data.rollups import rebuild_access_log_rollups
+
+
+# Statuses counted as "blocked" on the Security Logs dashboard
+BLOCKED_STATUSES = ("DENIED", "BLOCKED", "ERROR")
+
+TimeBound = Union[str, datetime, None]
+
+
+def _iso(value: TimeBound) -> Optional[str]:
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="seconds")
+    return value
+
+
+def _log_filters(
+    agent_name: Optional[str] = None,
+    action: Optional[str] = None,
+    status: Optional[str] = None,
+    since: TimeBound = None,
+    until: TimeBound = None,
+) -> Tuple[List[str], List[Any]]:
+    """
+    WHERE clauses + params shared by the log listing and aggregate queries.
+    Time bounds are ISO strings (or datetimes), since inclusive, until
+    exclusive – timestamps are stored as UTC ISO text, so they compare
+    correctly as strings.
+    """
+    clauses: List[str] = []
+    params: List[Any] = []
+    if agent_name:
+        clauses.append("agent_name = ?")
+        params.append(agent_name)
+    if action:
+        clauses.append("action = ?")
+        params.append(action)
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    if since:
+        clauses.append("timestamp >= ?")
+        params.append(_iso(since))
+    if until:
+        clauses.append("timestamp < ?")
+        params.append(_iso(until))
+    return clauses, params
+
+
+def _rollup_filters(
+    agent_name: Optional[str] = None,
+    action: Optional[str] = None,
+    status: Optional[str] = None,
+    since: TimeBound = None,
+    until: TimeBound = None,
+) -> Tuple[List[str], List[Any]]:
+    """
+    Same filters against access_log_rollups. Rollups are hourly, so time
+    bounds are truncated to the hour: `since` includes its whole hour,
+    `until` excludes its whole hour.
+    """
+    clauses, params = _log_filters(agent_name, action, status)
+    if since:
+        clauses.append("hour >= ?")
+        params.append(_iso(since)[:13])
+    if until:
+        clauses.append("hour < ?")
+        params.append(_iso(until)[:13])
+    return clauses, params
 
 
 class SecurityAgent:
     """
     Handles permissions + access logging + unauthorized detection.
+
+    ALLOWED events go through a background AuditWriter so permission checks
+    never wait on disk. With strict_denied, DENIED events are written
+    synchronously instead – inside a unit of work, as soon as it ends and
+    outside it, so they persist even when the denial makes it roll back.
+
+    Every check also feeds an in-process AnomalyDetector; the alerts it
+    raises are queued to `security_alerts` through the same writer.
+
+    Months older than the hot window are rotated out of access_logs into
+    AuditSegmentStore files; get_logs() reads through to them, warm or cold.
     """
 
-    def __init__(self, db: Database):
+    def __init__(
+        self,
+        db: Database,
+        audit_writer: Optional[AuditWriter] = None,
+        strict_denied: bool = AUDIT_STRICT_DENIED,
+        detector: Optional[AnomalyDetector] = None,
+        segments: Optional[AuditSegmentStore] = None,
+        policy: Optional[PolicyStore] = None,
+    ):
         self.db = db
-        # Define allowed actions per agent
-        self.permissions: Dict[str, Set[str]] = {
-            "IntakeAgent": {"identity_read", "identity_write", "create_visit"},
-            "RecordsAgent": {"patient_read", "visit_read", "visit_write"},
-            "DiagnosisAgent": {"visit_read_anonymized"},
-            "RoomAgent": {"room_read", "room_write"},
-            "BillingAgent": {"billing_create", "billing_read", "visit_basic_read"},
-            "SecurityAgent": {"logs_read"},
-        }
+        self.audit = audit_writer if audit_writer is not None else AuditWriter(db)
+        self.strict_denied = strict_denied
+        self.detector = detector if detector is not None else AnomalyDetector()
+        self.segments = segments if segments is not None else AuditSegmentStore(db)
+        # Allowed actions per agent come from the policy file (hot-reloaded)
+        self.policy = policy if policy is not None else PolicyStore()
+
+    @property
+    def permissions(self) -> Dict[str, Set[str]]:
+        """
+        Agent -> allowed actions of the active policy (read-only view).
+        """
+        return self.policy.current().permissions
 
     def check_permission(
         self,
@@ -29,30 +127,249 @@ class SecurityAgent:
         resource_id: Optional[str],
         notes: str = "",
     ) -> bool:
-        allowed_actions = self.permissions.get(agent_name, set())
-        is_allowed = action in allowed_actions
+        resource_id = str(resource_id) if resource_id else None
+        policy = self.policy.current()
+        is_allowed = policy.allows(agent_name, action, resource_type, resource_id)
 
         status = "ALLOWED" if is_allowed else "DENIED"
         timestamp = datetime.utcnow().isoformat(timespec="seconds")
+        # Audits can tell which policy made the decision
+        version_note = f"[policy v{policy.version}]"
+        notes = f"{notes} {version_note}" if notes else version_note
 
-        self.db.insert(
-            """
-            INSERT INTO access_logs
-            (timestamp, agent_name, action, resource_type, resource_id, status, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?);
-            """,
-            (timestamp, agent_name, action, resource_type, str(resource_id) if resource_id else None, status, notes),
-        )
+        record = (timestamp, agent_name, action, resource_type, resource_id, status, notes)
+
+        if not is_allowed and self.strict_denied:
+            self.db.after_transaction(lambda: self._write_denied(record))
+        else:
+            self.audit.write_access_log(record)
+
+        for alert in self.detector.observe(agent_name, action, record[4], is_allowed):
+            self.audit.write_security_alert(
+                (
+                    alert["timestamp"],
+                    alert["rule"],
+                    alert["agent_name"],
+                    alert["action"],
+                    alert["observed"],
+                    alert["threshold"],
+                    alert["window_sec"],
+                    alert["details"],
+                )
+            )
 
         return is_allowed
 
-    def get_logs(self, limit: int = 100) -> List[Dict[str, Any]]:
-        return self.db.execute(
-            """
+    def _write_denied(self, record: Tuple[Any, ...]) -> None:
+        try:
+            self.db.insert(INSERT_ACCESS_LOG_SQL, record)
+        except sqlite3.Error:
+            # Never lose the row: the writer retries, then dead-letters it
+            self.audit.write_access_log(record)
+
+    def _flush_pending(self) -> None:
+        # Make buffered events visible first. Skipped inside a unit of work:
+        # the writer would have to wait for this thread's write lock. The
+        # wait is bounded: a stalled writer delays reads, never blocks them.
+        if not self.db.in_transaction():
+            self.audit.flush(timeout=AUDIT_FLUSH_TIMEOUT_SEC)
+
+    def get_logs(
+        self,
+        limit: int = 100,
+        before_id: Optional[int] = None,
+        agent_name: Optional[str] = None,
+        action: Optional[str] = None,
+        status: Optional[str] = None,
+        since: TimeBound = None,
+        until: TimeBound = None,
+    ) -> List[AccessLog]:
+        """
+        Newest-first page of access logs (AccessLog rows). Pass the smallest id of the
+        previous page as `before_id` to get the next one (keyset
+        pagination – cost does not grow with how deep you page).
+        Rows rotated into audit segments are included transparently.
+        """
+        self._flush_pending()
+        clauses, params = _log_filters(agent_name, action, status, since, until)
+        if before_id is not None:
+            clauses.append("id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.db.execute(
+            f"""
             SELECT * FROM access_logs
+            {where}
             ORDER BY id DESC
             LIMIT ?;
             """,
-            (limit,),
+            (*params, limit),
             fetchall=True,
+            model=AccessLog,
         )
+        if len(rows) < limit:
+            rows.extend(
+                self.segments.query_logs(
+                    clauses, params, limit - len(rows), _iso(since), _iso(until)
+                )
+            )
+        return rows
+
+    def get_log_page(
+        self, limit: int = 100, before_id: Optional[int] = None, **filters: Any
+    ) -> Tuple[List[AccessLog], Optional[int]]:
+        """
+        get_logs() plus the cursor for the next (older) page, or None
+        when this is the last page.
+        """
+        rows = self.get_logs(limit=limit + 1, before_id=before_id, **filters)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, rows[-1]["id"]
+        return rows, None
+
+    def iter_logs(
+        self,
+        agent_name: Optional[str] = None,
+        action: Optional[str] = None,
+        status: Optional[str] = None,
+        since: TimeBound = None,
+        until: TimeBound = None,
+        batch_size: int = DB_ITER_BATCH_SIZE,
+        after_id: Optional[int] = None,
+    ) -> Iterator[AccessLog]:
+        """
+        Every matching access log, oldest first – rotated segments, then
+        the hot table – streamed `batch_size` rows at a time, for exports
+        and backfills over the full history. `after_id` resumes a previous
+        pass.
+        """
+        self._flush_pending()
+        clauses, params = _log_filters(agent_name, action, status, since, until)
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
+        yield from self.segments.iter_logs(clauses, params, batch_size, _iso(since), _iso(until))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        yield from self.db.iter_query(
+            f"SELECT * FROM access_logs {where} ORDER BY id;",
+            params,
+            batch_size,
+            model=AccessLog,
+        )
+
+    def get_log_summary(self, **filters: Any) -> Dict[str, Any]:
+        """
+        Dashboard metrics from the hourly rollups: total events, blocked
+        events, distinct agents and a per-status breakdown. Cost depends on
+        the number of (hour, agent, action, status) buckets, not on the
+        size of the raw log.
+        """
+        self._flush_pending()
+        clauses, params = _rollup_filters(**filters)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        by_status = self.db.execute(
+            f"""
+            SELECT status, SUM(event_count) AS cnt
+            FROM access_log_rollups
+            {where}
+            GROUP BY status
+            ORDER BY status;
+            """,
+            params,
+            fetchall=True,
+        )
+        agents = self.db.execute(
+            f"SELECT COUNT(DISTINCT agent_name) AS cnt FROM access_log_rollups {where};",
+            params,
+            fetchone=True,
+        )
+
+        status_counts = {row["status"]: row["cnt"] for row in by_status}
+        return {
+            "total": sum(status_counts.values()),
+            "blocked": sum(
+                cnt for st, cnt in status_counts.items() if st.upper() in BLOCKED_STATUSES
+            ),
+            "unique_agents": agents["cnt"],
+            "by_status": status_counts,
+        }
+
+    def get_log_timeline(self, **filters: Any) -> List[Dict[str, Any]]:
+        """
+        Events and blocked events per hour (oldest first), from the rollups.
+        """
+        self._flush_pending()
+        clauses, params = _rollup_filters(**filters)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        placeholders = ", ".join("?" for _ in BLOCKED_STATUSES)
+        return self.db.execute(
+            f"""
+            SELECT hour,
+                   SUM(event_count) AS total,
+                   SUM(CASE WHEN upper(status) IN ({placeholders})
+                            THEN event_count ELSE 0 END) AS blocked
+            FROM access_log_rollups
+            {where}
+            GROUP BY hour
+            ORDER BY hour;
+            """,
+            (*BLOCKED_STATUSES, *params),
+            fetchall=True,
+        )
+
+    def list_log_agents(self) -> List[str]:
+        self._flush_pending()
+        rows = self.db.execute(
+            "SELECT DISTINCT agent_name FROM access_log_rollups ORDER BY agent_name;",
+            (),
+            fetchall=True,
+        )
+        return [row["agent_name"] for row in rows]
+
+    def get_alerts(
+        self,
+        limit: int = 50,
+        agent_name: Optional[str] = None,
+        rule: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Newest anomaly alerts first.
+        """
+        self._flush_pending()
+        clauses: List[str] = []
+        params: List[Any] = []
+        if agent_name:
+            clauses.append("agent_name = ?")
+            params.append(agent_name)
+        if rule:
+            clauses.append("rule = ?")
+            params.append(rule)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self.db.execute(
+            f"SELECT * FROM security_alerts {where} ORDER BY id DESC LIMIT ?;",
+            (*params, limit),
+            fetchall=True,
+        )
+
+    def rebuild_rollups(self) -> int:
+        """
+        Recompute the hourly rollups from the raw log. Returns the number
+        of rollup rows.
+        """
+        self.audit.flush()
+        return rebuild_access_log_rollups(self.db, self.segments.rollup_rows())
+
+    def rotate_logs(self) -> Dict[str, List[str]]:
+        """
+        Move old months into segment files and compress the oldest ones.
+        """
+        self.audit.flush()
+        return self.segments.maintain()
+
+    def close(self) -> None:
+        """
+        Flush buffered audit records to disk and stop the writer.
+        """
+        self.audit.close()
@@ -0,0 +1,79 @@
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over a fixed keyword list.
+
+    Built once; scan() then finds every keyword occurring anywhere in a
+    text (substring semantics, overlaps included) in a single pass, so the
+    cost depends on the text length, not on how many keywords exist.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: List[str] = []
+        self._index: Dict[str, int] = {}
+        for keyword in keywords:
+            keyword = keyword.lower()
+            if keyword and keyword not in self._index:
+                self._index[keyword] = len(self.keywords)
+                self.keywords.append(keyword)
+
+        # Node 0 is the root. _goto[n] maps a character to the next node,
+        # _out[n] holds every keyword id that ends at node n (including
+        # those inherited through failure links).
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        self._build()
+
+    def _build(self) -> None:
+        ends: List[List[int]] = [[]]
+        for keyword_id, keyword in enumerate(self.keywords):
+            node = 0
+            for ch in keyword:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    ends.append([])
+                node = nxt
+            ends[node].append(keyword_id)
+
+        queue = deque(self._goto[0].values())
+        order: List[int] = []
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for ch, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                queue.append(child)
+
+        # BFS order guarantees a node's failure target is finalized first
+        self._out = [()] * len(self._goto)
+        for node in order:
+            self._out[node] = tuple(ends[node]) + self._out[self._fail[node]]
+
+    def scan(self, text: str) -> FrozenSet[int]:
+        """
+        Return the ids of every keyword that occurs in `text`.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        found: Set[int] = set()
+        for ch in text.lower():
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return frozenset(found)
+
+    def keyword_id(self, keyword: str) -> int:
+        return self._index[keyword.lower()]
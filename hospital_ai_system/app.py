@@ -1,7 +1,9 @@
+import atexit
+
 import streamlit as st
 from datetime import datetime
 
-from core.orch_main import Orchestrator
+from core.orch_main import Orchestrator, RequestAborted
 
 
 
@@ -254,12 +256,23 @@ def render_header(title: str, subtitle: str = ""):
 
 
 # =========================================================
-# ORCHESTRATOR SESSION
+# ORCHESTRATOR (shared by all sessions)
 # =========================================================
+def _close_orchestrator(orch: Orchestrator) -> None:
+    # Stop the report pool, flush the audit writer, close the DB pool
+    atexit.unregister(orch.close)
+    orch.close()
+
+
+@st.cache_resource(show_spinner=False, on_release=_close_orchestrator)
 def get_orchestrator() -> Orchestrator:
-    if "orchestrator" not in st.session_state:
-        st.session_state["orchestrator"] = Orchestrator()
-    return st.session_state["orchestrator"]
+    # Built once per process and kept across reruns and module reloads;
+    # a new browser tab only gets its own st.session_state, not a new
+    # database / agent stack. Released (and closed) when the cache is
+    # cleared, and closed at interpreter exit otherwise.
+    orch = Orchestrator()
+    atexit.register(orch.close)
+    return orch
 
 
 # =========================================================
@@ -277,8 +290,10 @@ def page_reception_flow(orch: Orchestrator):
         "reception_search_done": False,
         "reception_patient": None,
         "reception_error": None,
+        "reception_similar": [],
         "reception_name": "",
         "reception_phone": "",
+        "reception_report_job": None,
     }
     for k, v in defaults.items():
         if k not in st.session_state:
@@ -331,6 +346,14 @@ def page_reception_flow(orch: Orchestrator):
             st.session_state["reception_error"] = error
             st.session_state["reception_search_done"] = True
 
+            # No exact match: look for near-misses (typos) before a new
+            # record is created
+            similar = []
+            if patient is None and error is None:
+                query = f"{st.session_state['reception_name']} {st.session_state['reception_phone']}"
+                similar, _ = orch.search_patients(query, limit=5)
+            st.session_state["reception_similar"] = similar
+
         # After search
         if st.session_state["reception_search_done"]:
             patient = st.session_state["reception_patient"]
@@ -351,6 +374,19 @@ def page_reception_flow(orch: Orchestrator):
                 )
             else:
                 st.info("New patient – please fill in details below.")
+                similar = st.session_state.get("reception_similar") or []
+                if similar:
+                    st.warning(
+                        "Similar patients already registered – check for a typo before "
+                        "creating a new record:"
+                    )
+                    st.dataframe(
+                        [
+                            {"ID": p["id"], "Name": p["name"], "Phone": p["phone"], "Age": p.get("age")}
+                            for p in similar
+                        ],
+                        use_container_width=True,
+                    )
 
             st.markdown("---")
             st.subheader("Step 2 · Visit Details & Orchestration")
@@ -429,38 +465,48 @@ def page_reception_flow(orch: Orchestrator):
                     st.markdown("</div>", unsafe_allow_html=True)
                     return
 
-                # 1) Register / update patient
-                patient_id, err1 = orch.register_patient(
-                    name=st.session_state["reception_name"],
-                    phone=st.session_state["reception_phone"],
-                    age=int(age) if age > 0 else None,
-                    gender=gender if gender else None,
-                    height=float(height) if height > 0 else None,
-                    weight=float(weight) if weight > 0 else None,
-                )
-                if err1:
-                    st.error(err1)
-                    st.markdown("</div>", unsafe_allow_html=True)
-                    return
-
-                # 2) Create visit
-                visit_id, err2 = orch.create_visit(
-                    patient_id=patient_id,
-                    age=int(age) if age > 0 else None,
-                    gender=gender if gender else None,
-                    height=float(height) if height > 0 else None,
-                    weight=float(weight) if weight > 0 else None,
-                    symptoms=symptoms,
-                )
-                if err2:
-                    st.error(err2)
-                    st.markdown("</div>", unsafe_allow_html=True)
-                    return
-
-                # 3) Run diagnosis
-                visit_after_diag, err3 = orch.run_diagnosis_for_visit(visit_id)
-                if err3:
-                    st.error(err3)
+                # Steps 1-4 are one request: one transaction, and each row
+                # is read from SQLite at most once across the steps. A failed
+                # step aborts the request so nothing half-done is committed;
+                # results are rendered after the write lock is released.
+                assigned_room_info, err4 = None, None
+                try:
+                    with orch.request():
+                        # 1) Register / update patient
+                        patient_id, err1 = orch.register_patient(
+                            name=st.session_state["reception_name"],
+                            phone=st.session_state["reception_phone"],
+                            age=int(age) if age > 0 else None,
+                            gender=gender if gender else None,
+                            height=float(height) if height > 0 else None,
+                            weight=float(weight) if weight > 0 else None,
+                        )
+                        if err1:
+                            raise RequestAborted(err1)
+
+                        # 2) Create visit
+                        visit_id, err2 = orch.create_visit(
+                            patient_id=patient_id,
+                            age=int(age) if age > 0 else None,
+                            gender=gender if gender else None,
+                            height=float(height) if height > 0 else None,
+                            weight=float(weight) if weight > 0 else None,
+                            symptoms=symptoms,
+                        )
+                        if err2:
+                            raise RequestAborted(err2)
+
+                        # 3) Run diagnosis
+                        visit_after_diag, err3 = orch.run_diagnosis_for_visit(visit_id)
+                        if err3:
+                            raise RequestAborted(err3)
+
+                        # 4) Room assignment (no free room is not fatal:
+                        #    the visit joins the waitlist)
+                        if auto_assign_room:
+                            assigned_room_info, err4 = orch.assign_room(visit_id)
+                except RequestAborted as exc:
+                    st.error(str(exc))
                     st.markdown("</div>", unsafe_allow_html=True)
                     return
 
@@ -470,41 +516,61 @@ def page_reception_flow(orch: Orchestrator):
                     f"- Predicted Issues: {visit_after_diag.get('predicted_issues')}"
                 )
                 st.write(f"- Risk Level: {visit_after_diag.get('risk_level')}")
+                if err4:
+                    st.warning(f"Room assignment issue: {err4}")
+                elif assigned_room_info:
+                    room = assigned_room_info["room"]
+                    st.success(
+                        f"Assigned Room {room['room_number']} ({room.get('doctor_name', 'Doctor')})"
+                    )
 
-                # 4) Room assignment
-                if auto_assign_room:
-                    assigned_room_info, err4 = orch.assign_room(visit_id)
-                    if err4:
-                        st.warning(f"Room assignment issue: {err4}")
-                    elif assigned_room_info:
-                        room = assigned_room_info["room"]
-                        st.success(
-                            f"Assigned Room {room['room_number']} ({room.get('doctor_name', 'Doctor')})"
-                        )
-
-                # 5) PDF
+                # 5) PDF (rendered in the background – don't wait for it)
                 if generate_pdf:
-                    pdf_path, err5 = orch.generate_visit_report_pdf(visit_id)
+                    job_id, err5 = orch.submit_visit_report(visit_id)
                     if err5:
                         st.warning(f"PDF generation issue: {err5}")
                     else:
-                        try:
-                            with open(pdf_path, "rb") as f:
-                                pdf_bytes = f.read()
-
-                            st.success("Visit summary PDF generated.")
-                            st.download_button(
-                                label="Download Visit PDF",
-                                data=pdf_bytes,
-                                file_name=f"visit_{visit_id}.pdf",
-                                mime="application/pdf",
-                            )
-                        except FileNotFoundError:
-                            st.warning(f"PDF file not found at: {pdf_path}")
+                        st.session_state["reception_report_job"] = job_id
+
+            render_report_job_status(orch)
 
         st.markdown("</div>", unsafe_allow_html=True)
 
 
+def render_report_job_status(orch: Orchestrator):
+    """
+    Show the latest background PDF job of this session, with a download
+    button once it is rendered.
+    """
+    job_id = st.session_state.get("reception_report_job")
+    if not job_id:
+        return
+
+    job = orch.get_report_job(job_id)
+    if not job:
+        return
+
+    if job["status"] == "done":
+        try:
+            with open(job["pdf_path"], "rb") as f:
+                pdf_bytes = f.read()
+
+            st.success("Visit summary PDF generated.")
+            st.download_button(
+                label="Download Visit PDF",
+                data=pdf_bytes,
+                file_name=f"visit_{job['visit_id']}.pdf",
+                mime="application/pdf",
+            )
+        except FileNotFoundError:
+            st.warning(f"PDF file not found at: {job['pdf_path']}")
+    elif job["status"] == "failed":
+        st.warning(f"PDF generation issue: {job['error']}")
+    else:
+        st.info(f"Visit summary PDF is being generated (job #{job_id})…")
+        st.button("Check PDF status", key="reception_report_refresh")
+
+
 def page_register_patient(orch: Orchestrator):
     render_header(
         "Register / Find Patient (Manual)",
@@ -620,7 +686,17 @@ def page_assign_room(orch: Orchestrator):
                         f"Assigned Room {room['room_number']} ({room['doctor_name']})"
                     )
                     st.write("Updated Visit:")
-                    st.json(visit)
+                    st.json(dict(visit))
+
+    waiting, waitlist_error = orch.get_room_waitlist()
+    if waitlist_error:
+        st.error(waitlist_error)
+    elif waiting:
+        import pandas as pd
+
+        st.markdown("#### Waiting for a room")
+        st.caption("Served highest risk first, then in arrival order, as rooms are freed.")
+        st.dataframe(pd.DataFrame(waiting), use_container_width=True)
 
     st.markdown("</div>", unsafe_allow_html=True)
 
@@ -646,13 +722,19 @@ def page_generate_bill(orch: Orchestrator):
             except ValueError:
                 st.error("Visit ID must be a number.")
             else:
-                bill, error = orch.generate_bill(visit_id, consultation_fee)
+                result, error = orch.generate_bill(visit_id, consultation_fee)
                 if error:
                     st.error(error)
-                elif bill:
+                elif result:
+                    bill = result["bill"]
                     st.success(f"Bill ID: {bill['id']}")
                     st.write(f"Total Amount: ₹{bill['total_amount']}")
-                    st.json(bill)
+                    st.json(dict(bill))
+                    for assignment in result["room_assignments"]:
+                        st.info(
+                            f"Room {assignment['room']['room_number']} was handed to "
+                            f"waiting visit {assignment['visit_id']}."
+                        )
 
     st.markdown("</div>", unsafe_allow_html=True)
 
@@ -668,76 +750,100 @@ def page_security_logs(orch: Orchestrator):
 
     st.markdown('<div class="glass-card">', unsafe_allow_html=True)
 
-    logs = orch.get_security_logs(limit=500)
-
-    if not logs:
-        st.info("No logs yet.")
-        st.markdown("</div>", unsafe_allow_html=True)
-        return
-
-    # Make sure we have a DataFrame
-    df = pd.DataFrame(logs)
-
-    # Normalize column names for easier lookup
-    col_map = {c.lower(): c for c in df.columns}
-
-    # Try to detect status / result column
-    status_col = None
-    for candidate in ["result", "status", "outcome", "action_result"]:
-        if candidate in col_map:
-            status_col = col_map[candidate]
-            break
-
-    # Try to detect agent column
-    agent_col = None
-    for candidate in ["agent", "agent_name", "source"]:
-        if candidate in col_map:
-            agent_col = col_map[candidate]
-            break
+    # --------- Filters --------- #
+    f1, f2, f3, f4 = st.columns(4)
+    with f1:
+        agent_name = st.selectbox("Agent", [""] + orch.list_security_log_agents())
+    with f2:
+        status = st.selectbox("Status", ["", "ALLOWED", "DENIED"])
+    with f3:
+        action = st.text_input("Action")
+    with f4:
+        page_size = st.selectbox("Rows per page", [50, 100, 250, 500], index=1)
+
+    filters = {
+        "agent_name": agent_name or None,
+        "status": status or None,
+        "action": action.strip() or None,
+    }
 
-    total_events = len(df)
+    # Reset paging whenever the filters change
+    filter_key = (agent_name, status, action.strip(), page_size)
+    if st.session_state.get("security_logs_filter_key") != filter_key:
+        st.session_state["security_logs_filter_key"] = filter_key
+        st.session_state["security_logs_cursors"] = [None]
 
-    blocked_events = 0
-    status_counts = None
-    if status_col is not None:
-        status_series = df[status_col].astype(str).str.upper()
-        blocked_events = status_series.isin(["DENIED", "BLOCKED", "ERROR"]).sum()
-        status_counts = status_series.value_counts().sort_index()
+    summary = orch.get_security_log_summary(**filters)
 
-    unique_agents = df[agent_col].nunique() if agent_col is not None else None
+    if summary["total"] == 0:
+        st.info("No matching logs." if any(filters.values()) else "No logs yet.")
+        st.markdown("</div>", unsafe_allow_html=True)
+        return
 
     # --------- Top metrics row --------- #
     c1, c2, c3 = st.columns(3)
     with c1:
         st.markdown('<div class="metric-label">Total Events</div>', unsafe_allow_html=True)
-        st.markdown(f'<div class="metric-value">{total_events}</div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="metric-value">{summary["total"]}</div>', unsafe_allow_html=True)
 
     with c2:
         st.markdown('<div class="metric-label">Blocked / Denied</div>', unsafe_allow_html=True)
         st.markdown(
-            f'<div class="metric-value accent-soft">{blocked_events}</div>',
+            f'<div class="metric-value accent-soft">{summary["blocked"]}</div>',
             unsafe_allow_html=True,
         )
 
     with c3:
         st.markdown('<div class="metric-label">Unique Agents</div>', unsafe_allow_html=True)
-        if unique_agents is not None:
-            st.markdown(f'<div class="metric-value">{unique_agents}</div>', unsafe_allow_html=True)
-        else:
-            st.markdown('<div class="metric-value">–</div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="metric-value">{summary["unique_agents"]}</div>', unsafe_allow_html=True)
 
     st.markdown("---")
 
     # --------- Status distribution chart --------- #
-    if status_counts is not None and len(status_counts) > 0:
+    if summary["by_status"]:
         st.subheader("Event distribution by status")
-        chart_df = status_counts.reset_index()
-        chart_df.columns = ["Status", "Count"]
-        chart_df = chart_df.set_index("Status")
+        chart_df = pd.DataFrame(
+            list(summary["by_status"].items()), columns=["Status", "Count"]
+        ).set_index("Status")
         st.bar_chart(chart_df)
 
+    timeline = orch.get_security_log_timeline(**filters)
+    if len(timeline) > 1:
+        st.subheader("Events per hour")
+        timeline_df = pd.DataFrame(timeline).set_index("hour")
+        st.line_chart(timeline_df[["total", "blocked"]])
+
+    # --------- Anomaly alerts --------- #
+    alerts = orch.get_security_alerts(limit=20, agent_name=agent_name or None)
+    if alerts:
+        st.subheader("Anomaly alerts")
+        st.dataframe(
+            pd.DataFrame(alerts)[
+                ["timestamp", "rule", "agent_name", "action", "observed", "threshold", "details"]
+            ],
+            use_container_width=True,
+        )
+
+    # --------- Raw events, one keyset page at a time --------- #
+    cursors = st.session_state["security_logs_cursors"]
+    logs, next_cursor = orch.get_security_log_page(
+        limit=page_size, before_id=cursors[-1], **filters
+    )
+
     st.subheader("Raw security events")
-    st.dataframe(df, use_container_width=True)
+    st.dataframe(pd.DataFrame([dict(row) for row in logs]), use_container_width=True)
+
+    p1, p2, p3 = st.columns([0.2, 0.2, 0.6])
+    with p1:
+        if st.button("← Newer", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with p2:
+        if st.button("Older →", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
+    with p3:
+        st.caption(f"Page {len(cursors)}")
 
     st.markdown(
         """
@@ -1,5 +1,65 @@
 DB_PATH = "hospital_ai.db"
 
+# SQLite connection pool
+DB_POOL_MAX_SIZE = 8          # upper bound on open connections
+DB_BUSY_TIMEOUT_MS = 5000     # how long a writer waits on a locked DB
+DB_CACHE_SIZE_KB = 16384      # page cache per connection (16 MiB)
+DB_BEGIN_RETRIES = 5          # extra BEGIN IMMEDIATE attempts under contention
+DB_BEGIN_RETRY_BACKOFF_SEC = 0.01
+DB_ITER_BATCH_SIZE = 1000     # rows per fetchmany in Database.iter_query
+
+# Bulk patient import (IntakeAgent.import_patients)
+PATIENT_IMPORT_BATCH_SIZE = 5000   # rows per executemany / transaction
+
+# Buffered audit logging (SecurityAgent)
+AUDIT_BATCH_SIZE = 256            # flush when this many records are queued
+AUDIT_FLUSH_INTERVAL_SEC = 0.5    # ...or when the oldest record is this old
+AUDIT_QUEUE_MAX_SIZE = 100_000    # producers block beyond this (backpressure)
+AUDIT_STRICT_DENIED = True        # write DENIED events synchronously
+AUDIT_WRITE_RETRIES = 3           # failed batch attempts before rows are written one by one
+AUDIT_FLUSH_TIMEOUT_SEC = 5.0     # readers wait at most this long for buffered records
+AUDIT_DEAD_LETTER_PATH = "logs/audit_failed.jsonl"  # rows that could not be written (relative to the DB)
+
+# Permission policy (agents/permission_policy.py); without the file the
+# built-in DEFAULT_POLICY applies
+SECURITY_POLICY_PATH = "policies.json"    # relative to this directory, not the cwd
+SECURITY_POLICY_RELOAD_SEC = 1.0      # how often the file's mtime is checked
+
+# Audit log segments (data/audit_segments.py); directories are relative
+# to the database file
+AUDIT_HOT_MONTHS = 2                  # months kept in the main database
+AUDIT_WARM_SEGMENTS = 6               # monthly segment files kept queryable
+AUDIT_SEGMENT_DIR = "logs/audit"
+AUDIT_COLD_DIR = "logs/audit/cold"    # gzipped segments
+
+# Streaming anomaly detection over permission checks (SecurityAgent)
+ANOMALY_WINDOW_SEC = 300          # sliding window length
+ANOMALY_WINDOW_BUCKETS = 10       # window resolution (memory per key)
+ANOMALY_DENIAL_BURST = 5          # DENIED events per agent within the window
+ANOMALY_ACTION_RATE = 500         # events per (agent, action) within the window
+ANOMALY_DISTINCT_RESOURCES = 100  # distinct resource_ids per agent within the window
+ANOMALY_ALERT_COOLDOWN_SEC = 300  # min gap between repeated alerts for one key
+
+# DiagnosisAgent prediction cache. Bump the model version to invalidate
+# cached predictions when prediction logic changes outside the rule table.
+DIAGNOSIS_MODEL_VERSION = "rules-1"
+DIAGNOSIS_CACHE_MAX_SIZE = 10000
+DIAGNOSIS_CACHE_TTL_SEC = 3600
+
+# Batch re-scoring of historical visits (Orchestrator.rescore_visits)
+DIAGNOSIS_RESCORE_CHUNK_SIZE = 5000
+
+# Background PDF rendering
+REPORT_WORKERS = 2                       # processes in the render pool
+REPORT_OUTPUT_DIR = "reports/generated"
+REPORT_CACHE_MAX_BYTES = 256 * 1024 * 1024   # size bound for cached PDFs
+REPORT_CACHE_MAX_FILES = 10000
+REPORT_JOB_STALE_SEC = 15 * 60   # unfinished jobs older than this are reclaimed
+
+# Data exports (reports/exports.py)
+EXPORT_OUTPUT_DIR = "exports"
+EXPORT_CHUNK_ROWS = 10000     # rows per write (and per Parquet row group)
+
 # Default rooms/doctors to seed into the database
 DEFAULT_ROOMS = [
     {"room_number": "101", "doctor_name": "Dr. Sharma"},
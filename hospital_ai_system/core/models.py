@@ -0,0 +1,132 @@
+from collections.abc import Mapping
+from dataclasses import dataclass, fields
+from itertools import starmap
+from typing import Any, ClassVar, Dict, Iterator, List, Optional, Sequence, Tuple, Type, TypeVar
+
+R = TypeVar("R", bound="Record")
+
+
+class Record(Mapping):
+    """
+    Base for the row models below: a slotted object, one attribute per
+    column in table order, that still reads like the dict rows it
+    replaces (row["name"], row.get("age"), dict(row), ==).
+
+    A model row is a fraction of the size of a dict row and is built
+    straight from the cursor's tuple. Fields can be assigned
+    (row["status"] = ...) so the identity map can refresh a row in place,
+    but no new keys can be added – copy into a dict for that.
+    """
+
+    __slots__ = ()
+    FIELDS: ClassVar[Tuple[str, ...]] = ()
+    _FIELD_SET: ClassVar[frozenset] = frozenset()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self._FIELD_SET:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.FIELDS)
+
+    def update(self, other: Mapping) -> None:
+        for key, value in other.items():
+            self[key] = value
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    @classmethod
+    def from_rows(
+        cls: Type[R], columns: Sequence[str], rows: Sequence[Tuple[Any, ...]]
+    ) -> List[R]:
+        """
+        Models for raw cursor tuples whose column names are `columns`.
+        """
+        if tuple(columns) == cls.FIELDS:
+            # SELECT * / RETURNING *: positional, no per-row name lookups
+            return list(starmap(cls, rows))
+        return [cls(**dict(zip(columns, row))) for row in rows]
+
+
+def _model(cls: Type[R]) -> Type[R]:
+    cls = dataclass(slots=True, eq=False)(cls)
+    cls.FIELDS = tuple(f.name for f in fields(cls))
+    cls._FIELD_SET = frozenset(cls.FIELDS)
+    return cls
+
+
+@_model
+class Patient(Record):
+    id: int
+    name: str
+    phone: str
+    age: Optional[int] = None
+    gender: Optional[str] = None
+    height: Optional[float] = None
+    weight: Optional[float] = None
+
+
+@_model
+class Visit(Record):
+    id: int
+    patient_id: int
+    symptoms: Optional[str] = None
+    age: Optional[int] = None
+    gender: Optional[str] = None
+    height: Optional[float] = None
+    weight: Optional[float] = None
+    predicted_issues: Optional[str] = None
+    risk_level: Optional[str] = None
+    allocated_room: Optional[str] = None
+    status: Optional[str] = None
+
+
+@_model
+class Room(Record):
+    id: int
+    room_number: str
+    doctor_name: Optional[str] = None
+    status: Optional[str] = None
+    current_patient_id: Optional[int] = None
+    current_visit_id: Optional[int] = None
+
+
+@_model
+class Bill(Record):
+    id: int
+    visit_id: int
+    total_amount: Optional[float] = None
+    items_json: Optional[str] = None
+    created_at: Optional[str] = None
+
+
+@_model
+class AccessLog(Record):
+    id: int
+    timestamp: str
+    agent_name: str
+    action: str
+    resource_type: Optional[str] = None
+    resource_id: Optional[str] = None
+    status: str = ""
+    notes: Optional[str] = None
+
+
+# Model used for whole rows of each table (insert/update_returning)
+MODELS_BY_TABLE: Dict[str, Type[Record]] = {
+    "patients": Patient,
+    "visits": Visit,
+    "rooms": Room,
+    "bills": Bill,
+    "access_logs": AccessLog,
+}
@@ -1,31 +1,81 @@
-from typing import Optional, Tuple, Dict, Any
+from contextlib import contextmanager
+from typing import Optional, Tuple, Dict, Any, Iterator, List
 
+from config import DIAGNOSIS_RESCORE_CHUNK_SIZE, PATIENT_IMPORT_BATCH_SIZE, REPORT_OUTPUT_DIR
 from data.db import Database
-from agents.intake_agent import IntakeAgent
+from agents.intake_agent import IntakeAgent, iter_patient_records
 from agents.records_agent import RecordsAgent
 from agents.diagnosis_agent import DiagnosisAgent
 from agents.room_agent import RoomAgent
+from agents.room_waitlist import RoomWaitlist
 from agents.billing_agent import BillingAgent
 from agents.security_agent import SecurityAgent
+from reports.exports import EXPORT_PERMISSIONS, DataExporter
+from reports.job_queue import ReportJobQueue
+from reports.report_cache import ReportCache
 
 # Try to import PDF generator if available
 try:
-    from reports.pdf_generator import generate_visit_pdf  # type: ignore
+    from reports.pdf_generator import generate_visit_pdf, TEMPLATE_VERSION  # type: ignore
 except ImportError:
     generate_visit_pdf = None
+    TEMPLATE_VERSION = None
+
+
+class RequestAborted(Exception):
+    """
+    Raise inside Orchestrator.request() when a step fails: the whole unit
+    of work is rolled back instead of committing the earlier steps.
+    """
 
 
 class Orchestrator:
-    def __init__(self):
+    """
+    Each public operation runs as a single unit of work: the agents it
+    calls join one database transaction, so the operation commits once and
+    never leaves half-finished state behind.
+
+    A unit of work also carries an identity map shared by all agents:
+    rows read once, or written with RETURNING, are served from it for the
+    rest of the unit. Wrap several operations in request() to share one
+    unit of work between them.
+    """
+
+    def __init__(self, db: Optional[Database] = None):
         # You can keep these prints while debugging if you like
         # print("ORCH_MAIN: Orchestrator __init__")
-        self.db = Database()
+        self.db = db if db is not None else Database()
         self.security = SecurityAgent(self.db)
         self.intake = IntakeAgent(self.db)
         self.records = RecordsAgent(self.db)
         self.diagnosis = DiagnosisAgent()
-        self.room_agent = RoomAgent(self.db)
+        self.room_agent = RoomAgent(self.db, waitlist=RoomWaitlist(self.db))
         self.billing = BillingAgent(self.db)
+        self.exporter = DataExporter(self.records, self.billing, self.security)
+
+        self.report_jobs: Optional[ReportJobQueue] = None
+        self.report_cache: Optional[ReportCache] = None
+        if generate_visit_pdf is not None:
+            self.report_cache = ReportCache(REPORT_OUTPUT_DIR, template_version=TEMPLATE_VERSION)
+            self.report_jobs = ReportJobQueue(
+                self.db,
+                render=generate_visit_pdf,
+                load_payload=self.records.get_visit_with_patient,
+                output_dir=REPORT_OUTPUT_DIR,
+                cache=self.report_cache,
+            )
+            self.report_jobs.resume_pending()
+
+    @contextmanager
+    def request(self) -> Iterator[None]:
+        """
+        Run several operations (e.g. the reception flow) as one unit of
+        work with one identity map. Operations report failures as error
+        values, so raise RequestAborted on one to undo the earlier steps;
+        a block that exits normally commits.
+        """
+        with self.db.transaction(immediate=True):
+            yield
 
     # ---------- Patient lookup ----------
 
@@ -43,6 +93,36 @@ class Orchestrator:
         patient = self.records.find_patient_by_phone_or_name(phone=phone, name=name)
         return patient, None
 
+    def search_patients(
+        self, query: str, limit: int = 10
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Fuzzy name/phone search, best match first – used to catch typos
+        before a duplicate patient is registered.
+        """
+        if not self.security.check_permission(
+            "IntakeAgent", "identity_read", "patient", None, "search_patients"
+        ):
+            return [], "Permission denied for IntakeAgent identity_read"
+
+        return self.records.search_patients(query, limit=limit), None
+
+    def get_patient_page(
+        self,
+        limit: int = 100,
+        before_id: Optional[int] = None,
+        columns: Optional[List[str]] = None,
+    ) -> Tuple[Optional[Tuple[List[Dict[str, Any]], Optional[int]]], Optional[str]]:
+        """
+        One keyset page of the patient registry: ((rows, next_cursor), error).
+        """
+        if not self.security.check_permission(
+            "RecordsAgent", "patient_read", "patient", None, "get_patient_page"
+        ):
+            return None, "Permission denied for RecordsAgent patient_read"
+
+        return self.records.get_patient_page(limit, before_id, columns), None
+
     # ---------- Patient & Visit ----------
 
     def register_patient(
@@ -54,20 +134,41 @@ class Orchestrator:
         height: Optional[float],
         weight: Optional[float],
     ) -> Tuple[Optional[int], Optional[str]]:
+        with self.db.transaction(immediate=True):
+            if not self.security.check_permission(
+                "IntakeAgent", "identity_write", "patient", None, "register_or_get_patient"
+            ):
+                return None, "Permission denied for IntakeAgent identity_write"
+
+            patient_id = self.intake.register_or_get_patient(
+                name=name,
+                phone=phone,
+                age=age,
+                gender=gender,
+                height=height,
+                weight=weight,
+            )
+            return patient_id, None
+
+    def import_patients(
+        self, path: str, batch_size: int = PATIENT_IMPORT_BATCH_SIZE
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Bulk-upsert patients from a CSV or JSONL export (see
+        agents/intake_agent.py). The file is streamed; each batch commits
+        on its own, so a failure part-way keeps the batches already done
+        and re-running the import is safe.
+        """
         if not self.security.check_permission(
-            "IntakeAgent", "identity_write", "patient", None, "register_or_get_patient"
+            "IntakeAgent", "identity_write", "patient", None, f"import_patients {path}"
         ):
             return None, "Permission denied for IntakeAgent identity_write"
 
-        patient_id = self.intake.register_or_get_patient(
-            name=name,
-            phone=phone,
-            age=age,
-            gender=gender,
-            height=height,
-            weight=weight,
-        )
-        return patient_id, None
+        try:
+            stats = self.intake.import_patients(iter_patient_records(path), batch_size=batch_size)
+        except (OSError, ValueError) as exc:
+            return None, f"Import failed: {exc}"
+        return stats, None
 
     def create_visit(
         self,
@@ -78,91 +179,164 @@ class Orchestrator:
         weight: Optional[float],
         symptoms: str,
     ) -> Tuple[Optional[int], Optional[str]]:
-        if not self.security.check_permission(
-            "IntakeAgent", "create_visit", "visit", None, "create_visit"
-        ):
-            return None, "Permission denied for IntakeAgent create_visit"
-
-        visit_id = self.records.create_visit(
-            patient_id=patient_id,
-            age=age,
-            gender=gender,
-            height=height,
-            weight=weight,
-            symptoms=symptoms,
-        )
-        return visit_id, None
+        with self.db.transaction(immediate=True):
+            if not self.security.check_permission(
+                "IntakeAgent", "create_visit", "visit", None, "create_visit"
+            ):
+                return None, "Permission denied for IntakeAgent create_visit"
+
+            visit_id = self.records.create_visit(
+                patient_id=patient_id,
+                age=age,
+                gender=gender,
+                height=height,
+                weight=weight,
+                symptoms=symptoms,
+            )
+            return visit_id, None
 
     def run_diagnosis_for_visit(
         self, visit_id: int
     ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
-        visit = self.records.get_visit(visit_id)
-        if not visit:
-            return None, "Visit not found"
-
-        # Only anonymized clinical data goes to DiagnosisAgent
+        with self.db.transaction(immediate=True):
+            visit = self.records.get_visit(visit_id)
+            if not visit:
+                return None, "Visit not found"
+
+            # Only anonymized clinical data goes to DiagnosisAgent
+            if not self.security.check_permission(
+                "DiagnosisAgent",
+                "visit_read_anonymized",
+                "visit",
+                str(visit_id),
+                "predict_issues",
+            ):
+                return None, "Permission denied for DiagnosisAgent visit_read_anonymized"
+
+            age = visit.get("age") or 0
+            gender = visit.get("gender") or ""
+            height = visit.get("height") or 0.0
+            weight = visit.get("weight") or 0.0
+            symptoms = visit.get("symptoms") or ""
+
+            predicted_issues, risk_level = self.diagnosis.predict(
+                symptoms=symptoms,
+                age=int(age) if age is not None else 0,
+                gender=str(gender),
+                height=float(height) if height is not None else 0.0,
+                weight=float(weight) if weight is not None else 0.0,
+            )
+
+            self.records.update_visit_prediction(visit_id, predicted_issues, risk_level)
+            # A visit already waiting for a room moves to its new priority
+            self.room_agent.waitlist.reprioritize(visit_id, risk_level)
+            updated = self.records.get_visit(visit_id)
+            return updated, None
+
+    def rescore_visits(
+        self, chunk_size: int = DIAGNOSIS_RESCORE_CHUNK_SIZE
+    ) -> Tuple[Optional[Dict[str, int]], Optional[str]]:
+        """
+        Re-run diagnosis over every historical visit, e.g. after the rule
+        table changed. Visits are streamed in id order, scored with
+        DiagnosisAgent.predict_batch and only changed predictions are
+        written back – one executemany and one commit per chunk.
+        """
         if not self.security.check_permission(
             "DiagnosisAgent",
             "visit_read_anonymized",
             "visit",
-            str(visit_id),
-            "predict_issues",
+            None,
+            "rescore_visits",
         ):
             return None, "Permission denied for DiagnosisAgent visit_read_anonymized"
 
-        age = visit.get("age") or 0
-        gender = visit.get("gender") or ""
-        height = visit.get("height") or 0.0
-        weight = visit.get("weight") or 0.0
-        symptoms = visit.get("symptoms") or ""
-
-        predicted_issues, risk_level = self.diagnosis.predict(
-            symptoms=symptoms,
-            age=int(age) if age is not None else 0,
-            gender=str(gender),
-            height=float(height) if height is not None else 0.0,
-            weight=float(weight) if weight is not None else 0.0,
-        )
-
-        self.records.update_visit_prediction(visit_id, predicted_issues, risk_level)
-        updated = self.records.get_visit(visit_id)
-        return updated, None
+        stats = {"scanned": 0, "updated": 0, "chunks": 0}
+        last_id = 0
+        while True:
+            visits = self.records.list_visits_for_scoring(after_id=last_id, limit=chunk_size)
+            if not visits:
+                break
+
+            predictions = self.diagnosis.predict_batch(visits)
+            changed = [
+                (issues, risk, visit["id"])
+                for visit, (issues, risk) in zip(visits, predictions)
+                if (issues, risk) != (visit["predicted_issues"], visit["risk_level"])
+            ]
+            if changed:
+                with self.db.transaction(immediate=True):
+                    self.records.update_visit_predictions(changed)
+                    for _issues, risk, visit_id in changed:
+                        self.room_agent.waitlist.reprioritize(visit_id, risk)
+
+            stats["scanned"] += len(visits)
+            stats["updated"] += len(changed)
+            stats["chunks"] += 1
+            last_id = visits[-1]["id"]
+
+        return stats, None
 
     # ---------- Room Allocation ----------
 
     def assign_room(
         self, visit_id: int
     ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
-        visit = self.records.get_visit(visit_id)
-        if not visit:
-            return None, "Visit not found"
-
-        if not self.security.check_permission(
-            "RoomAgent", "room_read", "room", None, "assign_room"
-        ):
-            return None, "Permission denied for RoomAgent room_read"
-
+        with self.db.transaction(immediate=True):
+            visit = self.records.get_visit(visit_id)
+            if not visit:
+                return None, "Visit not found"
+
+            if not self.security.check_permission(
+                "RoomAgent", "room_read", "room", None, "assign_room"
+            ):
+                return None, "Permission denied for RoomAgent room_read"
+
+            if not self.security.check_permission(
+                "RoomAgent", "room_write", "room", None, "assign_room"
+            ):
+                return None, "Permission denied for RoomAgent room_write"
+
+            if visit["status"] == "completed":
+                return None, "Visit is already completed"
+
+            patient_id = visit["patient_id"]
+            room = self.room_agent.assign_room(patient_id=patient_id, visit_id=visit_id)
+            if not room:
+                # Wait for the next room freed, in risk order
+                position = self.room_agent.enqueue_visit(visit)
+                return None, f"No free rooms available – visit is #{position} on the waitlist"
+
+            updated_visit = self.records.get_visit(visit_id)
+            return {"room": room, "visit": updated_visit}, None
+
+    def complete_visit(
+        self, visit_id: int
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Mark a visit completed and free its room. Returns the waiting
+        visits the room was handed to ([{"visit_id", "room"}]).
+        """
+        with self.db.transaction(immediate=True):
+            visit = self.records.get_visit(visit_id)
+            if not visit:
+                return [], "Visit not found"
+            assignments = self.room_agent.free_room_for_visit(visit)
+            self.records.set_visit_status(visit_id, "completed")
+            return assignments, None
+
+    def get_room_waitlist(
+        self, limit: int = 100
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Visits waiting for a room, in the order they will be served.
+        """
         if not self.security.check_permission(
-            "RoomAgent", "room_write", "room", None, "assign_room"
+            "RoomAgent", "room_read", "room", None, "get_room_waitlist"
         ):
-            return None, "Permission denied for RoomAgent room_write"
-
-        patient_id = visit["patient_id"]
-        room = self.room_agent.assign_room(patient_id=patient_id, visit_id=visit_id)
-        if not room:
-            return None, "No free rooms available"
+            return [], "Permission denied for RoomAgent room_read"
 
-        self.records.update_visit_room(visit_id, room["room_number"])
-        updated_visit = self.records.get_visit(visit_id)
-        return {"room": room, "visit": updated_visit}, None
-
-    def complete_visit(self, visit_id: int) -> Optional[str]:
-        visit = self.records.get_visit(visit_id)
-        if not visit:
-            return "Visit not found"
-        self.room_agent.free_room_for_visit(visit)
-        self.records.set_visit_status(visit_id, "completed")
-        return None
+        return self.room_agent.waitlist.list_waiting(limit), None
 
     # ---------- Billing ----------
 
@@ -173,26 +347,31 @@ class Orchestrator:
         Generate a bill for this visit.
         When billing is successful, free the room used by this visit
         and mark the visit as completed.
+
+        Returns {"bill", "room_assignments"}, the latter listing the
+        waiting visits the freed room was handed to.
         """
-        visit = self.records.get_visit(visit_id)
-        if not visit:
-            return None, "Visit not found"
+        with self.db.transaction(immediate=True):
+            visit = self.records.get_visit(visit_id)
+            if not visit:
+                return None, "Visit not found"
 
-        if not self.security.check_permission(
-            "BillingAgent", "billing_create", "bill", None, "generate_bill"
-        ):
-            return None, "Permission denied for BillingAgent billing_create"
+            if not self.security.check_permission(
+                "BillingAgent", "billing_create", "bill", None, "generate_bill"
+            ):
+                return None, "Permission denied for BillingAgent billing_create"
 
-        # 1) Create the bill
-        bill = self.billing.generate_bill(visit_id, consultation_fee)
+            # 1) Create the bill
+            bill = self.billing.generate_bill(visit_id, consultation_fee)
 
-        # 2) Free the room associated with this visit (if any)
-        self.room_agent.free_room_for_visit(visit)
+            # 2) Free the room associated with this visit (if any);
+            #    the most urgent waiting visit gets it straight away
+            assignments = self.room_agent.free_room_for_visit(visit)
 
-        # 3) Mark visit as completed
-        self.records.set_visit_status(visit_id, "completed")
+            # 3) Mark visit as completed
+            self.records.set_visit_status(visit_id, "completed")
 
-        return bill, None
+            return {"bill": bill, "room_assignments": assignments}, None
 
     # ---------- Reports ----------
 
@@ -210,22 +389,130 @@ class Orchestrator:
         if generate_visit_pdf is None:
             return None, "PDF generation module not configured."
 
-        pdf_path = generate_visit_pdf(visit_with_patient)
+        # Unchanged visit -> serve the already rendered file
+        cached_path = self.report_cache.lookup(visit_with_patient)
+        if cached_path is not None:
+            return cached_path, None
+
+        pdf_path = generate_visit_pdf(
+            visit_with_patient,
+            REPORT_OUTPUT_DIR,
+            self.report_cache.filename_for(visit_with_patient),
+        )
+        self.report_cache.record(pdf_path)
         return pdf_path, None
 
+    def submit_visit_report(self, visit_id: int) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Queue the visit PDF for background rendering and return a job id
+        straight away; poll with get_report_job() or block with
+        wait_for_report().
+        """
+        visit_with_patient = self.records.get_visit_with_patient(visit_id)
+        if not visit_with_patient:
+            return None, "Visit not found"
+
+        if self.report_jobs is None:
+            return None, "PDF generation module not configured."
+
+        job_id = self.report_jobs.submit(visit_id, visit_with_patient)
+        return job_id, None
+
+    def get_report_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        if self.report_jobs is None:
+            return None
+        return self.report_jobs.status(job_id)
+
+    def wait_for_report(
+        self, job_id: int, timeout: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        if self.report_jobs is None:
+            return None
+        return self.report_jobs.wait(job_id, timeout=timeout)
+
+    def report_cache_stats(self) -> Optional[Dict[str, Any]]:
+        if self.report_cache is None:
+            return None
+        return self.report_cache.stats()
+
+    # ---------- Data exports ----------
+
+    def export_data(
+        self,
+        dataset: str,
+        fmt: str = "csv",
+        compression: Optional[str] = None,
+        incremental: bool = False,
+        name: Optional[str] = None,
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Stream a dataset ("visits", "bills", "access_logs") to a CSV,
+        JSONL or Parquet file; see reports/exports.py.
+        """
+        permissions = EXPORT_PERMISSIONS.get(dataset)
+        if permissions is None:
+            return None, f"Unknown export dataset: {dataset}"
+        for agent_name, action, resource_type in permissions:
+            if not self.security.check_permission(
+                agent_name, action, resource_type, None, f"export_data {dataset}"
+            ):
+                return None, f"Permission denied for {agent_name} {action}"
+
+        try:
+            summary = self.exporter.export(dataset, fmt, compression, incremental, name)
+        except (OSError, ValueError) as exc:
+            return None, f"Export failed: {exc}"
+        return summary, None
+
     # ---------- Security Logs & Admin ----------
 
-    def get_security_logs(self, limit: int = 100):
-        return self.security.get_logs(limit=limit)
+    def get_security_logs(self, limit: int = 100, **filters: Any):
+        return self.security.get_logs(limit=limit, **filters)
+
+    def get_security_log_page(
+        self, limit: int = 100, before_id: Optional[int] = None, **filters: Any
+    ):
+        return self.security.get_log_page(limit=limit, before_id=before_id, **filters)
+
+    def get_security_log_summary(self, **filters: Any) -> Dict[str, Any]:
+        return self.security.get_log_summary(**filters)
+
+    def get_security_log_timeline(self, **filters: Any) -> List[Dict[str, Any]]:
+        return self.security.get_log_timeline(**filters)
+
+    def get_security_alerts(self, limit: int = 50, **filters: Any) -> List[Dict[str, Any]]:
+        return self.security.get_alerts(limit=limit, **filters)
+
+    def list_security_log_agents(self):
+        return self.security.list_log_agents()
+
+    def rebuild_security_rollups(self) -> int:
+        return self.security.rebuild_rollups()
+
+    def rotate_security_logs(self) -> Dict[str, List[str]]:
+        return self.security.rotate_logs()
 
     def reset_all_rooms(self) -> None:
         """
         Admin / demo helper:
-        Mark every room as FREE and clear current_patient_id.
-        Does NOT create or delete any rooms.
+        Mark every room as FREE and clear the current patient/visit, then hand
+        the rooms to waiting visits. Does NOT create or delete any rooms.
         """
-        self.db.execute(
-            "UPDATE rooms SET status = 'free', current_patient_id = NULL;",
-            (),
-            commit=True,
-        )
+        with self.db.transaction(immediate=True):
+            self.db.execute(
+                "UPDATE rooms SET status = 'free', current_patient_id = NULL, current_visit_id = NULL;",
+                (),
+                commit=True,
+            )
+            # Freed rooms go to waiting visits first
+            self.room_agent.assign_waiting()
+
+    def close(self) -> None:
+        """
+        Stop the report pool, flush buffered audit logs and close pooled
+        connections. Safe to call more than once.
+        """
+        if self.report_jobs is not None:
+            self.report_jobs.close()
+        self.security.close()
+        self.db.close()
@@ -0,0 +1,324 @@
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config import (
+    AUDIT_COLD_DIR,
+    AUDIT_HOT_MONTHS,
+    AUDIT_SEGMENT_DIR,
+    AUDIT_WARM_SEGMENTS,
+    DB_ITER_BATCH_SIZE,
+)
+from core.models import AccessLog
+from data.db import Database, stream_cursor
+
+_SEGMENT_NAME = re.compile(r"^access_logs_(\d{4}-\d{2})\.db$")
+_COLD_NAME = re.compile(r"^access_logs_(\d{4}-\d{2})\.db\.gz$")
+
+_SEGMENT_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS access_logs (
+        id INTEGER PRIMARY KEY,
+        timestamp TEXT NOT NULL,
+        agent_name TEXT NOT NULL,
+        action TEXT NOT NULL,
+        resource_type TEXT,
+        resource_id TEXT,
+        status TEXT NOT NULL,
+        notes TEXT
+    );
+"""
+
+_SEGMENT_ROLLUP_SQL = """
+    SELECT substr(timestamp, 1, 13), agent_name, action, status, COUNT(*)
+    FROM access_logs
+    GROUP BY 1, 2, 3, 4;
+"""
+
+
+def _month_start(year: int, month: int) -> str:
+    # Normalise month arithmetic that ran past either end of the year
+    year += (month - 1) // 12
+    month = (month - 1) % 12 + 1
+    return f"{year:04d}-{month:02d}"
+
+
+class AuditSegmentStore:
+    """
+    Monthly segments of the access log outside the main database.
+
+    - hot: the newest `hot_months` months stay in main.access_logs
+    - warm: older months live in one SQLite file per month
+      (access_logs_YYYY-MM.db)
+    - cold: warm segments beyond the newest `warm_segments` are gzipped
+      into `cold_dir`; restore() brings one back to the warm tier
+
+    query_logs() and iter_logs() read both tiers; a cold month is
+    decompressed to a temporary file while it is read, so queries that
+    reach that far back are slower but never partial.
+
+    Rollups are untouched by rotation: they are maintained on insert, and
+    rebuild_access_log_rollups() reads every segment, warm or cold.
+    Relative directories are resolved against the database's directory.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        segment_dir: str = AUDIT_SEGMENT_DIR,
+        cold_dir: str = AUDIT_COLD_DIR,
+        hot_months: int = AUDIT_HOT_MONTHS,
+        warm_segments: int = AUDIT_WARM_SEGMENTS,
+    ):
+        self.db = db
+        base = Path(db.db_path).parent
+        self.segment_dir = base / segment_dir
+        self.cold_dir = base / cold_dir
+        self.hot_months = hot_months
+        self.warm_segments = warm_segments
+
+    # ---------- Layout ----------
+
+    def segment_path(self, period: str) -> Path:
+        return self.segment_dir / f"access_logs_{period}.db"
+
+    def cold_path(self, period: str) -> Path:
+        return self.cold_dir / f"access_logs_{period}.db.gz"
+
+    def _periods(self, directory: Path, pattern: "re.Pattern[str]") -> List[str]:
+        if not directory.exists():
+            return []
+        periods = [m.group(1) for m in map(pattern.match, os.listdir(directory)) if m]
+        return sorted(periods, reverse=True)
+
+    def warm_periods(self) -> List[str]:
+        """
+        Months with an uncompressed segment, newest first.
+        """
+        return self._periods(self.segment_dir, _SEGMENT_NAME)
+
+    def cold_periods(self) -> List[str]:
+        return self._periods(self.cold_dir, _COLD_NAME)
+
+    def hot_cutoff(self, now: Optional[datetime] = None) -> str:
+        """
+        First month that stays in the main database.
+        """
+        now = now or datetime.utcnow()
+        return _month_start(now.year, now.month - self.hot_months + 1)
+
+    # ---------- Rotation ----------
+
+    def rotate(self, now: Optional[datetime] = None) -> List[str]:
+        """
+        Move every month older than the hot window out of main.access_logs
+        into its segment file. Each month is copied (and made durable)
+        before it is deleted from the main database; re-running after a
+        crash in between is safe. Returns the months rotated.
+        """
+        cutoff = self.hot_cutoff(now)
+        periods = self.db.execute(
+            "SELECT DISTINCT substr(timestamp, 1, 7) AS period FROM access_logs "
+            "WHERE timestamp < ? ORDER BY period;",
+            (cutoff,),
+            fetchall=True,
+        )
+        rotated = []
+        for row in periods:
+            period = row["period"]
+            self._rotate_period(period)
+            rotated.append(period)
+        return rotated
+
+    def _rotate_period(self, period: str) -> None:
+        year, month = map(int, period.split("-"))
+        bounds = (period, _month_start(year, month + 1))
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+
+        seg = sqlite3.connect(self.segment_path(period), isolation_level=None)
+        try:
+            seg.execute(_SEGMENT_SCHEMA)
+            seg.execute("ATTACH DATABASE ? AS hot;", (self.db.db_path,))
+            seg.execute("BEGIN;")
+            seg.execute(
+                "INSERT OR IGNORE INTO main.access_logs "
+                "SELECT * FROM hot.access_logs WHERE timestamp >= ? AND timestamp < ?;",
+                bounds,
+            )
+            max_id = seg.execute(
+                "SELECT MAX(id) FROM main.access_logs WHERE timestamp >= ? AND timestamp < ?;",
+                bounds,
+            ).fetchone()[0]
+            seg.execute("COMMIT;")
+            seg.execute("DETACH DATABASE hot;")
+        finally:
+            seg.close()
+
+        if max_id is not None:
+            with self.db.transaction(immediate=True) as conn:
+                conn.execute(
+                    "DELETE FROM access_logs WHERE timestamp >= ? AND timestamp < ? AND id <= ?;",
+                    (*bounds, max_id),
+                )
+
+    def archive(self) -> List[str]:
+        """
+        Gzip every warm segment beyond the newest `warm_segments` into the
+        cold directory. Returns the months archived.
+        """
+        archived = []
+        for period in self.warm_periods()[self.warm_segments:]:
+            self.cold_dir.mkdir(parents=True, exist_ok=True)
+            source = self.segment_path(period)
+            target = self.cold_path(period)
+            tmp = target.with_name(target.name + ".tmp")
+            with open(source, "rb") as src, gzip.open(tmp, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp, target)
+            source.unlink()
+            archived.append(period)
+        return archived
+
+    def restore(self, period: str) -> Path:
+        """
+        Decompress a cold segment back into the warm directory.
+        """
+        target = self.segment_path(period)
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(target.name + ".tmp")
+        with gzip.open(self.cold_path(period), "rb") as src, open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp, target)
+        self.cold_path(period).unlink()
+        return target
+
+    def maintain(self, now: Optional[datetime] = None) -> Dict[str, List[str]]:
+        """
+        rotate() then archive(): the periodic job.
+        """
+        return {"rotated": self.rotate(now), "archived": self.archive()}
+
+    # ---------- Reading ----------
+
+    @contextmanager
+    def _open(self, path: Path) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _open_segment(self, period: str) -> Iterator[sqlite3.Connection]:
+        """
+        Read-only connection to a month's segment, warm or cold; a cold one
+        is decompressed to a temporary file for the duration.
+        """
+        if self.segment_path(period).exists():
+            with self._open(self.segment_path(period)) as conn:
+                yield conn
+            return
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "segment.db"
+            with gzip.open(self.cold_path(period), "rb") as src, open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            with self._open(path) as conn:
+                yield conn
+
+    def all_periods(self) -> List[str]:
+        """
+        Every month with a segment, warm or cold, newest first.
+        """
+        return sorted(set(self.warm_periods()) | set(self.cold_periods()), reverse=True)
+
+    def query_logs(
+        self,
+        clauses: Sequence[str],
+        params: Sequence[Any],
+        limit: int,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[AccessLog]:
+        """
+        Newest-first rows from the warm and cold segments matching
+        `clauses`. Segment ids are all older than the hot table's, and
+        older months have smaller ids, so walking segments newest-first
+        and stopping once `limit` rows are found keeps the keyset order
+        intact (and leaves cold months unread when newer ones suffice).
+        Months outside [since, until) are skipped without being opened.
+        """
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows: List[AccessLog] = []
+        for period in self.all_periods():
+            if len(rows) >= limit:
+                break
+            if since and period < since[:7]:
+                break
+            if until and period > until[:7]:
+                continue
+            with self._open_segment(period) as conn:
+                cur = conn.execute(
+                    f"SELECT * FROM access_logs {where} ORDER BY id DESC LIMIT ?;",
+                    (*params, limit - len(rows)),
+                )
+                columns = [d[0] for d in cur.description]
+                rows.extend(AccessLog.from_rows(columns, cur.fetchall()))
+        return rows
+
+    def iter_logs(
+        self,
+        clauses: Sequence[str],
+        params: Sequence[Any],
+        batch_size: int = DB_ITER_BATCH_SIZE,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> Iterator[AccessLog]:
+        """
+        Every segment row matching `clauses`, oldest first, streamed
+        `batch_size` rows at a time. Cold months are decompressed to a
+        temporary file while they are read. Months outside [since, until)
+        are skipped without being opened.
+        """
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        for period in reversed(self.all_periods()):
+            if since and period < since[:7]:
+                continue
+            if until and period > until[:7]:
+                break
+            with self._open_segment(period) as conn:
+                cur = conn.execute(f"SELECT * FROM access_logs {where} ORDER BY id;", tuple(params))
+                yield from stream_cursor(cur, batch_size, AccessLog)
+
+    def rollup_rows(self) -> Iterator[Tuple[Any, ...]]:
+        """
+        (hour, agent, action, status, count) for every warm and cold segment.
+        """
+        for period in self.all_periods():
+            with self._open_segment(period) as conn:
+                yield from map(tuple, conn.execute(_SEGMENT_ROLLUP_SQL))
+
+    def stats(self) -> Dict[str, Any]:
+        warm = self.warm_periods()
+        cold = self.cold_periods()
+        return {
+            "warm_segments": warm,
+            "cold_segments": cold,
+            "warm_bytes": sum(self.segment_path(p).stat().st_size for p in warm),
+            "cold_bytes": sum(self.cold_path(p).stat().st_size for p in cold),
+        }
+
+
+if __name__ == "__main__":
+    # Usage (from hospital_ai_system/): python -m data.audit_segments
+    result = AuditSegmentStore(Database()).maintain()
+    print(
+        f"✅ Rotated {len(result['rotated'])} month(s), "
+        f"archived {len(result['archived'])} segment(s)."
+    )
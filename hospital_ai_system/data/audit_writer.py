@@ -0,0 +1,265 @@
+import atexit
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    AUDIT_BATCH_SIZE,
+    AUDIT_DEAD_LETTER_PATH,
+    AUDIT_FLUSH_INTERVAL_SEC,
+    AUDIT_QUEUE_MAX_SIZE,
+    AUDIT_WRITE_RETRIES,
+)
+from data.db import Database
+
+
+_STOP = object()
+
+INSERT_ACCESS_LOG_SQL = """
+    INSERT INTO access_logs
+    (timestamp, agent_name, action, resource_type, resource_id, status, notes)
+    VALUES (?, ?, ?, ?, ?, ?, ?);
+"""
+
+INSERT_SECURITY_ALERT_SQL = """
+    INSERT INTO security_alerts
+    (timestamp, rule, agent_name, action, observed, threshold, window_sec, details)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+"""
+
+
+class _FlushRequest:
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok = True
+
+
+class AuditWriter:
+    """
+    Background writer for audit records.
+
+    Callers enqueue (sql, params) pairs and return immediately; a single
+    worker thread groups them by statement and writes each group with
+    executemany() in one transaction. A batch is flushed when it reaches
+    `batch_size` records or when its oldest record is `flush_interval`
+    seconds old, whichever comes first.
+
+    A batch that fails `max_retries` times (or once while closing) is
+    written record by record; records that still fail are appended to
+    `dead_letter_path` (JSON lines, relative to the database) and
+    counted, so one bad record never blocks the rest of the log.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_interval: float = AUDIT_FLUSH_INTERVAL_SEC,
+        max_queue_size: int = AUDIT_QUEUE_MAX_SIZE,
+        max_retries: int = AUDIT_WRITE_RETRIES,
+        dead_letter_path: Optional[str] = AUDIT_DEAD_LETTER_PATH,
+    ):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.dead_letter_path = (
+            Path(db.db_path).parent / dead_letter_path if dead_letter_path else None
+        )
+
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        # Orders puts against close(): nothing is queued behind _STOP.
+        # Separate from _lock, which the worker needs while producers may
+        # be blocked on a full queue.
+        self._put_lock = threading.Lock()
+        self._closed = False
+
+        # Statistics (guarded by self._lock)
+        self._enqueued = 0
+        self._written = 0
+        self._batches = 0
+        self._errors = 0
+        self._failed = 0
+
+        self._thread = threading.Thread(
+            target=self._run, name="audit-writer", daemon=True
+        )
+        self._thread.start()
+        # Durable flush on interpreter shutdown, even if close() is never called
+        atexit.register(self.close)
+
+    # ---------- Producer side ----------
+
+    def submit(self, sql: str, params: Tuple[Any, ...]) -> None:
+        """
+        Queue one record. Only blocks if the queue is full (backpressure).
+        """
+        with self._put_lock:
+            if self._closed:
+                raise RuntimeError("AuditWriter is closed")
+            with self._lock:
+                self._enqueued += 1
+            self._queue.put((sql, params))
+
+    def write_access_log(self, params: Tuple[Any, ...]) -> None:
+        self.submit(INSERT_ACCESS_LOG_SQL, params)
+
+    def write_security_alert(self, params: Tuple[Any, ...]) -> None:
+        self.submit(INSERT_SECURITY_ALERT_SQL, params)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until everything queued before this call has been written.
+        Returns False if the timeout expired first, or if some of those
+        records could not be written (see dead_letter_path).
+        """
+        request = _FlushRequest()
+        with self._put_lock:
+            if self._closed:
+                return True
+            self._queue.put(request)
+        return request.done.wait(timeout) and request.ok
+
+    def close(self) -> None:
+        """
+        Write everything still queued and stop the worker thread.
+        """
+        with self._put_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enqueued": self._enqueued,
+                "written": self._written,
+                "pending": self._enqueued - self._written - self._failed,
+                "batches": self._batches,
+                "errors": self._errors,
+                "failed": self._failed,
+            }
+
+    # ---------- Worker side ----------
+
+    def _write_batch(self, batch: List[Tuple[str, Tuple[Any, ...]]]) -> None:
+        groups: Dict[str, List[Tuple[Any, ...]]] = {}
+        for sql, params in batch:
+            groups.setdefault(sql, []).append(params)
+
+        with self.db.transaction(immediate=True) as conn:
+            for sql, rows in groups.items():
+                conn.executemany(sql, rows)
+
+        with self._lock:
+            self._written += len(batch)
+            self._batches += 1
+
+    def _write_one_by_one(self, batch: List[Tuple[str, Tuple[Any, ...]]]) -> int:
+        """
+        Isolate the bad records of a failing batch. Returns how many could
+        not be written; those go to the dead-letter file.
+        """
+        failed = []
+        for sql, params in batch:
+            try:
+                self._write_batch([(sql, params)])
+            except Exception as exc:
+                failed.append((sql, params, exc))
+        if failed:
+            with self._lock:
+                self._failed += len(failed)
+            self._dead_letter(failed)
+        return len(failed)
+
+    def _dead_letter(self, failed: List[Tuple[str, Tuple[Any, ...], Exception]]) -> None:
+        if self.dead_letter_path is None:
+            return
+        try:
+            self.dead_letter_path.parent.mkdir(parents=True, exist_ok=True)
+            failed_at = datetime.utcnow().isoformat(timespec="seconds")
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                for sql, params, exc in failed:
+                    f.write(
+                        json.dumps(
+                            {
+                                "failed_at": failed_at,
+                                "sql": " ".join(sql.split()),
+                                "params": list(params),
+                                "error": f"{type(exc).__name__}: {exc}",
+                            },
+                            default=str,
+                        )
+                        + "\n"
+                    )
+        except OSError:
+            pass  # already counted in stats()["failed"]
+
+    def _run(self) -> None:
+        pending: List[Tuple[str, Tuple[Any, ...]]] = []
+        waiters: List[_FlushRequest] = []
+        deadline = 0.0
+        attempts = 0
+        stopping = False
+
+        while True:
+            timeout = None
+            if pending:
+                timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                stopping = True
+            elif isinstance(item, _FlushRequest):
+                waiters.append(item)
+            elif item is not None:
+                if not pending:
+                    deadline = time.monotonic() + self.flush_interval
+                pending.append(item)
+
+            due = (
+                len(pending) >= self.batch_size
+                or time.monotonic() >= deadline
+                or (waiters and attempts == 0)
+                or stopping
+            )
+            if pending and due:
+                try:
+                    self._write_batch(pending)
+                    pending = []
+                    attempts = 0
+                except Exception:
+                    with self._lock:
+                        self._errors += 1
+                    attempts += 1
+                    if attempts < self.max_retries and not stopping:
+                        # Retry the batch after another interval
+                        deadline = time.monotonic() + self.flush_interval
+                        continue
+                    if self._write_one_by_one(pending):
+                        for request in waiters:
+                            request.ok = False
+                    pending = []
+                    attempts = 0
+
+            if not pending:
+                for request in waiters:
+                    request.done.set()
+                waiters = []
+
+            if stopping:
+                break
+
+        for request in waiters:
+            request.done.set()
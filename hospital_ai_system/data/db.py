@@ -1,16 +1,81 @@
+import re
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Iterable, List, Optional, Dict
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Dict, Type
 
-from config import DB_PATH, DEFAULT_ROOMS
+from config import (
+    DB_PATH,
+    DB_POOL_MAX_SIZE,
+    DB_BUSY_TIMEOUT_MS,
+    DB_CACHE_SIZE_KB,
+    DB_ITER_BATCH_SIZE,
+    DB_BEGIN_RETRIES,
+    DB_BEGIN_RETRY_BACKOFF_SEC,
+)
+from core.models import MODELS_BY_TABLE, Record
+from data.identity_map import IdentityMap
+from data.migrations import migrate
+from data.pool import ConnectionPool
+
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _check_identifiers(*names: str) -> None:
+    # Table/column names are interpolated into SQL; only allow plain names
+    for name in names:
+        if not _IDENTIFIER.match(name):
+            raise ValueError(f"Invalid SQL identifier: {name!r}")
+
+
+def stream_cursor(
+    cur: sqlite3.Cursor,
+    batch_size: int = DB_ITER_BATCH_SIZE,
+    model: Optional[Type[Record]] = None,
+    batches: bool = False,
+) -> Iterator[Any]:
+    """
+    Drain an executed cursor with fetchmany, `batch_size` rows at a time,
+    yielding rows (or whole batches when `batches`) as dicts, or as
+    `model` rows when the cursor returns plain tuples.
+    """
+    columns = None
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            return
+        if model is not None:
+            if columns is None:
+                columns = [d[0] for d in cur.description]
+            rows = model.from_rows(columns, rows)
+        else:
+            rows = [dict(r) for r in rows]
+        if batches:
+            yield rows
+        else:
+            yield from rows
+
+
+def _is_busy_error(exc: sqlite3.OperationalError) -> bool:
+    message = str(exc).lower()
+    return "locked" in message or "busy" in message
 
 
 class Database:
-    def __init__(self, db_path: str = DB_PATH):
+    def __init__(self, db_path: str = DB_PATH, pool_size: int = DB_POOL_MAX_SIZE):
         self.db_path = db_path
         self._ensure_db_dir()
+        self.pool = ConnectionPool(
+            db_path,
+            max_size=pool_size,
+            busy_timeout_ms=DB_BUSY_TIMEOUT_MS,
+            cache_size_kb=DB_CACHE_SIZE_KB,
+        )
+        self._tx = threading.local()
         self._init_db()
-        self._seed_rooms_if_empty()
 
     def _ensure_db_dir(self):
         # DB in current directory – ensure path is valid
@@ -18,103 +83,18 @@ class Database:
         if db_file.parent and not db_file.parent.exists():
             db_file.parent.mkdir(parents=True, exist_ok=True)
 
-    def _get_connection(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+    def _get_connection(self):
+        """
+        Check out this thread's pooled connection (use as a context manager).
+        """
+        return self.pool.connection()
 
     def _init_db(self):
+        """
+        Apply pending schema migrations (a no-op when already current).
+        """
         with self._get_connection() as conn:
-            cur = conn.cursor()
-
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS patients (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    phone TEXT NOT NULL UNIQUE,
-                    age INTEGER,
-                    gender TEXT,
-                    height REAL,
-                    weight REAL
-                );
-                """
-            )
-
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS visits (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    patient_id INTEGER NOT NULL,
-                    symptoms TEXT,
-                    age INTEGER,
-                    gender TEXT,
-                    height REAL,
-                    weight REAL,
-                    predicted_issues TEXT,
-                    risk_level TEXT,
-                    allocated_room TEXT,
-                    status TEXT,
-                    FOREIGN KEY(patient_id) REFERENCES patients(id)
-                );
-                """
-            )
-
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS rooms (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    room_number TEXT NOT NULL UNIQUE,
-                    doctor_name TEXT,
-                    status TEXT,
-                    current_patient_id INTEGER
-                );
-                """
-            )
-
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS bills (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    visit_id INTEGER NOT NULL,
-                    total_amount REAL,
-                    items_json TEXT,
-                    created_at TEXT,
-                    FOREIGN KEY(visit_id) REFERENCES visits(id)
-                );
-                """
-            )
-
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS access_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    agent_name TEXT NOT NULL,
-                    action TEXT NOT NULL,
-                    resource_type TEXT,
-                    resource_id TEXT,
-                    status TEXT NOT NULL,
-                    notes TEXT
-                );
-                """
-            )
-
-            conn.commit()
-
-    def _seed_rooms_if_empty(self):
-        with self._get_connection() as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT COUNT(*) as cnt FROM rooms;")
-            row = cur.fetchone()
-            if row["cnt"] == 0:
-                for room in DEFAULT_ROOMS:
-                    cur.execute(
-                        "INSERT INTO rooms (room_number, doctor_name, status, current_patient_id) "
-                        "VALUES (?, ?, 'free', NULL);",
-                        (room["room_number"], room["doctor_name"]),
-                    )
-                conn.commit()
+            self.schema_version = migrate(conn)
 
     def execute(
         self,
@@ -124,24 +104,254 @@ class Database:
         fetchone: bool = False,
         fetchall: bool = False,
         commit: bool = False,
+        model: Optional[Type[Record]] = None,
     ) -> Optional[Any]:
+        # Pooled connections run in autocommit mode, so a standalone
+        # statement is committed as soon as it finishes; `commit` is kept
+        # for callers written against the old per-call connections.
+        # With `model`, rows come back as that slotted model (core.models)
+        # built from plain tuples instead of dicts.
         with self._get_connection() as conn:
             cur = conn.cursor()
+            if model is not None:
+                cur.row_factory = None
             cur.execute(query, tuple(params))
             result = None
-            if fetchone:
+            if model is not None and (fetchone or fetchall):
+                rows = [cur.fetchone()] if fetchone else cur.fetchall()
+                if fetchone and rows[0] is None:
+                    return None
+                columns = [d[0] for d in cur.description]
+                result = model.from_rows(columns, rows)
+                if fetchone:
+                    result = result[0]
+            elif fetchone:
                 row = cur.fetchone()
                 result = dict(row) if row is not None else None
             elif fetchall:
                 rows = cur.fetchall()
                 result = [dict(r) for r in rows]
-            if commit:
-                conn.commit()
             return result
 
+    def iter_query(
+        self,
+        query: str,
+        params: Iterable[Any] = (),
+        batch_size: int = DB_ITER_BATCH_SIZE,
+        *,
+        model: Optional[Type[Record]] = None,
+        batches: bool = False,
+    ) -> Iterator[Any]:
+        """
+        Stream the rows of a query lazily: at most `batch_size` rows are
+        in memory at a time however large the result is. Yields rows like
+        execute(fetchall=True) would, or lists of them when `batches`.
+
+        The thread's pooled connection, and the statement's read snapshot,
+        stay checked out until the generator is exhausted or closed, so
+        consume it on the thread that created it and close() it when
+        stopping early. Prefer keyset pages for long-lived consumers.
+        """
+        with self._get_connection() as conn:
+            cur = conn.cursor()
+            if model is not None:
+                cur.row_factory = None
+            try:
+                cur.execute(query, tuple(params))
+                yield from stream_cursor(cur, batch_size, model, batches)
+            finally:
+                cur.close()
+
     def insert(self, query: str, params: Iterable[Any] = ()) -> int:
         with self._get_connection() as conn:
             cur = conn.cursor()
             cur.execute(query, tuple(params))
-            conn.commit()
             return cur.lastrowid
+
+    def insert_returning(self, table: str, values: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        INSERT one row and return it as stored (id and defaults included)
+        via RETURNING – one statement instead of an insert plus a SELECT.
+        Tables with a model in core.models return that model. Inside a
+        unit of work the row also enters the identity map.
+        """
+        if not values:
+            raise ValueError(f"insert_returning({table!r}) needs at least one column")
+        columns = list(values)
+        _check_identifiers(table, *columns)
+        rows = self.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))}) RETURNING *;",
+            tuple(values.values()),
+            fetchall=True,
+            model=MODELS_BY_TABLE.get(table),
+        )
+        return self.remember(table, rows[0])
+
+    def update_returning(
+        self,
+        table: str,
+        values: Dict[str, Any],
+        where: str,
+        params: Iterable[Any] = (),
+    ) -> List[Dict[str, Any]]:
+        """
+        UPDATE `table` SET `values` WHERE `where` and return the updated
+        rows via RETURNING (refreshing them in the identity map).
+        """
+        if not values:
+            raise ValueError(f"update_returning({table!r}) needs at least one column")
+        _check_identifiers(table, *values)
+        rows = self.execute(
+            f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in values)} "
+            f"WHERE {where} RETURNING *;",
+            (*values.values(), *params),
+            fetchall=True,
+            model=MODELS_BY_TABLE.get(table),
+        )
+        return [self.remember(table, row) for row in rows]
+
+    def executemany(self, query: str, seq_of_params: Iterable[Iterable[Any]]) -> int:
+        """
+        Run one statement for many parameter tuples; returns rows affected.
+        """
+        with self._get_connection() as conn:
+            cur = conn.executemany(query, seq_of_params)
+            return cur.rowcount
+
+    # ---------- Unit of work ----------
+
+    @contextmanager
+    def transaction(self, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+        """
+        Run a block as one unit of work on this thread's connection.
+
+        Every execute()/insert() issued on the same thread inside the block
+        joins the transaction, so agents take part without being told.
+        The outermost block commits once (or rolls back on error); nested
+        blocks become savepoints. Use immediate=True for flows that will
+        write, so the write lock is taken up front instead of on upgrade;
+        BEGIN IMMEDIATE is retried a bounded number of times if the lock
+        is still contended after the busy timeout.
+
+        The outermost block also owns an IdentityMap (see identity_map()),
+        dropped when the block ends, and the hooks registered with
+        on_rollback() and after_transaction().
+        """
+        with self._get_connection() as conn:
+            depth = getattr(self._tx, "depth", 0)
+            savepoint = f"uow_{depth}"
+            if depth == 0:
+                self._begin(conn, immediate)
+                self._tx.identity = IdentityMap()
+                # Ordered set: a hook registered again is not queued twice
+                self._tx.rollback_hooks = {}
+                self._tx.after_hooks = []
+            else:
+                conn.execute(f"SAVEPOINT {savepoint};")
+            self._tx.depth = depth + 1
+            try:
+                yield conn
+            except BaseException:
+                if depth == 0:
+                    conn.execute("ROLLBACK;")
+                else:
+                    conn.execute(f"ROLLBACK TO {savepoint};")
+                    conn.execute(f"RELEASE {savepoint};")
+                    # Rows written inside the savepoint are gone again
+                    self._tx.identity.clear()
+                for hook in self._tx.rollback_hooks:
+                    hook()
+                raise
+            else:
+                if depth == 0:
+                    conn.execute("COMMIT;")
+                else:
+                    conn.execute(f"RELEASE {savepoint};")
+            finally:
+                self._tx.depth = depth
+                if depth == 0:
+                    self._tx.identity = None
+                    self._tx.rollback_hooks = None
+                    after_hooks, self._tx.after_hooks = self._tx.after_hooks, None
+                    # Back in autocommit: each hook's writes stand alone
+                    for hook in after_hooks:
+                        hook()
+
+    def _begin(self, conn: sqlite3.Connection, immediate: bool) -> None:
+        if not immediate:
+            conn.execute("BEGIN;")
+            return
+        for attempt in range(DB_BEGIN_RETRIES + 1):
+            try:
+                conn.execute("BEGIN IMMEDIATE;")
+                return
+            except sqlite3.OperationalError as exc:
+                if not _is_busy_error(exc) or attempt == DB_BEGIN_RETRIES:
+                    raise
+                time.sleep(DB_BEGIN_RETRY_BACKOFF_SEC * (2 ** attempt))
+
+    def in_transaction(self) -> bool:
+        return getattr(self._tx, "depth", 0) > 0
+
+    # ---------- Identity map ----------
+
+    def identity_map(self) -> Optional[IdentityMap]:
+        """
+        The current unit of work's IdentityMap, or None outside one.
+        """
+        return getattr(self._tx, "identity", None)
+
+    def on_rollback(self, hook: Callable[[], None]) -> None:
+        """
+        Call `hook` if the current unit of work, or any savepoint inside
+        it, rolls back – for in-memory state mirroring rows written in
+        it. Registering an equal hook again in the same unit of work is a
+        no-op, so callers may register on every write. A no-op outside a
+        unit of work.
+        """
+        hooks = getattr(self._tx, "rollback_hooks", None)
+        if hooks is not None:
+            hooks[hook] = None
+
+    def after_transaction(self, hook: Callable[[], None]) -> None:
+        """
+        Call `hook` once the current unit of work has ended, committed or
+        rolled back, outside it – for writes that must not share its fate
+        (e.g. strict audit rows). Runs at once outside a unit of work.
+        Hooks run while the block exits, so they must not raise.
+        """
+        hooks = getattr(self._tx, "after_hooks", None)
+        if hooks is None:
+            hook()
+        else:
+            hooks.append(hook)
+
+    def cached_row(self, table: str, key: Any) -> Optional[Dict[str, Any]]:
+        """
+        A row this unit of work has already read or written, else None.
+        """
+        identity = self.identity_map()
+        return identity.get(table, key) if identity is not None else None
+
+    def remember(self, table: str, row: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Record a row just read or written (e.g. via RETURNING) in the
+        identity map and return its canonical dict. A no-op outside a
+        unit of work.
+        """
+        identity = self.identity_map()
+        if identity is None or row is None:
+            return row
+        return identity.put(table, row)
+
+    # ---------- Pool management ----------
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """
+        Checkouts, waits and open/idle connection counts for sizing the pool.
+        """
+        return self.pool.stats()
+
+    def close(self) -> None:
+        self.pool.close()
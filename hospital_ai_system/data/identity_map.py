@@ -0,0 +1,52 @@
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class IdentityMap:
+    """
+    Rows already read or written by the current unit of work, keyed by
+    (table, id).
+
+    Each row is held as a single object – a dict or a core.models row: a
+    later write through RETURNING updates that object in place, so every
+    agent holding it sees the new values and nothing is read from SQLite
+    twice. One map lives exactly as long as the outermost
+    Database.transaction() on a thread.
+    """
+
+    def __init__(self):
+        self._rows: Dict[Tuple[str, Hashable], Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, table: str, key: Hashable) -> Optional[Dict[str, Any]]:
+        row = self._rows.get((table, key))
+        if row is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return row
+
+    def put(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Store `row` (which must carry its `id`) and return the canonical
+        row for it – the already-mapped one, refreshed, if there is one.
+        """
+        existing = self._rows.get((table, row["id"]))
+        if existing is None:
+            self._rows[(table, row["id"])] = row
+            return row
+        if existing is not row:
+            if isinstance(existing, dict):
+                existing.clear()
+            # model rows have a fixed set of fields, all overwritten here
+            existing.update(row)
+        return existing
+
+    def discard(self, table: str, key: Hashable) -> None:
+        self._rows.pop((table, key), None)
+
+    def clear(self) -> None:
+        self._rows.clear()
+
+    def __len__(self) -> int:
+        return len(self._rows)
@@ -0,0 +1,338 @@
+import sqlite3
+from typing import Callable, List, Tuple
+
+from data.rollups import REBUILD_ACCESS_LOG_ROLLUPS_SQL, create_access_log_rollups
+from data.seed_data import seed_rooms_if_empty
+
+
+# ---------- Migration steps ----------
+#
+# Each step receives a connection that is already inside the migration
+# transaction and must only move the schema forward by one version.
+# Never edit a released step – append a new one instead.
+
+
+def _m001_base_schema(conn: sqlite3.Connection) -> None:
+    # IF NOT EXISTS keeps this safe for databases created before
+    # versioning, which already have these tables at user_version 0.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS patients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            phone TEXT NOT NULL UNIQUE,
+            age INTEGER,
+            gender TEXT,
+            height REAL,
+            weight REAL
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS visits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER NOT NULL,
+            symptoms TEXT,
+            age INTEGER,
+            gender TEXT,
+            height REAL,
+            weight REAL,
+            predicted_issues TEXT,
+            risk_level TEXT,
+            allocated_room TEXT,
+            status TEXT,
+            FOREIGN KEY(patient_id) REFERENCES patients(id)
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rooms (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            room_number TEXT NOT NULL UNIQUE,
+            doctor_name TEXT,
+            status TEXT,
+            current_patient_id INTEGER
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS bills (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            visit_id INTEGER NOT NULL,
+            total_amount REAL,
+            items_json TEXT,
+            created_at TEXT,
+            FOREIGN KEY(visit_id) REFERENCES visits(id)
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS access_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            agent_name TEXT NOT NULL,
+            action TEXT NOT NULL,
+            resource_type TEXT,
+            resource_id TEXT,
+            status TEXT NOT NULL,
+            notes TEXT
+        );
+        """
+    )
+    seed_rooms_if_empty(conn)
+
+
+def _m002_hot_path_indexes(conn: sqlite3.Connection) -> None:
+    # RecordsAgent visit lookups / listings
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_visits_patient_id ON visits(patient_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_visits_status ON visits(status);")
+    # RoomAgent.assign_room: first free room (rowid is implicit in the index)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rooms_status ON rooms(status);")
+    # RecordsAgent.find_patient_by_phone_or_name (phone is already UNIQUE)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_patients_name ON patients(name);")
+    # SecurityAgent log queries per agent over time
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_access_logs_agent_time "
+        "ON access_logs(agent_name, timestamp);"
+    )
+
+
+def _m003_report_jobs(conn: sqlite3.Connection) -> None:
+    # Background PDF rendering (reports/job_queue.py); rows left in
+    # 'queued' or 'running' are picked up again after a restart.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS report_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            visit_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            pdf_path TEXT,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY(visit_id) REFERENCES visits(id)
+        );
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_report_jobs_status ON report_jobs(status);")
+
+
+def _m004_access_log_filter_indexes(conn: sqlite3.Connection) -> None:
+    # Security Logs filters / aggregates: status breakdown and time ranges
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_access_logs_status ON access_logs(status);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_access_logs_action ON access_logs(action);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_access_logs_timestamp ON access_logs(timestamp);")
+
+
+def _m005_access_log_rollups(conn: sqlite3.Connection) -> None:
+    create_access_log_rollups(conn)
+    # Backfill from the existing raw log
+    conn.execute(REBUILD_ACCESS_LOG_ROLLUPS_SQL)
+
+
+def _m006_security_alerts(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS security_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            rule TEXT NOT NULL,
+            agent_name TEXT NOT NULL,
+            action TEXT,
+            observed REAL NOT NULL,
+            threshold REAL NOT NULL,
+            window_sec REAL NOT NULL,
+            details TEXT
+        );
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_security_alerts_agent "
+        "ON security_alerts(agent_name, id);"
+    )
+
+
+def _phone_digits(column: str) -> str:
+    # Strip the separators phone numbers are typed with; SQLite has no
+    # regex replace, and the search index must agree with search_patients().
+    expr = column
+    for ch in (" ", "-", "(", ")", "+", ".", "/"):
+        expr = f"replace({expr}, '{ch}', '')"
+    return expr
+
+
+def _m007_patient_search(conn: sqlite3.Connection) -> None:
+    # Trigram full-text index over names and digit-only phones; rowid is
+    # the patient id. Builds without FTS5 skip it and search_patients()
+    # falls back to LIKE.
+    try:
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS patients_search "
+            "USING fts5(name, phone, tokenize = 'trigram');"
+        )
+    except sqlite3.OperationalError as exc:
+        if "no such module" in str(exc) or "tokenizer" in str(exc):
+            return
+        raise
+    # Per-trigram document counts, used to pick selective search terms
+    conn.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS patients_search_vocab "
+        "USING fts5vocab(patients_search, 'col');"
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_patients_search_insert
+        AFTER INSERT ON patients
+        BEGIN
+            INSERT INTO patients_search (rowid, name, phone)
+            VALUES (NEW.id, NEW.name, {_phone_digits("NEW.phone")});
+        END;
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_patients_search_update
+        AFTER UPDATE OF name, phone ON patients
+        BEGIN
+            UPDATE patients_search
+            SET name = NEW.name, phone = {_phone_digits("NEW.phone")}
+            WHERE rowid = NEW.id;
+        END;
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_patients_search_delete
+        AFTER DELETE ON patients
+        BEGIN
+            DELETE FROM patients_search WHERE rowid = OLD.id;
+        END;
+        """
+    )
+    conn.execute(
+        f"""
+        INSERT INTO patients_search (rowid, name, phone)
+        SELECT id, name, {_phone_digits("phone")} FROM patients;
+        """
+    )
+
+
+def _m008_export_state(conn: sqlite3.Connection) -> None:
+    # Resume points for incremental exports (reports/exports.py), one row
+    # per named export; ids only grow (AUTOINCREMENT), so they are the cursor.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS export_state (
+            name TEXT PRIMARY KEY,
+            dataset TEXT NOT NULL,
+            last_id INTEGER NOT NULL,
+            last_timestamp TEXT,
+            rows_exported INTEGER NOT NULL DEFAULT 0,
+            last_file TEXT,
+            updated_at TEXT NOT NULL
+        );
+        """
+    )
+
+
+def _m009_room_waitlist(conn: sqlite3.Connection) -> None:
+    # Visits waiting for a room (agents/room_waitlist.py); the id is the
+    # arrival order, priority 0 is the most urgent.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS room_waitlist (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            visit_id INTEGER NOT NULL UNIQUE,
+            patient_id INTEGER NOT NULL,
+            priority INTEGER NOT NULL,
+            risk_level TEXT,
+            enqueued_at TEXT NOT NULL,
+            FOREIGN KEY(visit_id) REFERENCES visits(id)
+        );
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_room_waitlist_priority ON room_waitlist(priority, id);"
+    )
+
+
+def _m010_room_current_visit(conn: sqlite3.Connection) -> None:
+    # Rooms are held by a visit, not just a patient, so a stale visit of
+    # the same patient cannot free a room given to a later one. Occupied
+    # rooms pick up the patient's ongoing visit that records the room.
+    conn.execute("ALTER TABLE rooms ADD COLUMN current_visit_id INTEGER;")
+    conn.execute(
+        """
+        UPDATE rooms SET current_visit_id = (
+            SELECT MAX(v.id) FROM visits v
+            WHERE v.allocated_room = rooms.room_number
+              AND v.patient_id = rooms.current_patient_id
+              AND v.status = 'ongoing'
+        )
+        WHERE status = 'occupied';
+        """
+    )
+
+
+def _m011_report_job_owner(conn: sqlite3.Connection) -> None:
+    # The process rendering a job, so a restart only reclaims jobs whose
+    # owner is gone instead of those another live process is rendering.
+    conn.execute("ALTER TABLE report_jobs ADD COLUMN owner_pid INTEGER;")
+    conn.execute("ALTER TABLE report_jobs ADD COLUMN owner_host TEXT;")
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "base schema and default rooms", _m001_base_schema),
+    (2, "hot-path indexes", _m002_hot_path_indexes),
+    (3, "report job queue", _m003_report_jobs),
+    (4, "access log filter indexes", _m004_access_log_filter_indexes),
+    (5, "hourly access log rollups", _m005_access_log_rollups),
+    (6, "security alerts", _m006_security_alerts),
+    (7, "patient search index", _m007_patient_search),
+    (8, "export state", _m008_export_state),
+    (9, "room waitlist", _m009_room_waitlist),
+    (10, "room current visit", _m010_room_current_visit),
+    (11, "report job owners", _m011_report_job_owner),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ---------- Runner ----------
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Bring the database up to LATEST_VERSION and return the final version.
+
+    When the schema is already current this is a single PRAGMA read.
+    Pending steps run in one immediate transaction, so concurrent
+    processes starting at the same time migrate exactly once.
+    """
+    current = get_schema_version(conn)
+    if current >= LATEST_VERSION:
+        return current
+
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        # Re-read under the write lock: another process may have won.
+        current = get_schema_version(conn)
+        for version, _description, step in MIGRATIONS:
+            if version <= current:
+                continue
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {int(version)};")
+            current = version
+        conn.execute("COMMIT;")
+    except BaseException:
+        conn.execute("ROLLBACK;")
+        raise
+    return current
@@ -0,0 +1,152 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections.
+
+    A thread keeps the same connection for as long as it has it checked out
+    (nested checkouts are re-entrant), and idle connections are reused
+    instead of being reopened. PRAGMAs are applied once per connection,
+    when it is opened.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_size: int = 8,
+        busy_timeout_ms: int = 5000,
+        cache_size_kb: int = 16384,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self.db_path = db_path
+        self.max_size = max_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+
+        self._cond = threading.Condition()
+        self._idle: List[sqlite3.Connection] = []
+        self._local = threading.local()
+        self._open = 0
+        self._closed = False
+
+        # Statistics (guarded by self._cond)
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._created = 0
+
+    # ---------- Connection lifecycle ----------
+
+    def _open_connection(self) -> sqlite3.Connection:
+        # isolation_level=None: statements autocommit unless the caller
+        # opens an explicit transaction with BEGIN.
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000.0,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)};")
+        # Negative cache_size is interpreted by SQLite as KiB
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)};")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Connection pool is closed")
+            self._checkouts += 1
+
+            if not self._idle and self._open >= self.max_size:
+                self._waits += 1
+                started = time.perf_counter()
+                while not self._idle and self._open >= self.max_size:
+                    self._cond.wait()
+                    if self._closed:
+                        raise RuntimeError("Connection pool is closed")
+                self._wait_seconds += time.perf_counter() - started
+
+            if self._idle:
+                return self._idle.pop()
+
+            # Reserve the slot before releasing the lock to open the file
+            self._open += 1
+            self._created += 1
+
+        try:
+            return self._open_connection()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            # Never hand a connection with a dangling transaction to
+            # another thread.
+            conn.rollback()
+        with self._cond:
+            if self._closed:
+                self._open -= 1
+                conn.close()
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Check out this thread's connection for the duration of the block.
+        Nested use on the same thread returns the same connection.
+        """
+        depth = getattr(self._local, "depth", 0)
+        if depth == 0:
+            self._local.conn = self._acquire()
+        self._local.depth = depth + 1
+        try:
+            yield self._local.conn
+        finally:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn = self._local.conn
+                self._local.conn = None
+                self._release(conn)
+
+    def close(self) -> None:
+        """
+        Close every idle connection. Connections still checked out are
+        closed as soon as they are released.
+        """
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._idle.pop().close()
+                self._open -= 1
+            self._cond.notify_all()
+
+    # ---------- Statistics ----------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "open_connections": self._open,
+                "idle_connections": len(self._idle),
+                "in_use_connections": self._open - len(self._idle),
+                "connections_created": self._created,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_seconds": round(self._wait_seconds, 6),
+            }
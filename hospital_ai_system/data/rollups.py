@@ -0,0 +1,86 @@
+import sqlite3
+from typing import TYPE_CHECKING, Any, Iterable, Optional, Tuple
+
+if TYPE_CHECKING:  # data.db imports this module through data.migrations
+    from data.db import Database
+
+
+# Hourly buckets are the first 13 characters of the ISO timestamp
+# ("2025-01-31T14"), so rollups need no date parsing at all.
+REBUILD_ACCESS_LOG_ROLLUPS_SQL = """
+    INSERT INTO access_log_rollups (hour, agent_name, action, status, event_count)
+    SELECT substr(timestamp, 1, 13), agent_name, action, status, COUNT(*)
+    FROM access_logs
+    GROUP BY 1, 2, 3, 4;
+"""
+
+# Adds counts from rows that are no longer in access_logs (audit segments)
+MERGE_ACCESS_LOG_ROLLUP_SQL = """
+    INSERT INTO access_log_rollups (hour, agent_name, action, status, event_count)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(hour, agent_name, action, status)
+    DO UPDATE SET event_count = event_count + excluded.event_count;
+"""
+
+
+def create_access_log_rollups(conn: sqlite3.Connection) -> None:
+    """
+    Rollup table of event counts per (hour, agent, action, status), kept
+    current by a trigger on every access_logs insert.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS access_log_rollups (
+            hour TEXT NOT NULL,
+            agent_name TEXT NOT NULL,
+            action TEXT NOT NULL,
+            status TEXT NOT NULL,
+            event_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (hour, agent_name, action, status)
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_access_log_rollups_agent "
+        "ON access_log_rollups(agent_name, hour);"
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_access_logs_rollup
+        AFTER INSERT ON access_logs
+        BEGIN
+            INSERT INTO access_log_rollups (hour, agent_name, action, status, event_count)
+            VALUES (substr(NEW.timestamp, 1, 13), NEW.agent_name, NEW.action, NEW.status, 1)
+            ON CONFLICT(hour, agent_name, action, status)
+            DO UPDATE SET event_count = event_count + 1;
+        END;
+        """
+    )
+
+
+def rebuild_access_log_rollups(
+    db: "Database", segment_rows: Optional[Iterable[Tuple[Any, ...]]] = None
+) -> int:
+    """
+    Recompute every rollup row from the raw log (backfill / repair).
+    `segment_rows` adds (hour, agent, action, status, count) rows for log
+    data rotated out of access_logs (AuditSegmentStore.rollup_rows()).
+    Returns the number of rollup rows written.
+    """
+    with db.transaction(immediate=True) as conn:
+        conn.execute("DELETE FROM access_log_rollups;")
+        conn.execute(REBUILD_ACCESS_LOG_ROLLUPS_SQL)
+        if segment_rows is not None:
+            conn.executemany(MERGE_ACCESS_LOG_ROLLUP_SQL, segment_rows)
+        row = conn.execute("SELECT COUNT(*) AS cnt FROM access_log_rollups;").fetchone()
+        return row["cnt"]
+
+
+if __name__ == "__main__":
+    # Usage (from hospital_ai_system/): python -m data.rollups
+    from data.audit_segments import AuditSegmentStore
+    from data.db import Database
+
+    database = Database()
+    count = rebuild_access_log_rollups(database, AuditSegmentStore(database).rollup_rows())
+    print(f"✅ Rebuilt access log rollups: {count} rows.")
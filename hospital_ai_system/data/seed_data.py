@@ -0,0 +1,16 @@
+import sqlite3
+
+from config import DEFAULT_ROOMS
+
+
+def seed_rooms_if_empty(conn: sqlite3.Connection) -> None:
+    """
+    Insert DEFAULT_ROOMS as free rooms if the rooms table is empty.
+    """
+    row = conn.execute("SELECT COUNT(*) AS cnt FROM rooms;").fetchone()
+    if row["cnt"] == 0:
+        conn.executemany(
+            "INSERT INTO rooms (room_number, doctor_name, status, current_patient_id) "
+            "VALUES (?, ?, 'free', NULL);",
+            [(room["room_number"], room["doctor_name"]) for room in DEFAULT_ROOMS],
+        )
@@ -0,0 +1,363 @@
+import csv
+import gzip
+import json
+import os
+from contextlib import closing
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from agents.billing_agent import BillingAgent
+from agents.records_agent import RecordsAgent
+from agents.security_agent import SecurityAgent
+from config import EXPORT_CHUNK_ROWS, EXPORT_OUTPUT_DIR
+
+# Parquet output is optional (pyarrow)
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except ImportError:
+    pa = None
+    pq = None
+
+
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+TEXT_COMPRESSIONS = (None, "gzip")                       # whole-file, csv/jsonl
+PARQUET_COMPRESSIONS = (None, "snappy", "gzip", "zstd")  # per column chunk
+
+# Output columns per dataset, in order, with the kind that picks the
+# Parquet type (CSV/JSONL keep values as stored).
+DATASET_COLUMNS: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    "visits": (
+        ("id", "int"),
+        ("patient_id", "int"),
+        ("symptoms", "str"),
+        ("age", "int"),
+        ("gender", "str"),
+        ("height", "float"),
+        ("weight", "float"),
+        ("predicted_issues", "str"),
+        ("risk_level", "str"),
+        ("allocated_room", "str"),
+        ("status", "str"),
+        ("patient_name", "str"),
+        ("patient_phone", "str"),
+        ("patient_age", "int"),
+        ("patient_gender", "str"),
+    ),
+    "bills": (
+        ("id", "int"),
+        ("visit_id", "int"),
+        ("total_amount", "float"),
+        ("items_json", "str"),
+        ("created_at", "str"),
+    ),
+    "access_logs": (
+        ("id", "int"),
+        ("timestamp", "str"),
+        ("agent_name", "str"),
+        ("action", "str"),
+        ("resource_type", "str"),
+        ("resource_id", "str"),
+        ("status", "str"),
+        ("notes", "str"),
+    ),
+}
+
+# Column recorded as the export's last timestamp (visits have none)
+_TIMESTAMP_COLUMNS: Dict[str, Optional[str]] = {
+    "visits": None,
+    "bills": "created_at",
+    "access_logs": "timestamp",
+}
+
+# Permissions an orchestrated export of each dataset needs
+EXPORT_PERMISSIONS: Dict[str, Tuple[Tuple[str, str, str], ...]] = {
+    "visits": (
+        ("RecordsAgent", "visit_read", "visit"),
+        ("RecordsAgent", "patient_read", "patient"),
+    ),
+    "bills": (("BillingAgent", "billing_read", "bill"),),
+    "access_logs": (("SecurityAgent", "logs_read", "access_log"),),
+}
+
+_CONVERTERS: Dict[str, Callable[[Any], Any]] = {"int": int, "float": float, "str": str}
+
+_SAVE_EXPORT_STATE_SQL = """
+    INSERT INTO export_state
+        (name, dataset, last_id, last_timestamp, rows_exported, last_file, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET
+        dataset = excluded.dataset,
+        last_id = excluded.last_id,
+        last_timestamp = COALESCE(excluded.last_timestamp, last_timestamp),
+        rows_exported = rows_exported + excluded.rows_exported,
+        last_file = excluded.last_file,
+        updated_at = excluded.updated_at;
+"""
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds")
+
+
+# ---------- Writers ----------
+
+
+class _TextWriter:
+    def __init__(self, path: Path, columns: Sequence[str], compression: Optional[str]):
+        self.columns = columns
+        if compression == "gzip":
+            self._file: IO[str] = gzip.open(path, "wt", encoding="utf-8", newline="")
+        else:
+            self._file = open(path, "w", encoding="utf-8", newline="")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _CsvWriter(_TextWriter):
+    def __init__(self, path: Path, columns: Sequence[str], compression: Optional[str]):
+        super().__init__(path, columns, compression)
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(columns)
+
+    def write(self, rows: List[Mapping[str, Any]]) -> None:
+        columns = self.columns
+        self._csv.writerows([row[c] for c in columns] for row in rows)
+
+
+class _JsonlWriter(_TextWriter):
+    def write(self, rows: List[Mapping[str, Any]]) -> None:
+        columns = self.columns
+        self._file.writelines(
+            json.dumps({c: row[c] for c in columns}, ensure_ascii=False, default=str) + "\n"
+            for row in rows
+        )
+
+
+class _ParquetWriter:
+    # One row group per chunk; the schema is fixed up front so a chunk
+    # where a column happens to be all NULL still has the right type.
+    _ARROW_TYPES = {"int": "int64", "float": "float64", "str": "string"}
+
+    def __init__(self, path: Path, spec: Sequence[Tuple[str, str]], compression: Optional[str]):
+        self.spec = spec
+        self.schema = pa.schema(
+            [(name, pa.type_for_alias(self._ARROW_TYPES[kind])) for name, kind in spec]
+        )
+        self._writer = pq.ParquetWriter(str(path), self.schema, compression=compression or "none")
+
+    def write(self, rows: List[Mapping[str, Any]]) -> None:
+        columns = {}
+        for name, kind in self.spec:
+            convert = _CONVERTERS[kind]
+            columns[name] = [
+                convert(v) if v is not None else None for v in (row[name] for row in rows)
+            ]
+        self._writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+# ---------- Exporter ----------
+
+
+class DataExporter:
+    """
+    Streams visits (joined with their patient), bills and access logs to
+    CSV, JSONL or Parquet files in `chunk_rows` chunks, so memory stays
+    flat whatever the table size.
+
+    Each export goes to a temporary file that is renamed into place
+    (<name>_<first id>-<last id>.<ext>) only once complete. Incremental
+    exports start after the last id recorded for their `name` in
+    `export_state` and advance it once the file is in place; ids only
+    grow, so rows written late (e.g. by the audit writer) are not missed.
+    Later edits to rows already exported (a visit's status, say) are not
+    re-sent – a full export produces a fresh snapshot.
+    """
+
+    def __init__(
+        self,
+        records: RecordsAgent,
+        billing: BillingAgent,
+        security: SecurityAgent,
+        output_dir: str = EXPORT_OUTPUT_DIR,
+        chunk_rows: int = EXPORT_CHUNK_ROWS,
+    ):
+        self.db = records.db
+        self.records = records
+        self.billing = billing
+        self.security = security
+        self.output_dir = Path(output_dir)
+        self.chunk_rows = chunk_rows
+
+    # ---------- State ----------
+
+    def get_state(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.db.execute(
+            "SELECT * FROM export_state WHERE name = ?;", (name,), fetchone=True
+        )
+
+    def list_states(self) -> List[Dict[str, Any]]:
+        return self.db.execute("SELECT * FROM export_state ORDER BY name;", fetchall=True)
+
+    def reset_state(self, name: str) -> None:
+        """
+        Forget an incremental export's position; its next run starts over.
+        """
+        self.db.execute("DELETE FROM export_state WHERE name = ?;", (name,))
+
+    # ---------- Export ----------
+
+    def _rows(self, dataset: str, after_id: int) -> Iterator[Mapping[str, Any]]:
+        if dataset == "visits":
+            return self.records.iter_visits_with_patients(after_id, self.chunk_rows)
+        if dataset == "bills":
+            return self.billing.iter_bills(after_id, self.chunk_rows)
+        return self.security.iter_logs(after_id=after_id, batch_size=self.chunk_rows)
+
+    def _open_writer(
+        self, path: Path, dataset: str, fmt: str, compression: Optional[str]
+    ) -> Any:
+        spec = DATASET_COLUMNS[dataset]
+        if fmt == "parquet":
+            return _ParquetWriter(path, spec, compression)
+        columns = [name for name, _kind in spec]
+        if fmt == "csv":
+            return _CsvWriter(path, columns, compression)
+        return _JsonlWriter(path, columns, compression)
+
+    def export(
+        self,
+        dataset: str,
+        fmt: str = "csv",
+        compression: Optional[str] = None,
+        incremental: bool = False,
+        name: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Export one dataset ("visits", "bills" or "access_logs").
+
+        With `incremental`, only rows after the position saved under
+        `name` (default: the dataset name) are written and the position
+        is advanced. Returns what was written; `path` is None when there
+        were no rows.
+        """
+        if dataset not in DATASET_COLUMNS:
+            raise ValueError(f"Unknown export dataset: {dataset!r}")
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt!r}")
+        if fmt == "parquet" and pq is None:
+            raise ValueError("Parquet export requires pyarrow (pip install pyarrow)")
+        allowed = PARQUET_COMPRESSIONS if fmt == "parquet" else TEXT_COMPRESSIONS
+        if compression not in allowed:
+            raise ValueError(f"Unsupported compression {compression!r} for {fmt}")
+
+        name = name or dataset
+        after_id = 0
+        if incremental:
+            state = self.get_state(name)
+            if state is not None:
+                after_id = state["last_id"]
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.output_dir / f".{name}.{os.getpid()}.partial"
+        result: Dict[str, Any] = {
+            "name": name,
+            "dataset": dataset,
+            "format": fmt,
+            "path": None,
+            "rows": 0,
+            "chunks": 0,
+            "first_id": None,
+            "last_id": after_id,
+            "last_timestamp": None,
+        }
+        timestamp_column = _TIMESTAMP_COLUMNS[dataset]
+
+        writer = None
+        try:
+            with closing(self._rows(dataset, after_id)) as rows:
+                while True:
+                    chunk = list(islice(rows, self.chunk_rows))
+                    if not chunk:
+                        break
+                    if writer is None:
+                        writer = self._open_writer(tmp_path, dataset, fmt, compression)
+                        result["first_id"] = chunk[0]["id"]
+                    writer.write(chunk)
+                    result["rows"] += len(chunk)
+                    result["chunks"] += 1
+                    result["last_id"] = chunk[-1]["id"]
+                    if timestamp_column is not None:
+                        result["last_timestamp"] = chunk[-1][timestamp_column]
+            if writer is not None:
+                writer.close()
+                writer = None
+        except BaseException:
+            if writer is not None:
+                writer.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        if result["rows"] == 0:
+            return result
+
+        suffix = f".{fmt}" + (".gz" if fmt != "parquet" and compression == "gzip" else "")
+        path = self.output_dir / f"{name}_{result['first_id']}-{result['last_id']}{suffix}"
+        os.replace(tmp_path, path)
+        result["path"] = str(path)
+
+        if incremental:
+            with self.db.transaction(immediate=True) as conn:
+                conn.execute(
+                    _SAVE_EXPORT_STATE_SQL,
+                    (
+                        name,
+                        dataset,
+                        result["last_id"],
+                        result["last_timestamp"],
+                        result["rows"],
+                        result["path"],
+                        _now(),
+                    ),
+                )
+        return result
+
+
+if __name__ == "__main__":
+    # Usage (from hospital_ai_system/):
+    #   python -m reports.exports visits --format parquet --incremental
+    import argparse
+
+    from data.db import Database
+
+    parser = argparse.ArgumentParser(description="Export hospital data.")
+    parser.add_argument("dataset", choices=sorted(DATASET_COLUMNS))
+    parser.add_argument("--format", dest="fmt", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--compression", default=None)
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--name", default=None)
+    parser.add_argument("--output-dir", default=EXPORT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    database = Database()
+    security = SecurityAgent(database)
+    exporter = DataExporter(
+        RecordsAgent(database), BillingAgent(database), security, output_dir=args.output_dir
+    )
+    try:
+        summary = exporter.export(
+            args.dataset, args.fmt, args.compression, args.incremental, args.name
+        )
+    finally:
+        security.close()
+        database.close()
+    if summary["path"] is None:
+        print(f"✅ Nothing new to export for {summary['name']}.")
+    else:
+        print(f"✅ Exported {summary['rows']} row(s) to {summary['path']}.")
@@ -0,0 +1,262 @@
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from config import REPORT_JOB_STALE_SEC, REPORT_OUTPUT_DIR, REPORT_WORKERS
+from data.db import Database
+from reports.report_cache import ReportCache
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED)
+
+_HOST = socket.gethostname()
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds")
+
+
+def _owner_alive(pid: Optional[int], host: Optional[str]) -> Optional[bool]:
+    """
+    Whether the process that owns a job is still running: None when that
+    cannot be told from here (another host, or Windows, where os.kill()
+    would terminate the process).
+    """
+    if pid is None:
+        return False
+    if host != _HOST or os.name == "nt":
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ReportJobQueue:
+    """
+    Renders visit PDFs in a process pool so callers never block on FPDF.
+
+    submit() records a job row and returns its id immediately; the row in
+    `report_jobs` is the source of truth for status, so jobs can be polled
+    from any session. Each job records the process rendering it, and
+    unfinished jobs are resubmitted after a restart once that process is
+    gone or the job has not moved for `stale_after` seconds (rendering a
+    visit twice just overwrites the same file).
+
+    With a ReportCache, a visit whose report is already on disk completes
+    immediately without touching the pool.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        render: Callable[..., str],
+        load_payload: Callable[[int], Optional[Dict[str, Any]]],
+        max_workers: int = REPORT_WORKERS,
+        output_dir: str = REPORT_OUTPUT_DIR,
+        cache: Optional[ReportCache] = None,
+        stale_after: float = REPORT_JOB_STALE_SEC,
+    ):
+        self.db = db
+        self.render = render
+        self.load_payload = load_payload
+        self.max_workers = max_workers
+        self.output_dir = output_dir
+        self.cache = cache
+        self.stale_after = stale_after
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._futures: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    # ---------- Pool ----------
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created lazily: most sessions never render a PDF. "spawn" keeps
+        # worker processes from inheriting this process's threads and
+        # open SQLite connections.
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("ReportJobQueue is closed")
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _fail(self, job_id: int, error: str) -> None:
+        self.db.execute(
+            "UPDATE report_jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?;",
+            (JOB_FAILED, error, _now(), job_id),
+        )
+
+    def _dispatch(self, job_id: int, payload: Dict[str, Any]) -> bool:
+        # Returns False (and fails the job) when the pool will not take it
+        self.db.execute(
+            "UPDATE report_jobs SET status = ?, owner_pid = ?, owner_host = ?, updated_at = ? "
+            "WHERE id = ?;",
+            (JOB_RUNNING, os.getpid(), _HOST, _now(), job_id),
+        )
+        filename = self.cache.filename_for(payload) if self.cache is not None else None
+        try:
+            future = self._get_executor().submit(
+                self.render, dict(payload), self.output_dir, filename
+            )
+        except RuntimeError as exc:
+            # Closed or broken pool (BrokenProcessPool is a RuntimeError):
+            # never leave the job 'running'
+            self._fail(job_id, f"{type(exc).__name__}: {exc}")
+            return False
+        with self._lock:
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f))
+        return True
+
+    def _on_done(self, job_id: int, future: Future) -> None:
+        with self._lock:
+            self._futures.pop(job_id, None)
+        if future.cancelled():
+            # Left as 'running' on purpose: resume_pending() picks it up
+            # once this process has exited
+            return
+        error = future.exception()
+        if error is None:
+            if self.cache is not None:
+                self.cache.record(future.result())
+            self.db.execute(
+                "UPDATE report_jobs SET status = ?, pdf_path = ?, error = NULL, updated_at = ? "
+                "WHERE id = ?;",
+                (JOB_DONE, future.result(), _now(), job_id),
+            )
+        else:
+            self._fail(job_id, f"{type(error).__name__}: {error}")
+
+    # ---------- Public API ----------
+
+    def submit(self, visit_id: int, payload: Dict[str, Any]) -> int:
+        """
+        Queue a render of `payload` (a get_visit_with_patient row) and
+        return the job id without waiting for the PDF. If the pool cannot
+        take the job (closed or broken) the job is marked failed.
+        """
+        now = _now()
+        cached_path = self.cache.lookup(payload) if self.cache is not None else None
+        if cached_path is not None:
+            return self.db.insert(
+                "INSERT INTO report_jobs (visit_id, status, pdf_path, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?);",
+                (visit_id, JOB_DONE, cached_path, now, now),
+            )
+
+        job_id = self.db.insert(
+            "INSERT INTO report_jobs "
+            "(visit_id, status, owner_pid, owner_host, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?);",
+            (visit_id, JOB_QUEUED, os.getpid(), _HOST, now, now),
+        )
+        self._dispatch(job_id, payload)
+        return job_id
+
+    def _reclaim(self, job: Mapping[str, Any], stale_before: str) -> bool:
+        # Jobs a live process is still rendering are left alone unless
+        # they have stalled. The claim is a compare-and-set on the owner
+        # and updated_at, so of several processes starting together only
+        # one takes each job.
+        if job["updated_at"] >= stale_before and _owner_alive(
+            job["owner_pid"], job["owner_host"]
+        ) is not False:
+            return False
+        claimed = self.db.update_returning(
+            "report_jobs",
+            {"owner_pid": os.getpid(), "owner_host": _HOST, "updated_at": _now()},
+            "id = ? AND status IN (?, ?) AND owner_pid IS ? AND updated_at = ?",
+            (job["id"], JOB_QUEUED, JOB_RUNNING, job["owner_pid"], job["updated_at"]),
+        )
+        return bool(claimed)
+
+    def resume_pending(self) -> List[int]:
+        """
+        Resubmit jobs left queued or running by a process that stopped
+        (or that have been stuck for `stale_after` seconds).
+        """
+        rows = self.db.execute(
+            "SELECT id, visit_id, owner_pid, owner_host, updated_at FROM report_jobs "
+            "WHERE status IN (?, ?) ORDER BY id;",
+            (JOB_QUEUED, JOB_RUNNING),
+            fetchall=True,
+        )
+        stale_before = (datetime.utcnow() - timedelta(seconds=self.stale_after)).isoformat(
+            timespec="seconds"
+        )
+        resumed = []
+        for row in rows:
+            with self._lock:
+                if row["id"] in self._futures:
+                    continue
+            if not self._reclaim(row, stale_before):
+                continue
+            payload = self.load_payload(row["visit_id"])
+            if payload is None:
+                self._fail(row["id"], "Visit not found")
+                continue
+            if self._dispatch(row["id"], payload):
+                resumed.append(row["id"])
+        return resumed
+
+    def status(self, job_id: int) -> Optional[Dict[str, Any]]:
+        return self.db.execute(
+            "SELECT * FROM report_jobs WHERE id = ?;",
+            (job_id,),
+            fetchone=True,
+        )
+
+    def wait(
+        self, job_id: int, timeout: Optional[float] = None, poll_interval: float = 0.2
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Block until the job finishes (or the timeout expires) and return
+        its row. Jobs started by another process are polled.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            try:
+                future.exception(timeout=timeout)
+            except Exception:
+                pass
+
+        while True:
+            job = self.status(job_id)
+            if job is None or job["status"] in FINISHED_STATUSES:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(poll_interval)
+
+    def close(self, wait: bool = True) -> None:
+        """
+        Stop the pool. Jobs that have not finished stay in the table and
+        are resumed by the next ReportJobQueue on this database once this
+        process has exited (or the jobs go stale).
+        """
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
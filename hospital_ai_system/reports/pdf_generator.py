@@ -1,13 +1,23 @@
+import os
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from fpdf import FPDF
 
+# Bump whenever the layout below changes, so cached reports are re-rendered
+TEMPLATE_VERSION = "1"
 
-def generate_visit_pdf(visit_with_patient: Dict[str, Any], output_dir: str = "reports/generated") -> str:
+
+def generate_visit_pdf(
+    visit_with_patient: Dict[str, Any],
+    output_dir: str = "reports/generated",
+    filename: Optional[str] = None,
+) -> str:
     """
     Generate a simple PDF booklet for a visit.
     Returns the path to the generated PDF file.
+    The file is written under a temporary name and renamed into place,
+    so readers never see a half-written PDF.
     """
     Path(output_dir).mkdir(parents=True, exist_ok=True)
 
@@ -53,7 +63,9 @@ def generate_visit_pdf(visit_with_patient: Dict[str, Any], output_dir: str = "re
     pdf.set_font("Arial", "", 12)
     pdf.cell(0, 8, risk_level or "N/A", ln=True)
 
-    pdf_path = Path(output_dir) / f"visit_{visit_id}.pdf"
-    pdf.output(str(pdf_path))
+    pdf_path = Path(output_dir) / (filename or f"visit_{visit_id}.pdf")
+    tmp_path = pdf_path.with_name(f".{pdf_path.name}.{os.getpid()}.tmp")
+    pdf.output(str(tmp_path))
+    os.replace(tmp_path, pdf_path)
 
     return str(pdf_path)
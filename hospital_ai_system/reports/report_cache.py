@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from config import REPORT_CACHE_MAX_BYTES, REPORT_CACHE_MAX_FILES, REPORT_OUTPUT_DIR
+
+# Only content-addressed files are managed (and evicted) by the cache;
+# legacy visit_<id>.pdf files are left alone.
+_CACHED_NAME = re.compile(r"^visit_\d+_[0-9a-f]{16}\.pdf$")
+
+
+class ReportCache:
+    """
+    Content-addressed store for rendered visit PDFs.
+
+    A report's file name embeds a hash of its get_visit_with_patient row
+    plus the template version, so an unchanged visit maps to a file that
+    already exists and is served straight from disk. Files are evicted
+    least-recently-used first once the directory exceeds its size or
+    file-count bound.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = REPORT_OUTPUT_DIR,
+        template_version: str = "1",
+        max_bytes: int = REPORT_CACHE_MAX_BYTES,
+        max_files: int = REPORT_CACHE_MAX_FILES,
+    ):
+        self.output_dir = Path(output_dir)
+        self.template_version = template_version
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+
+        self._lock = threading.Lock()
+        # file name -> size, least recently used first
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+
+        self._load_index()
+
+    def _load_index(self) -> None:
+        if not self.output_dir.exists():
+            return
+        entries = []
+        for entry in os.scandir(self.output_dir):
+            if entry.is_file() and _CACHED_NAME.match(entry.name):
+                st = entry.stat()
+                entries.append((st.st_mtime, entry.name, st.st_size))
+        for _mtime, name, size in sorted(entries):
+            self._index[name] = size
+            self._bytes += size
+
+    # ---------- Keys ----------
+
+    def digest(self, visit_with_patient: Dict[str, Any]) -> str:
+        payload = json.dumps(
+            {"template": self.template_version, "row": dict(visit_with_patient)},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def filename_for(self, visit_with_patient: Dict[str, Any]) -> str:
+        return f"visit_{visit_with_patient['id']}_{self.digest(visit_with_patient)}.pdf"
+
+    # ---------- Lookup / store ----------
+
+    def lookup(self, visit_with_patient: Dict[str, Any]) -> Optional[str]:
+        """
+        Path of an up-to-date rendered report, or None on a miss.
+        """
+        name = self.filename_for(visit_with_patient)
+        path = self.output_dir / name
+        with self._lock:
+            if name in self._index and path.exists():
+                self._index.move_to_end(name)
+                self._hits += 1
+                try:
+                    os.utime(path)  # keep LRU order across restarts
+                except OSError:
+                    pass
+                return str(path)
+            if name in self._index:
+                # Deleted behind our back
+                self._bytes -= self._index.pop(name)
+            self._misses += 1
+            return None
+
+    def record(self, pdf_path: str) -> None:
+        """
+        Register a freshly rendered report and evict if over the bounds.
+        """
+        path = Path(pdf_path)
+        if not _CACHED_NAME.match(path.name):
+            return
+        try:
+            size = path.stat().st_size
+        except OSError:
+            return
+        with self._lock:
+            self._bytes -= self._index.pop(path.name, 0)
+            self._index[path.name] = size
+            self._bytes += size
+            self._stores += 1
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        # Never evict the entry that was just stored (last in order)
+        while len(self._index) > 1 and (
+            self._bytes > self.max_bytes or len(self._index) > self.max_files
+        ):
+            name, size = self._index.popitem(last=False)
+            self._bytes -= size
+            self._evictions += 1
+            try:
+                (self.output_dir / name).unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "files": len(self._index),
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "stores": self._stores,
+                "evictions": self._evictions,
+            }
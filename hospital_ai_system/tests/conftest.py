@@ -0,0 +1,10 @@
+import pytest
+
+from data.db import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(db_path=str(tmp_path / "test_hospital.db"))
+    yield database
+    database.close()
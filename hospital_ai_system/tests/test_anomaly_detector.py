@@ -0,0 +1,57 @@
+from agents.anomaly_detector import (
+    RULE_ACTION_RATE,
+    RULE_DENIAL_BURST,
+    RULE_DISTINCT_RESOURCES,
+    AnomalyDetector,
+    SlidingDistinct,
+)
+from agents.security_agent import SecurityAgent
+
+
+def test_denial_burst_fires_once_per_cooldown():
+    detector = AnomalyDetector(window_sec=60, n_buckets=6, denial_burst=3, cooldown=60)
+    fired = []
+    for n in range(10):
+        fired += detector.observe("RoomAgent", "billing_create", None, False, now=1000 + n)
+    assert [a["rule"] for a in fired] == [RULE_DENIAL_BURST]
+    assert fired[0]["observed"] == 3
+
+    # Old denials slide out of the window; a new burst alerts again
+    later = detector.observe("RoomAgent", "billing_create", None, False, now=1200)
+    assert later == []
+    fired = []
+    for n in range(3):
+        fired += detector.observe("RoomAgent", "billing_create", None, False, now=1201 + n)
+    assert [a["rule"] for a in fired] == [RULE_DENIAL_BURST]
+
+
+def test_action_rate_and_distinct_resources():
+    detector = AnomalyDetector(
+        window_sec=60, n_buckets=6, action_rate=50, distinct_resources=200, cooldown=600
+    )
+    rules = []
+    for n in range(40):
+        rules += [a["rule"] for a in detector.observe("RecordsAgent", "patient_read", "7", True, now=500)]
+    assert rules == []
+    for n in range(300):
+        rules += [a["rule"] for a in detector.observe("RecordsAgent", "visit_read", str(n), True, now=500)]
+    assert rules.count(RULE_ACTION_RATE) == 1
+    assert rules.count(RULE_DISTINCT_RESOURCES) == 1
+
+
+def test_distinct_estimate_is_close():
+    sketch = SlidingDistinct(4)
+    for n in range(5000):
+        estimate = sketch.add(1, f"patient-{n % 1000}")
+    assert 700 < estimate < 1300
+
+
+def test_security_agent_writes_alerts(db):
+    security = SecurityAgent(db, detector=AnomalyDetector(denial_burst=3))
+    for n in range(5):
+        security.check_permission("DiagnosisAgent", "identity_write", "patient", str(n))
+    alerts = security.get_alerts()
+    assert len(alerts) == 1
+    assert alerts[0]["rule"] == RULE_DENIAL_BURST
+    assert alerts[0]["agent_name"] == "DiagnosisAgent"
+    security.close()
@@ -0,0 +1,99 @@
+import json
+from datetime import datetime
+
+from agents.billing_agent import BillingAgent
+from agents.records_agent import RecordsAgent
+from agents.security_agent import SecurityAgent
+from data.audit_segments import AuditSegmentStore
+from data.audit_writer import INSERT_ACCESS_LOG_SQL
+from reports.exports import DataExporter
+
+
+def _log(db, timestamp, n):
+    db.insert(
+        INSERT_ACCESS_LOG_SQL,
+        (timestamp, "RecordsAgent", "visit_read", "visit", str(n), "ALLOWED", ""),
+    )
+
+
+def _seed(db):
+    n = 0
+    for month in ("2024-01", "2024-02", "2024-03", "2024-04"):
+        for day in range(1, 6):
+            _log(db, f"{month}-{day:02d}T10:00:00", n)
+            n += 1
+    return n
+
+
+def test_rotate_archive_and_read_through(db):
+    total = _seed(db)
+    store = AuditSegmentStore(db, hot_months=2, warm_segments=1)
+    security = SecurityAgent(db, segments=store)
+    before = security.get_logs(limit=1000)
+
+    result = store.maintain(now=datetime(2024, 4, 15))
+    assert result == {"rotated": ["2024-01", "2024-02"], "archived": ["2024-01"]}
+    assert db.execute("SELECT COUNT(*) AS cnt FROM access_logs;", fetchone=True)["cnt"] == 10
+    assert store.warm_periods() == ["2024-02"]
+    assert store.cold_periods() == ["2024-01"]
+
+    # Hot rows, then the warm and the cold segment, same order as before
+    assert security.get_logs(limit=1000) == before
+    rows, cursor = security.get_log_page(limit=12)
+    rows2, cursor2 = security.get_log_page(limit=12, before_id=cursor)
+    assert [r["id"] for r in rows + rows2] == [r["id"] for r in before]
+    assert cursor2 is None
+    assert security.get_logs(since="2024-02-01", until="2024-02-03") == before[13:15]
+    assert security.get_logs(since="2024-01-04", until="2024-01-06") == before[15:17]
+
+    # Rollups still count everything, and a rebuild reads every segment
+    assert security.get_log_summary()["total"] == total
+    security.rebuild_rollups()
+    assert security.get_log_summary()["total"] == total
+
+    store.restore("2024-01")
+    assert len(security.get_logs(limit=1000)) == total
+    security.close()
+
+
+def test_rotate_is_idempotent(db):
+    _seed(db)
+    store = AuditSegmentStore(db, hot_months=1, warm_segments=10)
+    assert store.rotate(now=datetime(2024, 4, 2)) == ["2024-01", "2024-02", "2024-03"]
+    assert store.rotate(now=datetime(2024, 4, 2)) == []
+    security = SecurityAgent(db, segments=store)
+    assert len(security.get_logs(limit=1000)) == 20
+    security.close()
+
+
+def test_iter_logs_streams_segments_then_hot_table(db):
+    total = _seed(db)
+    store = AuditSegmentStore(db, hot_months=2, warm_segments=10)
+    store.rotate(now=datetime(2024, 4, 15))
+    security = SecurityAgent(db, segments=store)
+
+    streamed = list(security.iter_logs(batch_size=3))
+    assert [r["id"] for r in streamed] == sorted(r["id"] for r in security.get_logs(limit=1000))
+    assert len(streamed) == total
+    march = list(security.iter_logs(since="2024-02-04", until="2024-03-03", batch_size=2))
+    assert [r["timestamp"][:10] for r in march] == [
+        "2024-02-04", "2024-02-05", "2024-03-01", "2024-03-02",
+    ]
+    security.close()
+
+
+def test_full_export_includes_cold_segments(db, tmp_path):
+    total = _seed(db)
+    store = AuditSegmentStore(db, hot_months=1, warm_segments=1)
+    assert store.maintain(now=datetime(2024, 4, 15))["archived"] == ["2024-02", "2024-01"]
+    security = SecurityAgent(db, segments=store)
+    exporter = DataExporter(
+        RecordsAgent(db), BillingAgent(db), security, output_dir=str(tmp_path / "out")
+    )
+
+    summary = exporter.export("access_logs", "jsonl")
+    assert summary["rows"] == total
+    with open(summary["path"], encoding="utf-8") as f:
+        months = [json.loads(line)["timestamp"][:7] for line in f]
+    assert months == sorted(months) and months[0] == "2024-01"
+    security.close()
@@ -0,0 +1,79 @@
+from agents.security_agent import SecurityAgent
+from data.audit_writer import AuditWriter
+
+
+def _count_logs(db, status=None):
+    if status is None:
+        row = db.execute("SELECT COUNT(*) AS cnt FROM access_logs;", fetchone=True)
+    else:
+        row = db.execute(
+            "SELECT COUNT(*) AS cnt FROM access_logs WHERE status = ?;", (status,), fetchone=True
+        )
+    return row["cnt"]
+
+
+def test_allowed_events_are_batched(db):
+    writer = AuditWriter(db, batch_size=1000, flush_interval=60.0)
+    security = SecurityAgent(db, audit_writer=writer)
+
+    for _ in range(50):
+        assert security.check_permission("RoomAgent", "room_read", "room", None)
+    assert _count_logs(db) == 0  # still buffered
+
+    writer.flush()
+    assert _count_logs(db, "ALLOWED") == 50
+    assert writer.stats()["batches"] == 1
+    writer.close()
+
+
+def test_denied_events_are_written_synchronously(db):
+    writer = AuditWriter(db, batch_size=1000, flush_interval=60.0)
+    security = SecurityAgent(db, audit_writer=writer)
+
+    assert not security.check_permission("DiagnosisAgent", "billing_create", "bill", None)
+    assert _count_logs(db, "DENIED") == 1
+    writer.close()
+
+
+def test_close_flushes_pending_records(db):
+    writer = AuditWriter(db, batch_size=1000, flush_interval=60.0)
+    security = SecurityAgent(db, audit_writer=writer)
+    for _ in range(10):
+        security.check_permission("IntakeAgent", "create_visit", "visit", None)
+
+    security.close()
+    assert _count_logs(db, "ALLOWED") == 10
+
+
+def _params(agent_name):
+    return ("2024-01-01T00:00:00", agent_name, "room_read", "room", None, "ALLOWED", "")
+
+
+def test_bad_record_is_isolated(db, tmp_path):
+    writer = AuditWriter(
+        db, batch_size=1000, flush_interval=0.01, max_retries=2, dead_letter_path="failed.jsonl"
+    )
+    writer.write_access_log(_params("RoomAgent"))
+    writer.write_access_log(_params(None))  # violates NOT NULL
+    writer.write_access_log(_params("RoomAgent"))
+
+    assert writer.flush(timeout=5) is False
+    assert _count_logs(db) == 2
+    assert writer.stats()["failed"] == 1
+    lines = (tmp_path / "failed.jsonl").read_text().splitlines()
+    assert len(lines) == 1 and "NOT NULL" in lines[0]
+
+    # later records are not held back by the bad one
+    writer.write_access_log(_params("RoomAgent"))
+    assert writer.flush(timeout=5) is True
+    assert _count_logs(db) == 3
+    writer.close()
+
+
+def test_close_does_not_drop_records_after_a_failure(db, tmp_path):
+    writer = AuditWriter(db, batch_size=1000, flush_interval=60.0, dead_letter_path="failed.jsonl")
+    writer.write_access_log(_params(None))
+    writer.write_access_log(_params("RoomAgent"))
+    writer.close()
+    assert _count_logs(db) == 1
+    assert writer.stats()["pending"] == 0 and writer.stats()["failed"] == 1
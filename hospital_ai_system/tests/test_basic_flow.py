@@ -1,2 +1,135 @@
+import pytest
+
+from core.orch_main import Orchestrator, RequestAborted
+
+
 def test_placeholder():
     assert True
+
+
+@pytest.fixture
+def orch(db):
+    orchestrator = Orchestrator(db=db)
+    yield orchestrator
+    orchestrator.close()
+
+
+def test_reception_flow(orch):
+    patient_id, err = orch.register_patient("Asha", "9000000001", 34, "Female", 160.0, 55.0)
+    assert err is None
+
+    visit_id, err = orch.create_visit(patient_id, 34, "Female", 160.0, 55.0, "fever and cough")
+    assert err is None
+
+    visit, err = orch.run_diagnosis_for_visit(visit_id)
+    assert err is None
+    assert visit["risk_level"] == "medium"
+
+    result, err = orch.assign_room(visit_id)
+    assert err is None
+    assert result["visit"]["allocated_room"] == result["room"]["room_number"]
+
+    result, err = orch.generate_bill(visit_id, 500.0)
+    assert err is None
+    assert result["bill"]["total_amount"] == 500.0
+    assert result["room_assignments"] == []
+    assert orch.records.get_visit(visit_id)["status"] == "completed"
+
+
+def test_generate_bill_is_atomic(orch, monkeypatch):
+    patient_id, _ = orch.register_patient("Ravi", "9000000002", 50, "Male", 170.0, 70.0)
+    visit_id, _ = orch.create_visit(patient_id, 50, "Male", 170.0, 70.0, "chest pain")
+    orch.assign_room(visit_id)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("simulated crash")
+
+    monkeypatch.setattr(orch.records, "set_visit_status", fail)
+    with pytest.raises(RuntimeError):
+        orch.generate_bill(visit_id, 300.0)
+
+    # Nothing from the failed operation was committed
+    bills = orch.db.execute("SELECT * FROM bills WHERE visit_id = ?;", (visit_id,), fetchall=True)
+    assert bills == []
+    room = orch.db.execute(
+        "SELECT * FROM rooms WHERE current_patient_id = ?;", (patient_id,), fetchone=True
+    )
+    assert room is not None and room["status"] == "occupied"
+
+
+def test_rescore_visits_updates_only_changed_rows(orch):
+    patient_id, _ = orch.register_patient("Meena", "9000000003", 40, "Female", 150.0, 60.0)
+    visit_ids = [
+        orch.create_visit(patient_id, 40, "Female", 150.0, 60.0, symptoms)[0]
+        for symptoms in ("fever and cough", "stomach ache", "tired")
+    ]
+    orch.run_diagnosis_for_visit(visit_ids[0])
+
+    stats, err = orch.rescore_visits(chunk_size=2)
+    assert err is None
+    assert stats == {"scanned": 3, "updated": 2, "chunks": 2}
+    assert orch.records.get_visit(visit_ids[1])["risk_level"] == "medium"
+
+
+def test_request_reads_each_visit_once(orch):
+    statements = []
+    with orch.db._get_connection() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            with orch.request():
+                patient_id, _ = orch.register_patient("Meena", "9000000003", 40, "Female", 150.0, 50.0)
+                visit_id, _ = orch.create_visit(patient_id, 40, "Female", 150.0, 50.0, "headache and stress")
+                visit, _ = orch.run_diagnosis_for_visit(visit_id)
+                result, _ = orch.assign_room(visit_id)
+        finally:
+            conn.set_trace_callback(None)
+
+    visit_reads = [s for s in statements if s.lstrip().startswith("SELECT * FROM visits")]
+    assert visit_reads == []
+    # Writes refreshed the one shared row in place
+    assert result["visit"] is visit
+    assert visit["risk_level"] == "low"
+    assert visit["allocated_room"] == result["room"]["room_number"]
+    assert orch.db.identity_map() is None
+
+
+def test_identity_map_dropped_on_savepoint_rollback(db):
+    from agents.records_agent import RecordsAgent
+
+    records = RecordsAgent(db)
+    with db.transaction(immediate=True):
+        patient = db.execute(
+            "INSERT INTO patients (name, phone) VALUES ('X', '1') RETURNING *;", fetchall=True
+        )[0]
+        visit_id = records.create_visit(patient["id"], None, None, None, None, "cough")
+        with pytest.raises(RuntimeError):
+            with db.transaction():
+                records.set_visit_status(visit_id, "completed")
+                raise RuntimeError("boom")
+        assert records.get_visit(visit_id)["status"] == "ongoing"
+
+
+def test_aborted_request_commits_nothing(orch, db):
+    with pytest.raises(RequestAborted):
+        with orch.request():
+            patient_id, _ = orch.register_patient("Meera", "9000000077", 29, "Female", 158.0, 50.0)
+            visit_id, _ = orch.create_visit(patient_id, 29, "Female", 158.0, 50.0, "headache")
+            raise RequestAborted("diagnosis failed")
+    assert db.execute("SELECT COUNT(*) AS cnt FROM patients;", fetchone=True)["cnt"] == 0
+    assert db.execute("SELECT COUNT(*) AS cnt FROM visits;", fetchone=True)["cnt"] == 0
+
+
+def test_denied_audit_row_survives_an_aborted_request(orch, db):
+    def denied():
+        return db.execute(
+            "SELECT COUNT(*) AS cnt FROM access_logs WHERE status = 'DENIED';", fetchone=True
+        )["cnt"]
+
+    before = denied()
+    with pytest.raises(RequestAborted):
+        with orch.request():
+            assert not orch.security.check_permission(
+                "DiagnosisAgent", "billing_create", "bill", None
+            )
+            raise RequestAborted("permission denied")
+    assert denied() == before + 1
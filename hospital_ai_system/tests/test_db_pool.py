@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+from data.db import Database
+
+
+def test_connections_are_reused(db):
+    before = db.pool_stats()["connections_created"]
+    for _ in range(20):
+        db.execute("SELECT COUNT(*) AS cnt FROM rooms;", fetchone=True)
+    stats = db.pool_stats()
+    assert stats["connections_created"] == before
+    assert stats["checkouts"] >= 20
+
+
+def test_pragmas_applied_once_at_open(db):
+    row = db.execute("PRAGMA journal_mode;", fetchone=True)
+    assert row["journal_mode"] == "wal"
+    row = db.execute("PRAGMA synchronous;", fetchone=True)
+    assert row["synchronous"] == 1  # NORMAL
+
+
+def test_pool_is_bounded(tmp_path):
+    database = Database(db_path=str(tmp_path / "bounded.db"), pool_size=2)
+    barrier = threading.Barrier(6)
+
+    def worker():
+        barrier.wait()
+        for _ in range(25):
+            database.execute("SELECT * FROM rooms;", fetchall=True)
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = database.pool_stats()
+    assert stats["open_connections"] <= 2
+    assert stats["in_use_connections"] == 0
+    database.close()
+
+
+def test_returning_helpers(db):
+    patient = db.insert_returning("patients", {"name": "Asha", "phone": "9000000001"})
+    assert patient["id"] > 0 and patient["age"] is None
+
+    updated = db.update_returning("patients", {"age": 41}, "id = ?", (patient["id"],))
+    assert [row["age"] for row in updated] == [41]
+    assert db.update_returning("patients", {"age": 1}, "id = ?", (-1,)) == []
+
+    with pytest.raises(ValueError):
+        db.insert_returning("patients; DROP TABLE patients", {"name": "x"})
+    with pytest.raises(ValueError):
+        db.insert_returning("patients", {})
+    with pytest.raises(ValueError):
+        db.update_returning("patients", {}, "id = ?", (patient["id"],))
+
+
+def test_iter_query_streams_in_batches(db):
+    db.executemany(
+        "INSERT INTO patients (name, phone) VALUES (?, ?);",
+        [(f"Patient {i}", f"555-{i:04d}") for i in range(25)],
+    )
+    query = "SELECT * FROM patients ORDER BY id;"
+    assert list(db.iter_query(query, batch_size=4)) == db.execute(query, fetchall=True)
+    assert [len(b) for b in db.iter_query(query, batch_size=10, batches=True)] == [10, 10, 5]
+
+    # Nothing is checked out until iteration starts, and an abandoned
+    # stream returns its connection once closed
+    rows = db.iter_query(query, batch_size=4)
+    assert db.pool_stats()["in_use_connections"] == 0
+    next(rows)
+    assert db.pool_stats()["in_use_connections"] == 1
+    rows.close()
+    assert db.pool_stats()["in_use_connections"] == 0
@@ -0,0 +1,100 @@
+from agents.diagnosis_agent import DiagnosisAgent
+from agents.symptom_matcher import KeywordAutomaton
+
+
+def _predict(agent, symptoms):
+    return agent.predict(symptoms=symptoms, age=30, gender="", height=0.0, weight=0.0)
+
+
+def test_default_rules_match_legacy_behaviour():
+    agent = DiagnosisAgent()
+    assert _predict(agent, "Fever and COUGH")[1] == "medium"
+    assert _predict(agent, "sudden chest pain")[1] == "high"
+    assert _predict(agent, "breathlessness at night")[1] == "high"
+    assert _predict(agent, "headache from stress")[1] == "low"
+    assert _predict(agent, "upper abdomen pain")[0] == "Possible gastric/abdominal issue"
+    # First listed rule wins ties, as the old if-chain did
+    assert _predict(agent, "fever, cough and chest pain")[1] == "medium"
+    assert _predict(agent, "just tired")[0].startswith("General check-up")
+
+
+def test_negations_and_weights():
+    rules = [
+        {"issue": "flu", "risk": "medium", "all_of": [["fever"], ["cough"]], "none_of": ["no fever"]},
+        {"issue": "cardiac", "risk": "high", "all_of": [["chest pain"]], "weight": 5.0},
+    ]
+    agent = DiagnosisAgent(rules=rules)
+    assert _predict(agent, "no fever, mild cough")[0].startswith("General check-up")
+    assert _predict(agent, "fever, cough, chest pain")[0] == "cardiac"
+    assert [m["issue"] for m in agent.match("fever, cough, chest pain")] == ["cardiac", "flu"]
+
+
+def test_automaton_finds_overlapping_keywords():
+    automaton = KeywordAutomaton(["he", "she", "hers", "his"])
+    found = {automaton.keywords[i] for i in automaton.scan("ushers")}
+    assert found == {"he", "she", "hers"}
+
+
+def test_large_rule_table():
+    rules = [
+        {"issue": f"issue {n}", "risk": "low", "all_of": [[f"symptom{n:04d}x"]]}
+        for n in range(1500)
+    ]
+    agent = DiagnosisAgent(rules=rules)
+    assert _predict(agent, "patient reports symptom0742x today")[0] == "issue 742"
+
+
+def test_predict_batch_matches_predict():
+    rules = [
+        {"issue": "flu", "risk": "medium", "all_of": [["fever"], ["cough"]], "none_of": ["no fever"]},
+        {"issue": "obese cardiac", "risk": "high", "all_of": [["chest pain"]], "min_bmi": 30, "weight": 2},
+        {"issue": "senior fall", "risk": "high", "all_of": [["fall", "dizzy"]], "age_bands": ["senior"]},
+        {"issue": "chest", "risk": "medium", "all_of": [["chest pain"]]},
+    ]
+    agent = DiagnosisAgent(rules=rules)
+    visits = [
+        {"symptoms": "fever and cough", "age": 30, "height": 170.0, "weight": 70.0},
+        {"symptoms": "no fever, cough", "age": 30, "height": 170.0, "weight": 70.0},
+        {"symptoms": "chest pain", "age": 50, "height": 160.0, "weight": 95.0},
+        {"symptoms": "chest pain", "age": 50, "height": 0.0, "weight": 95.0},
+        {"symptoms": "felt dizzy", "age": 72, "height": None, "weight": None},
+        {"symptoms": "felt dizzy", "age": None, "height": None, "weight": None},
+        {"symptoms": "", "age": 5, "height": 100.0, "weight": 20.0},
+    ]
+    expected = [
+        agent.predict(v["symptoms"], v["age"] or 0, "", v["height"] or 0.0, v["weight"] or 0.0)
+        for v in visits
+    ]
+    assert agent.predict_batch(visits) == expected
+    assert [issue for issue, _ in expected] == [
+        "flu",
+        "General check-up recommended, no clear pattern detected",
+        "obese cardiac",
+        "chest",
+        "senior fall",
+        "General check-up recommended, no clear pattern detected",
+        "General check-up recommended, no clear pattern detected",
+    ]
+
+
+def test_prediction_cache_hits_and_invalidation():
+    agent = DiagnosisAgent()
+    first = agent.predict("Fever and  cough", 31, "Female", 160.0, 55.0)
+    # Same normalized text, same buckets -> served from cache
+    assert agent.predict("fever and cough ", 35, "female", 162.0, 57.0) == first
+    stats = agent.cache_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    agent.set_rules(
+        [{"issue": "respiratory", "risk": "high", "all_of": [["cough"]]}]
+    )
+    assert agent.predict("fever and cough", 31, "Female", 160.0, 55.0) == ("respiratory", "high")
+    assert agent.cache_stats()["invalidations"] == 1
+
+
+def test_prediction_cache_respects_bmi_thresholds():
+    agent = DiagnosisAgent(
+        rules=[{"issue": "obese cardiac", "risk": "high", "all_of": [["chest pain"]], "min_bmi": 30}]
+    )
+    assert agent.predict("chest pain", 50, "", 160.0, 95.0)[0] == "obese cardiac"
+    assert agent.predict("chest pain", 50, "", 160.0, 60.0)[0].startswith("General check-up")
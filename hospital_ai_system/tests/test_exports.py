@@ -0,0 +1,101 @@
+import csv
+import gzip
+import json
+
+import pytest
+
+from agents.billing_agent import BillingAgent
+from agents.records_agent import RecordsAgent
+from agents.security_agent import SecurityAgent
+from core.orch_main import Orchestrator
+from reports.exports import DataExporter
+
+
+@pytest.fixture
+def exporter(db, tmp_path):
+    security = SecurityAgent(db)
+    yield DataExporter(
+        RecordsAgent(db),
+        BillingAgent(db),
+        security,
+        output_dir=str(tmp_path / "exports"),
+        chunk_rows=4,
+    )
+    security.close()
+
+
+def _visits(db, count):
+    records = RecordsAgent(db)
+    patient_id = db.insert("INSERT INTO patients (name, phone) VALUES ('Asha', '9000000001');")
+    return [
+        records.create_visit(patient_id, 30, "Female", 160.0, 55.0, f"fever {i}")
+        for i in range(count)
+    ]
+
+
+def test_full_csv_export_joins_patients(db, exporter):
+    visit_ids = _visits(db, 10)
+    summary = exporter.export("visits", "csv", compression="gzip")
+    assert summary["rows"] == 10 and summary["chunks"] == 3
+    assert summary["path"].endswith(f"visits_{visit_ids[0]}-{visit_ids[-1]}.csv.gz")
+
+    with gzip.open(summary["path"], "rt", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [int(r["id"]) for r in rows] == visit_ids
+    assert rows[0]["patient_name"] == "Asha" and rows[0]["symptoms"] == "fever 0"
+    # a full export does not move the incremental position
+    assert exporter.get_state("visits") is None
+
+
+def test_incremental_export_resumes(db, exporter):
+    billing = BillingAgent(db)
+    visit_ids = _visits(db, 3)
+    first = [billing.generate_bill(v, 500.0)["id"] for v in visit_ids]
+
+    summary = exporter.export("bills", "jsonl", incremental=True)
+    assert summary["rows"] == 3
+    state = exporter.get_state("bills")
+    assert state["last_id"] == first[-1] and state["rows_exported"] == 3
+
+    later = billing.generate_bill(visit_ids[0], 250.0)
+    summary = exporter.export("bills", "jsonl", incremental=True)
+    with open(summary["path"], encoding="utf-8") as f:
+        assert [json.loads(line)["id"] for line in f] == [later["id"]]
+    assert exporter.get_state("bills")["rows_exported"] == 4
+
+    assert exporter.export("bills", "jsonl", incremental=True)["path"] is None
+    exporter.reset_state("bills")
+    assert exporter.export("bills", "jsonl", incremental=True)["rows"] == 4
+
+
+def test_parquet_export(db, exporter):
+    pq = pytest.importorskip("pyarrow.parquet")
+    security = exporter.security
+    for n in range(9):
+        security.check_permission("RecordsAgent", "visit_read", "visit", str(n), "")
+
+    summary = exporter.export("access_logs", "parquet", compression="zstd")
+    table = pq.read_table(summary["path"])
+    assert table.num_rows == 9
+    assert pq.ParquetFile(summary["path"]).metadata.num_row_groups == 3
+    assert table.column("resource_id").to_pylist() == [str(n) for n in range(9)]
+    assert str(table.schema.field("id").type) == "int64"
+
+
+def test_export_rejects_bad_arguments(exporter):
+    with pytest.raises(ValueError):
+        exporter.export("patients")
+    with pytest.raises(ValueError):
+        exporter.export("bills", "csv", compression="zstd")
+
+
+def test_orchestrated_export_checks_permissions(db, tmp_path):
+    orch = Orchestrator(db=db)
+    orch.exporter.output_dir = tmp_path
+    try:
+        summary, err = orch.export_data("access_logs", "csv")
+        assert err is None and summary["rows"] >= 1
+        _, err = orch.export_data("patients")
+        assert err == "Unknown export dataset: patients"
+    finally:
+        orch.close()
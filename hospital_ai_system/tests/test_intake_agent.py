@@ -0,0 +1,91 @@
+import gzip
+import json
+import threading
+
+from agents.intake_agent import IntakeAgent, iter_patient_records
+
+
+def test_upsert_keeps_existing_fields(db):
+    intake = IntakeAgent(db)
+    first = intake.register_or_get_patient("Asha", "9000000001", age=30, gender="F")
+    again = intake.register_or_get_patient("Asha K", "9000000001", height=160.0)
+    assert again == first
+    row = db.execute("SELECT * FROM patients WHERE id = ?;", (first,), fetchone=True)
+    assert (row["name"], row["age"], row["gender"], row["height"]) == ("Asha K", 30, "F", 160.0)
+
+
+def test_concurrent_registrations_of_one_phone(db):
+    intake = IntakeAgent(db)
+    ids = []
+    lock = threading.Lock()
+
+    def register():
+        for _ in range(20):
+            patient_id = intake.register_or_get_patient("Ravi", "9000000002")
+            with lock:
+                ids.append(patient_id)
+
+    threads = [threading.Thread(target=register) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(ids)) == 1
+    assert db.execute("SELECT COUNT(*) AS cnt FROM patients;", fetchone=True)["cnt"] == 1
+
+
+def test_bulk_import_csv_and_jsonl(db, tmp_path):
+    csv_path = tmp_path / "clinic_a.csv"
+    lines = ["name,phone,age,gender,height,weight"]
+    lines += [f"Patient {n},80000{n:05d},{20 + n % 50},M,170,{60 + n % 30}" for n in range(250)]
+    lines += [",80009999,40,F,,", "No Phone,,40,F,,"]
+    csv_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    intake = IntakeAgent(db)
+    stats = intake.import_patients(iter_patient_records(str(csv_path)), batch_size=100)
+    assert stats["imported"] == 250
+    assert stats["batches"] == 3
+    assert stats["skipped"] == 2
+    assert stats["errors"] == ["record 251: missing name", "record 252: missing phone"]
+
+    # Second clinic: one existing phone (updated), one new
+    jsonl_path = tmp_path / "clinic_b.jsonl.gz"
+    with gzip.open(jsonl_path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps({"name": "Patient 0", "phone": "8000000000", "weight": 99}) + "\n")
+        f.write(json.dumps({"name": "New", "phone": "7000000000"}) + "\n")
+    stats = intake.import_patients(iter_patient_records(str(jsonl_path)))
+    assert stats["imported"] == 2
+
+    assert db.execute("SELECT COUNT(*) AS cnt FROM patients;", fetchone=True)["cnt"] == 251
+    row = db.execute("SELECT * FROM patients WHERE phone = '8000000000';", fetchone=True)
+    assert (row["age"], row["weight"]) == (20, 99.0)
+
+
+def test_bad_jsonl_lines_are_skipped(db, tmp_path):
+    path = tmp_path / "patients.jsonl"
+    lines = [json.dumps({"name": f"P{i}", "phone": f"700000{i:04d}"}) for i in range(6)]
+    lines[2] = '{"name": "broken", '
+    lines[4] = "[1, 2]"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    stats = IntakeAgent(db).import_patients(iter_patient_records(str(path)), batch_size=2)
+    assert (stats["read"], stats["imported"], stats["skipped"]) == (6, 4, 2)
+    assert "line 3: invalid JSON" in stats["errors"][0]
+    assert "line 5: expected a JSON object" in stats["errors"][1]
+    assert db.execute("SELECT COUNT(*) AS cnt FROM patients;", fetchone=True)["cnt"] == 4
+
+
+def test_non_finite_numbers_are_skipped(db, tmp_path):
+    path = tmp_path / "patients.jsonl"
+    lines = [
+        json.dumps({"name": "Ok", "phone": "7100000001", "age": 30}),
+        json.dumps({"name": "Inf", "phone": "7100000002", "age": "inf"}),
+        json.dumps({"name": "NaN", "phone": "7100000003", "height": "nan"}),
+        json.dumps({"name": "Huge", "phone": "7100000004", "weight": "-Infinity"}),
+    ]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    stats = IntakeAgent(db).import_patients(iter_patient_records(str(path)))
+    assert (stats["imported"], stats["skipped"]) == (1, 3)
+    assert "age is not a finite number" in stats["errors"][0]
+    assert db.execute("SELECT name FROM patients;", fetchall=True) == [{"name": "Ok"}]
@@ -0,0 +1,36 @@
+from data.db import Database
+from data.migrations import LATEST_VERSION, migrate
+
+
+def test_new_database_is_current_and_seeded(db):
+    assert db.schema_version == LATEST_VERSION
+    rooms = db.execute("SELECT * FROM rooms;", fetchall=True)
+    assert len(rooms) > 0
+
+
+def test_reopen_does_not_reseed(tmp_path):
+    path = str(tmp_path / "reopen.db")
+    first = Database(db_path=path)
+    first.execute("DELETE FROM rooms WHERE id > 1;")
+    first.close()
+
+    second = Database(db_path=path)
+    assert len(second.execute("SELECT * FROM rooms;", fetchall=True)) == 1
+    with second._get_connection() as conn:
+        assert migrate(conn) == LATEST_VERSION
+    second.close()
+
+
+def test_hot_path_queries_use_indexes(db):
+    plan = db.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM rooms WHERE status = 'free' ORDER BY id LIMIT 1;",
+        fetchall=True,
+    )
+    assert any("idx_rooms_status" in row["detail"] for row in plan)
+
+    plan = db.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM visits WHERE patient_id = ?;",
+        (1,),
+        fetchall=True,
+    )
+    assert any("idx_visits_patient_id" in row["detail"] for row in plan)
@@ -0,0 +1,66 @@
+import tracemalloc
+
+import pytest
+
+from core.models import AccessLog, Room, Visit
+from data.identity_map import IdentityMap
+
+
+def _allocated(build):
+    tracemalloc.start()
+    try:
+        rows = build()
+        size, _peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(rows) == 5000
+    return size
+
+
+def test_model_reads_like_a_dict():
+    visit = Visit(7, 3, "cough", status="ongoing")
+    assert visit["id"] == 7 and visit.patient_id == 3
+    assert visit.get("risk_level") is None
+    assert visit.get("no_such_column", "x") == "x"
+    assert dict(visit)["symptoms"] == "cough"
+    assert list(visit) == list(Visit.FIELDS)
+    assert visit == dict(visit)
+    with pytest.raises(KeyError):
+        visit["keys"]
+
+    visit["status"] = "completed"
+    assert visit.status == "completed"
+    with pytest.raises(KeyError):
+        visit["extra"] = 1
+
+
+def test_rows_are_smaller_than_dicts():
+    columns = AccessLog.FIELDS
+    tuples = [
+        (i, "2024-05-01T10:00:00", "RecordsAgent", "visit_read", "visit", str(i), "ALLOWED", None)
+        for i in range(5000)
+    ]
+    as_dicts = _allocated(lambda: [dict(zip(columns, row)) for row in tuples])
+    as_models = _allocated(lambda: AccessLog.from_rows(columns, tuples))
+    assert as_models * 2 < as_dicts
+
+
+def test_execute_with_model(db):
+    rooms = db.execute("SELECT * FROM rooms ORDER BY id;", fetchall=True, model=Room)
+    assert rooms and all(isinstance(room, Room) for room in rooms)
+    assert rooms[0] == db.execute("SELECT * FROM rooms ORDER BY id LIMIT 1;", fetchone=True)
+
+    # a projection fills the named fields and leaves the rest at defaults
+    room = db.execute(
+        "SELECT room_number, id FROM rooms ORDER BY id LIMIT 1;", fetchone=True, model=Room
+    )
+    assert (room.id, room.room_number, room.status) == (rooms[0].id, rooms[0].room_number, None)
+    assert db.execute("SELECT * FROM rooms WHERE id = -1;", fetchone=True, model=Room) is None
+
+
+def test_identity_map_refreshes_models_in_place():
+    identity = IdentityMap()
+    visit = identity.put("visits", Visit(1, 1, "fever", status="ongoing"))
+    fresh = identity.put("visits", Visit(1, 1, "fever", status="completed"))
+    assert fresh is visit
+    assert visit.status == "completed"
@@ -0,0 +1,62 @@
+import pytest
+
+from agents.intake_agent import IntakeAgent
+from agents.records_agent import RecordsAgent
+
+
+def _seed(db):
+    intake = IntakeAgent(db)
+    ids = {}
+    for name, phone in [
+        ("Ravi Sharma", "+91 98765-43210"),
+        ("Ravi Singh", "9812345678"),
+        ("Asha Verma", "9000011111"),
+        ("Kiran Iyer", "9000022222"),
+    ]:
+        ids[name] = intake.register_or_get_patient(name, phone)
+    return intake, ids
+
+
+def test_typo_tolerant_ranked_search(db):
+    _intake, ids = _seed(db)
+    records = RecordsAgent(db)
+
+    results = records.search_patients("Ravi Shrma")
+    assert results[0]["id"] == ids["Ravi Sharma"]
+    assert results[0]["match_score"] > results[1]["match_score"]
+
+    assert records.search_patients("kirn iyer", limit=1)[0]["id"] == ids["Kiran Iyer"]
+    # Phone digits match regardless of how the number was typed
+    assert records.search_patients("98765 432")[0]["id"] == ids["Ravi Sharma"]
+    assert records.search_patients("ab") == []
+
+
+def test_index_follows_updates(db):
+    intake, ids = _seed(db)
+    records = RecordsAgent(db)
+    intake.register_or_get_patient("Asha Kulkarni", "9000011111")
+    assert records.search_patients("kulkarni", limit=1)[0]["id"] == ids["Asha Verma"]
+    assert all(r["name"] != "Asha Verma" for r in records.search_patients("verma"))
+
+    db.execute("DELETE FROM patients WHERE id = ?;", (ids["Kiran Iyer"],))
+    assert records.search_patients("kiran iyer") == []
+
+
+def test_patient_pages_and_projection(db):
+    intake = IntakeAgent(db)
+    for n in range(23):
+        intake.register_or_get_patient(f"Patient {n}", f"90000{n:05d}")
+    records = RecordsAgent(db)
+
+    rows, cursor = records.get_patient_page(limit=10, columns=["name"])
+    assert set(rows[0]) == {"id", "name"}
+    seen = [r["id"] for r in rows]
+    while cursor is not None:
+        rows, cursor = records.get_patient_page(limit=10, before_id=cursor, columns=["name"])
+        seen += [r["id"] for r in rows]
+    assert seen == sorted(seen, reverse=True) and len(seen) == 23
+
+    streamed = list(records.iter_patients(columns=["phone"], batch_size=4))
+    assert [r["id"] for r in streamed] == seen
+    with pytest.raises(ValueError):
+        records.list_patients(columns=["name; DROP TABLE patients"])
@@ -0,0 +1,90 @@
+import json
+import os
+from pathlib import Path
+
+import config
+
+from agents.permission_policy import DEFAULT_POLICY, CompiledPolicy, PolicyStore
+from agents.security_agent import SecurityAgent
+
+
+def _write(path, policy):
+    path.write_text(json.dumps(policy), encoding="utf-8")
+    # Make sure the change is visible even on coarse-mtime filesystems
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_default_policy_matches_legacy_permissions():
+    compiled = CompiledPolicy(DEFAULT_POLICY)
+    for agent, actions in DEFAULT_POLICY["agents"].items():
+        for action in compiled.actions:
+            assert compiled.allows(agent, action) == (action in actions)
+    assert not compiled.allows("UnknownAgent", "room_read")
+    assert not compiled.allows("RoomAgent", "unknown_action")
+
+
+def test_resource_rules_most_specific_wins():
+    policy = dict(
+        DEFAULT_POLICY,
+        resource_rules=[
+            {"agent": "BillingAgent", "action": "billing_read", "resource_type": "bill", "effect": "deny"},
+            {"agent": "BillingAgent", "action": "billing_read", "resource_type": "bill",
+             "resource_id": 7, "effect": "allow"},
+            {"agent": "AuditBot", "action": "logs_read", "resource_type": "logs", "effect": "allow"},
+        ],
+    )
+    compiled = CompiledPolicy(policy)
+    assert not compiled.allows("BillingAgent", "billing_read", "bill", "3")
+    assert compiled.allows("BillingAgent", "billing_read", "bill", "7")
+    assert compiled.allows("BillingAgent", "billing_read", "visit", "3")
+    assert compiled.allows("AuditBot", "logs_read", "logs", None)
+    assert not compiled.allows("AuditBot", "logs_read", None, None)
+
+
+def test_hot_reload_swaps_and_rejects_bad_files(db, tmp_path):
+    path = tmp_path / "policies.json"
+    _write(path, DEFAULT_POLICY)
+    store = PolicyStore(str(path), reload_interval=0)
+    security = SecurityAgent(db, policy=store)
+    assert not security.check_permission("RoomAgent", "billing_read", "bill", 1)
+
+    updated = json.loads(json.dumps(DEFAULT_POLICY))
+    updated["version"] = 2
+    updated["agents"]["RoomAgent"].append("billing_read")
+    _write(path, updated)
+    assert security.check_permission("RoomAgent", "billing_read", "bill", 1, "lookup")
+    assert "billing_read" in security.permissions["RoomAgent"]
+    security.audit.flush()
+    notes = db.execute("SELECT notes FROM access_logs ORDER BY id;", fetchall=True)
+    assert [row["notes"] for row in notes] == ["[policy v1]", "lookup [policy v2]"]
+
+    path.write_text("{not json", encoding="utf-8")
+    assert security.check_permission("RoomAgent", "billing_read", "bill", 1)
+    assert store.last_error is not None
+
+    _write(path, DEFAULT_POLICY)  # version 1 < active version 2
+    assert store.current().version == 2
+    assert "older" in store.last_error
+    security.close()
+
+
+def test_wrongly_shaped_files_keep_previous_policy(db, tmp_path):
+    path = tmp_path / "policies.json"
+    _write(path, DEFAULT_POLICY)
+    store = PolicyStore(str(path), reload_interval=0)
+    security = SecurityAgent(db, policy=store)
+
+    bad_rules = dict(DEFAULT_POLICY, version=2, resource_rules=["oops"])
+    for bad in ([1, 2], bad_rules, dict(DEFAULT_POLICY, version=2, resource_rules={"a": 1})):
+        _write(path, bad)
+        assert security.check_permission("RoomAgent", "room_read", "room", 1)
+        assert store.current().version == 1
+        assert store.last_error.startswith("ValueError")
+    security.close()
+
+
+def test_relative_policy_path_ignores_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = PolicyStore("policies.json", reload_interval=0)
+    assert Path(store.path) == Path(config.__file__).resolve().parent / "policies.json"
@@ -0,0 +1,170 @@
+import os
+import socket
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+
+from reports.job_queue import JOB_DONE, JOB_FAILED, ReportJobQueue
+
+pdf_generator = pytest.importorskip("reports.pdf_generator")
+
+
+def _visit(db):
+    patient_id = db.insert(
+        "INSERT INTO patients (name, phone) VALUES (?, ?);", ("Kiran", "9000000010")
+    )
+    visit_id = db.insert(
+        "INSERT INTO visits (patient_id, symptoms, status) VALUES (?, 'cough', 'ongoing');",
+        (patient_id,),
+    )
+    return visit_id
+
+
+def _payload(db, visit_id):
+    return db.execute(
+        "SELECT v.*, p.name AS patient_name, p.phone AS patient_phone "
+        "FROM visits v JOIN patients p ON v.patient_id = p.id WHERE v.id = ?;",
+        (visit_id,),
+        fetchone=True,
+    )
+
+
+def test_submit_returns_immediately_and_completes(db, tmp_path):
+    visit_id = _visit(db)
+    queue = ReportJobQueue(
+        db,
+        render=pdf_generator.generate_visit_pdf,
+        load_payload=lambda vid: _payload(db, vid),
+        max_workers=1,
+        output_dir=str(tmp_path / "generated"),
+    )
+    job_id = queue.submit(visit_id, _payload(db, visit_id))
+    assert queue.status(job_id)["status"] in ("queued", "running", "done")
+
+    job = queue.wait(job_id, timeout=60)
+    assert job["status"] == JOB_DONE
+    assert (tmp_path / "generated" / f"visit_{visit_id}.pdf").exists()
+    queue.close()
+
+
+def test_pending_jobs_are_resumed_after_restart(db, tmp_path):
+    visit_id = _visit(db)
+    # A job left behind by a previous process
+    job_id = db.insert(
+        "INSERT INTO report_jobs (visit_id, status, created_at, updated_at) "
+        "VALUES (?, 'running', '', '');",
+        (visit_id,),
+    )
+    missing_id = db.insert(
+        "INSERT INTO report_jobs (visit_id, status, created_at, updated_at) "
+        "VALUES (9999, 'queued', '', '');"
+    )
+
+    queue = ReportJobQueue(
+        db,
+        render=pdf_generator.generate_visit_pdf,
+        load_payload=lambda vid: _payload(db, vid),
+        max_workers=1,
+        output_dir=str(tmp_path / "generated"),
+    )
+    assert queue.resume_pending() == [job_id]
+    assert queue.wait(job_id, timeout=60)["status"] == JOB_DONE
+    assert queue.status(missing_id)["status"] == JOB_FAILED
+    queue.close()
+
+
+def test_job_fails_when_the_pool_is_gone(db, tmp_path):
+    visit_id = _visit(db)
+    queue = ReportJobQueue(
+        db,
+        render=pdf_generator.generate_visit_pdf,
+        load_payload=lambda vid: _payload(db, vid),
+        max_workers=1,
+        output_dir=str(tmp_path / "generated"),
+    )
+    queue.close()
+    job = queue.status(queue.submit(visit_id, _payload(db, visit_id)))
+    assert job["status"] == JOB_FAILED
+    assert job["error"] == "RuntimeError: ReportJobQueue is closed"
+
+
+def test_jobs_of_a_live_process_are_left_alone(db, tmp_path):
+    visit_id = _visit(db)
+    host = socket.gethostname()
+    fresh = datetime.utcnow().isoformat(timespec="seconds")
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    dead_pid = exited.pid
+
+    def job(pid, owner_host, updated_at):
+        return db.insert(
+            "INSERT INTO report_jobs "
+            "(visit_id, status, owner_pid, owner_host, created_at, updated_at) "
+            "VALUES (?, 'running', ?, ?, '', ?);",
+            (visit_id, pid, owner_host, updated_at),
+        )
+
+    live = job(os.getpid(), host, fresh)
+    elsewhere = job(1, "another-host", fresh)
+    dead = job(dead_pid, host, fresh)
+    stalled = job(os.getpid(), host, "2000-01-01T00:00:00")
+
+    queue = ReportJobQueue(
+        db,
+        render=pdf_generator.generate_visit_pdf,
+        load_payload=lambda vid: _payload(db, vid),
+        max_workers=1,
+        output_dir=str(tmp_path / "generated"),
+    )
+    assert queue.resume_pending() == [dead, stalled]
+    assert queue.status(dead)["owner_pid"] == os.getpid()
+    for job_id in (live, elsewhere):
+        assert queue.status(job_id)["status"] == "running"
+    queue.wait(dead, timeout=60)
+    queue.wait(stalled, timeout=60)
+    queue.close()
+
+
+def test_unchanged_visit_is_served_from_cache(db, tmp_path):
+    from reports.report_cache import ReportCache
+
+    visit_id = _visit(db)
+    out = str(tmp_path / "generated")
+    cache = ReportCache(out, template_version=pdf_generator.TEMPLATE_VERSION)
+    queue = ReportJobQueue(
+        db,
+        render=pdf_generator.generate_visit_pdf,
+        load_payload=lambda vid: _payload(db, vid),
+        max_workers=1,
+        output_dir=out,
+        cache=cache,
+    )
+    first = queue.wait(queue.submit(visit_id, _payload(db, visit_id)), timeout=60)
+    second = queue.status(queue.submit(visit_id, _payload(db, visit_id)))
+    assert second["status"] == JOB_DONE
+    assert second["pdf_path"] == first["pdf_path"]
+
+    # Any change to the visit row means a new report
+    db.execute("UPDATE visits SET risk_level = 'high' WHERE id = ?;", (visit_id,))
+    assert cache.lookup(_payload(db, visit_id)) is None
+    assert cache.stats()["hits"] == 1
+    queue.close()
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    from reports.report_cache import ReportCache
+
+    cache = ReportCache(str(tmp_path), max_files=2)
+    paths = []
+    for n in range(3):
+        row = {"id": n, "symptoms": "x"}
+        path = tmp_path / cache.filename_for(row)
+        path.write_bytes(b"%PDF")
+        cache.record(str(path))
+        paths.append(path)
+
+    assert not paths[0].exists()
+    assert paths[1].exists() and paths[2].exists()
+    assert cache.stats()["evictions"] == 1
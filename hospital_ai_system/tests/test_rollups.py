@@ -0,0 +1,46 @@
+from agents.security_agent import SecurityAgent
+from data.audit_writer import INSERT_ACCESS_LOG_SQL
+
+
+def _rollup_rows(db):
+    return db.execute(
+        "SELECT hour, agent_name, action, status, event_count FROM access_log_rollups "
+        "ORDER BY hour, agent_name, action, status;",
+        fetchall=True,
+    )
+
+
+def test_trigger_keeps_rollups_current(db):
+    security = SecurityAgent(db)
+    for n in range(40):
+        security.check_permission("RoomAgent", "room_read", "room", str(n))
+    for n in range(3):
+        security.check_permission("RoomAgent", "billing_create", "bill", str(n))
+    db.insert(
+        INSERT_ACCESS_LOG_SQL,
+        ("2024-05-01T09:15:00", "RecordsAgent", "visit_read", "visit", "1", "ALLOWED", ""),
+    )
+    security.audit.flush()
+
+    assert sum(row["event_count"] for row in _rollup_rows(db)) == 44
+    timeline = security.get_log_timeline(agent_name="RecordsAgent")
+    assert timeline == [{"hour": "2024-05-01T09", "total": 1, "blocked": 0}]
+    assert security.get_log_summary(since="2024-05-01T09:59:59", until="2024-05-01T10")[
+        "total"
+    ] == 1
+    assert security.list_log_agents() == ["RecordsAgent", "RoomAgent"]
+    security.close()
+
+
+def test_rebuild_matches_incremental(db):
+    security = SecurityAgent(db)
+    for n in range(20):
+        security.check_permission("BillingAgent", "billing_read", "bill", str(n))
+        security.check_permission("BillingAgent", "room_write", "room", str(n))
+    security.audit.flush()
+    incremental = _rollup_rows(db)
+
+    db.execute("DELETE FROM access_log_rollups;")
+    assert security.rebuild_rollups() == len(incremental)
+    assert _rollup_rows(db) == incremental
+    security.close()
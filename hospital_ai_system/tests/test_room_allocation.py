@@ -0,0 +1,97 @@
+import threading
+
+from agents.room_agent import RoomAgent
+from data.db import Database
+
+
+WORKERS = 8
+ALLOCATIONS_PER_WORKER = 60
+
+
+def _seed(db, rooms=4, visits=WORKERS):
+    db.execute("DELETE FROM rooms;")
+    for n in range(rooms):
+        db.execute(
+            "INSERT INTO rooms (room_number, doctor_name, status, current_patient_id) "
+            "VALUES (?, ?, 'free', NULL);",
+            (f"R{n}", f"Dr. {n}"),
+        )
+    for n in range(visits):
+        db.insert(
+            "INSERT INTO visits (patient_id, symptoms, status) VALUES (?, '', 'ongoing');",
+            (n + 1,),
+        )
+
+
+def test_concurrent_allocation_never_double_assigns(tmp_path):
+    db = Database(db_path=str(tmp_path / "stress.db"), pool_size=WORKERS)
+    _seed(db)
+    agent = RoomAgent(db)
+
+    holders = {}
+    holders_lock = threading.Lock()
+    double_assignments = []
+    allocations = []
+    barrier = threading.Barrier(WORKERS)
+
+    def worker(n):
+        patient_id, visit_id = n + 1, n + 1
+        done = 0
+        barrier.wait()
+        while done < ALLOCATIONS_PER_WORKER:
+            room = agent.assign_room(patient_id=patient_id, visit_id=visit_id)
+            if room is None:
+                continue  # all rooms busy – try again
+            with holders_lock:
+                if room["id"] in holders:
+                    double_assignments.append((room["id"], holders[room["id"]], patient_id))
+                holders[room["id"]] = patient_id
+            done += 1
+            # Release our claim in memory before the room becomes free in SQLite
+            with holders_lock:
+                del holders[room["id"]]
+            agent.free_room_for_visit(
+                {"id": visit_id, "allocated_room": room["room_number"], "patient_id": patient_id}
+            )
+        allocations.append(done)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(WORKERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    total = sum(allocations)
+    assert total == WORKERS * ALLOCATIONS_PER_WORKER
+    assert double_assignments == []
+
+    occupied = db.execute("SELECT COUNT(*) AS cnt FROM rooms WHERE status = 'occupied';", fetchone=True)
+    assert occupied["cnt"] == 0
+    db.close()
+
+
+def test_assign_room_returns_none_when_full(db):
+    _seed(db, rooms=1, visits=2)
+    agent = RoomAgent(db)
+    assert agent.assign_room(patient_id=1, visit_id=1) is not None
+    assert agent.assign_room(patient_id=2, visit_id=2) is None
+
+
+def test_stale_visit_cannot_free_a_later_visits_room(db):
+    _seed(db, rooms=1, visits=0)
+    agent = RoomAgent(db)
+    stale = db.insert(
+        "INSERT INTO visits (patient_id, symptoms, status, allocated_room) "
+        "VALUES (1, '', 'completed', 'R0');"
+    )
+    active = db.insert(
+        "INSERT INTO visits (patient_id, symptoms, status) VALUES (1, '', 'ongoing');"
+    )
+    room = agent.assign_room(patient_id=1, visit_id=active)
+
+    agent.free_room_for_visit({"id": stale, "allocated_room": "R0", "patient_id": 1})
+    held = db.execute("SELECT * FROM rooms WHERE id = ?;", (room["id"],), fetchone=True)
+    assert held["status"] == "occupied" and held["current_visit_id"] == active
+
+    agent.free_room_for_visit({"id": active, "allocated_room": "R0", "patient_id": 1})
+    assert db.execute("SELECT status FROM rooms;", fetchone=True)["status"] == "free"
@@ -0,0 +1,110 @@
+import pytest
+
+from agents.room_waitlist import RoomWaitlist
+from core.orch_main import Orchestrator
+
+
+def _order(waitlist):
+    return [row["visit_id"] for row in waitlist.list_waiting()]
+
+
+def test_risk_then_arrival_order(db):
+    waitlist = RoomWaitlist(db)
+    with db.transaction(immediate=True):
+        for visit_id, risk in ((1, "low"), (2, "high"), (3, None), (4, "medium"), (5, "high")):
+            waitlist.enqueue(visit_id, visit_id, risk)
+    assert waitlist.peek()[2] == 2
+    assert _order(waitlist) == [2, 5, 4, 1, 3]
+    assert waitlist.position(4) == 3
+
+    with db.transaction(immediate=True):
+        # re-ranked visits keep their arrival order within the new level
+        assert waitlist.reprioritize(1, "high")
+        assert waitlist.remove(2)
+        assert not waitlist.remove(2)
+    assert waitlist.peek()[2] == 1
+    assert _order(waitlist) == [1, 5, 4, 3]
+
+    # a fresh process rebuilds the same heap from the table
+    reloaded = RoomWaitlist(db)
+    assert reloaded.peek() == waitlist.peek() and len(reloaded) == 4
+
+
+def test_rollback_restores_heap(db):
+    waitlist = RoomWaitlist(db)
+    with db.transaction(immediate=True):
+        waitlist.enqueue(1, 1, "low")
+    with pytest.raises(RuntimeError):
+        with db.transaction(immediate=True):
+            waitlist.enqueue(2, 2, "high")
+            waitlist.remove(1)
+            raise RuntimeError("abort")
+    assert waitlist.peek()[2] == 1
+    assert 2 not in waitlist and len(waitlist) == 1
+
+
+def test_rollback_hook_registered_once_per_unit_of_work(db):
+    waitlist = RoomWaitlist(db)
+    with db.transaction(immediate=True):
+        for visit_id in range(1, 6):
+            waitlist.enqueue(visit_id, visit_id, "low")
+            waitlist.reprioritize(visit_id, "high")
+        assert list(db._tx.rollback_hooks) == [waitlist._invalidate]
+
+
+def test_freed_room_goes_to_most_urgent_visit(db):
+    db.execute("DELETE FROM rooms WHERE id > (SELECT MIN(id) FROM rooms);")
+    orch = Orchestrator(db=db)
+    try:
+        visits = {}
+        for name, phone, symptoms in (
+            ("First", "9100000001", "fever"),
+            ("Mild", "9100000002", "fever"),
+            ("Urgent", "9100000003", "chest pain"),
+        ):
+            patient_id, _ = orch.register_patient(name, phone, 40, "Male", 170.0, 70.0)
+            visit_id, _ = orch.create_visit(patient_id, 40, "Male", 170.0, 70.0, symptoms)
+            orch.run_diagnosis_for_visit(visit_id)
+            visits[name] = visit_id
+
+        result, err = orch.assign_room(visits["First"])
+        assert err is None
+        room_number = result["room"]["room_number"]
+        _, err = orch.assign_room(visits["Mild"])
+        assert err == "No free rooms available – visit is #1 on the waitlist"
+        _, err = orch.assign_room(visits["Urgent"])
+        assert err == "No free rooms available – visit is #1 on the waitlist"
+
+        # Billing frees the room and hands it to the high-risk visit at once
+        result, _ = orch.generate_bill(visits["First"], 500.0)
+        assert [a["visit_id"] for a in result["room_assignments"]] == [visits["Urgent"]]
+        assert orch.records.get_visit(visits["Urgent"])["allocated_room"] == room_number
+        waiting, err = orch.get_room_waitlist()
+        assert err is None and [w["visit_id"] for w in waiting] == [visits["Mild"]]
+
+        assignments, err = orch.complete_visit(visits["Urgent"])
+        assert err is None and assignments[0]["room"]["room_number"] == room_number
+        assert orch.records.get_visit(visits["Mild"])["allocated_room"] == room_number
+        assert orch.get_room_waitlist()[0] == []
+    finally:
+        orch.close()
+
+
+def test_visit_holding_a_room_does_not_take_another(db):
+    orch = Orchestrator(db=db)
+    try:
+        patient_id, _ = orch.register_patient("Once", "9100000009", 40, "Male", 170.0, 70.0)
+        visit_id, _ = orch.create_visit(patient_id, 40, "Male", 170.0, 70.0, "fever")
+        first, err = orch.assign_room(visit_id)
+        assert err is None
+        again, err = orch.assign_room(visit_id)
+        assert err is None and again["room"]["id"] == first["room"]["id"]
+        occupied = db.execute(
+            "SELECT COUNT(*) AS cnt FROM rooms WHERE status = 'occupied';", fetchone=True
+        )
+        assert occupied["cnt"] == 1
+
+        orch.complete_visit(visit_id)
+        assert orch.assign_room(visit_id) == (None, "Visit is already completed")
+    finally:
+        orch.close()
@@ -0,0 +1,42 @@
+from agents.security_agent import SecurityAgent
+
+
+def _agent_with_logs(db):
+    security = SecurityAgent(db)
+    for n in range(25):
+        security.check_permission("RoomAgent", "room_read", "room", str(n))
+    for n in range(5):
+        security.check_permission("DiagnosisAgent", "billing_create", "bill", str(n))
+    return security
+
+
+def test_keyset_pagination_walks_every_row_once(db):
+    security = _agent_with_logs(db)
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = security.get_log_page(limit=7, before_id=cursor)
+        seen.extend(row["id"] for row in rows)
+        if cursor is None:
+            break
+    assert len(seen) == 30
+    assert seen == sorted(seen, reverse=True)
+    security.close()
+
+
+def test_filters_and_summary(db):
+    security = _agent_with_logs(db)
+    denied = security.get_logs(limit=100, status="DENIED")
+    assert len(denied) == 5
+    assert {row["agent_name"] for row in denied} == {"DiagnosisAgent"}
+
+    summary = security.get_log_summary()
+    assert summary == {
+        "total": 30,
+        "blocked": 5,
+        "unique_agents": 2,
+        "by_status": {"ALLOWED": 25, "DENIED": 5},
+    }
+    assert security.get_log_summary(agent_name="RoomAgent")["total"] == 25
+    assert security.get_log_summary(since="2999-01-01")["total"] == 0
+    security.close()
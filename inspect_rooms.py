@@ -5,7 +5,8 @@ def main():
     db = Database()
 
     rows = db.execute(
-        "SELECT id, room_number, doctor_name, status, current_patient_id FROM rooms;",
+        "SELECT id, room_number, doctor_name, status, current_patient_id, current_visit_id "
+        "FROM rooms;",
         (),
         fetchall=True,
     )
@@ -16,7 +17,8 @@ def main():
         print(
             f"ID={r['id']}, room_number={r['room_number']}, "
             f"doctor={r['doctor_name']}, status={r['status']}, "
-            f"current_patient_id={r['current_patient_id']}"
+            f"current_patient_id={r['current_patient_id']}, "
+            f"current_visit_id={r['current_visit_id']}"
         )
 
 if __name__ == '__main__':
@@ -1,17 +1,16 @@
 # reset_rooms.py
-from data.db import Database
+from core.orch_main import Orchestrator
 
 def main():
-    db = Database()
+    orch = Orchestrator()
 
-    # Set every room to free and clear current patient
-    db.execute(
-        "UPDATE rooms SET status = 'free', current_patient_id = NULL;",
-        (),
-        commit=True,
-    )
+    # Free every room and hand them to visits on the waitlist
+    try:
+        orch.reset_all_rooms()
+    finally:
+        orch.close()
 
-    print("✅ All rooms reset to FREE.")
+    print("✅ All rooms reset to FREE (waiting visits re-assigned).")
 
 if __name__ == "__main__":
     main()